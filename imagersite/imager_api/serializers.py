@@ -1,11 +1,37 @@
 from rest_framework import serializers
-from imager_images.models import Photo
+from imager_images.models import Album, Photo
+from imager_profile.models import ImagerProfile
 
 
 class PhotoSerializer(serializers.ModelSerializer):
     """Serializer for listing photo objects."""
 
+    tags = serializers.SlugRelatedField(many=True, read_only=True, slug_field='name')
+
     class Meta:
         model = Photo
         fields = ('id', 'image', 'title', 'description', 'date_uploaded',
-                  'date_modified', 'date_published', 'published')
+                  'date_modified', 'date_published', 'published', 'tags', 'like_count')
+
+
+class AlbumSerializer(serializers.ModelSerializer):
+    """Serializer for listing album objects."""
+
+    class Meta:
+        model = Album
+        fields = ('id', 'cover', 'cover_thumbnail_url', 'photo_count', 'last_photo_added',
+                  'title', 'description', 'date_uploaded', 'date_modified',
+                  'date_published', 'published')
+
+
+class PhotographerSerializer(serializers.ModelSerializer):
+    """Serializer for listing photographer profiles."""
+
+    username = serializers.CharField(source='user.username', read_only=True)
+    services = serializers.ListField(source='service_list', read_only=True)
+    photostyles = serializers.ListField(source='photostyle_list', read_only=True)
+
+    class Meta:
+        model = ImagerProfile
+        fields = ('username', 'bio', 'website', 'location', 'fee', 'camera',
+                  'services', 'photostyles')
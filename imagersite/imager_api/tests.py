@@ -4,6 +4,7 @@ from django.urls import reverse_lazy
 from imager_images.tests import PhotoFactory
 from imager_profile.tests import UserFactory
 import factory
+import json
 import os
 
 
@@ -135,3 +136,243 @@ class PhotoAPIRouteTests(TestCase):
         ids = [photo['id'] for photo in response.json()]
         for photo in self.second_user.photos.all():
             self.assertNotIn(photo.id, ids)
+
+
+class DecodeMetricsAPIRouteTests(TestCase):
+    """Route tests for the decode metrics endpoint."""
+
+    def setUp(self):
+        """Add a staff user and a regular user."""
+        user = UserFactory(username='admin', is_staff=True)
+        user.set_password('password')
+        user.save()
+        user = UserFactory(username='bob')
+        user.set_password('password')
+        user.save()
+
+    def test_decode_metrics_route_not_staff_gets_403(self):
+        """Test decode metrics route gets a 403 status code for regular users."""
+        self.client.login(username='bob', password='password')
+        response = self.client.get(reverse_lazy('api_decode_metrics'))
+        self.assertEqual(response.status_code, 403)
+
+    def test_decode_metrics_route_staff_gets_counters(self):
+        """Test decode metrics route reports queued and rejected decodes."""
+        self.client.login(username='admin', password='password')
+        response = self.client.get(reverse_lazy('api_decode_metrics'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('queued', response.json())
+        self.assertIn('rejected', response.json())
+
+
+class SearchAPIRouteTests(TestCase):
+    """Route tests for the search endpoint."""
+
+    @classmethod
+    @override_settings(MEDIA_ROOT=os.path.join(settings.BASE_DIR,
+                                               "test_media_for_search_api"))
+    def setUpClass(cls):
+        """Add public and private photos about lighthouses."""
+        super(SearchAPIRouteTests, cls).setUpClass()
+        os.system('mkdir {}'.format(
+            os.path.join(settings.BASE_DIR, 'test_media_for_search_api')
+        ))
+        user = UserFactory(username='bob')
+        user.set_password('password')
+        user.save()
+        for index in range(3):
+            PhotoFactory(user=user, title='Lighthouse {}'.format(index),
+                         description='A lighthouse at dusk.').save()
+        PhotoFactory(user=user, title='Secret lighthouse',
+                     published='PRIVATE').save()
+
+    @classmethod
+    def tearDownClass(cls):
+        """Remove the test directory."""
+        super(SearchAPIRouteTests, cls).tearDownClass()
+        os.system('rm -rf {}'.format(
+            os.path.join(settings.BASE_DIR, 'test_media_for_search_api')))
+
+    def test_search_route_lists_public_matches(self):
+        """Test search route returns only public photos to anonymous users."""
+        response = self.client.get(reverse_lazy('api_search'), {'q': 'lighthouse'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['results']), 3)
+        self.assertIsNone(response.json()['next'])
+
+    def test_search_route_rejects_unknown_type(self):
+        """Test search route gets a 400 status code for an unknown type."""
+        response = self.client.get(reverse_lazy('api_search'),
+                                   {'q': 'lighthouse', 'type': 'users'})
+        self.assertEqual(response.status_code, 400)
+
+
+class PhotoListAPITagTests(TestCase):
+    """Route tests for filtering the photo list by tag."""
+
+    @classmethod
+    @override_settings(MEDIA_ROOT=os.path.join(settings.BASE_DIR,
+                                               "test_media_for_tags_api"))
+    def setUpClass(cls):
+        """Add a user with one tagged and one untagged photo."""
+        super(PhotoListAPITagTests, cls).setUpClass()
+        from imager_images.models import Tag
+        os.system('mkdir {}'.format(
+            os.path.join(settings.BASE_DIR, 'test_media_for_tags_api')
+        ))
+        user = UserFactory(username='bob')
+        user.set_password('password')
+        user.save()
+        cls.tagged = PhotoFactory(user=user)
+        cls.tagged.save()
+        cls.tagged.tags.add(Tag.objects.create(name='sunset'))
+        PhotoFactory(user=user).save()
+
+    @classmethod
+    def tearDownClass(cls):
+        """Remove the test directory."""
+        super(PhotoListAPITagTests, cls).tearDownClass()
+        os.system('rm -rf {}'.format(
+            os.path.join(settings.BASE_DIR, 'test_media_for_tags_api')))
+
+    def test_photo_list_route_filters_by_tag(self):
+        """Test photo list route only lists photos with the tag."""
+        self.client.login(username='bob', password='password')
+        response = self.client.get(reverse_lazy('api_photo_list'), {'tag': 'sunset'})
+        self.assertEqual([photo['id'] for photo in response.json()],
+                         [self.tagged.id])
+        self.assertEqual(response.json()[0]['tags'], ['sunset'])
+
+
+class VisibilityAPIRouteTests(TestCase):
+    """Route tests for changing visibility in bulk."""
+
+    @classmethod
+    @override_settings(MEDIA_ROOT=os.path.join(settings.BASE_DIR,
+                                               "test_media_for_visibility_api"))
+    def setUpClass(cls):
+        """Add a user with two private photos."""
+        super(VisibilityAPIRouteTests, cls).setUpClass()
+        os.system('mkdir {}'.format(
+            os.path.join(settings.BASE_DIR, 'test_media_for_visibility_api')
+        ))
+        user = UserFactory(username='bob')
+        user.set_password('password')
+        user.save()
+        cls.photos = []
+        for _ in range(2):
+            photo = PhotoFactory(user=user, published='PRIVATE')
+            photo.save()
+            cls.photos.append(photo.id)
+
+    @classmethod
+    def tearDownClass(cls):
+        """Remove the test directory."""
+        super(VisibilityAPIRouteTests, cls).tearDownClass()
+        os.system('rm -rf {}'.format(
+            os.path.join(settings.BASE_DIR, 'test_media_for_visibility_api')))
+
+    def test_visibility_route_publishes_listed_photos(self):
+        """Test visibility route publishes the photos given by id."""
+        from imager_images.models import Photo
+        self.client.login(username='bob', password='password')
+        response = self.client.post(
+            reverse_lazy('api_visibility'),
+            json.dumps({'kind': 'photos', 'published': 'PUBLIC', 'ids': self.photos[:1]}),
+            content_type='application/json')
+        self.assertEqual(response.json(), {'changed': 1})
+        self.assertEqual(Photo.objects.get(id=self.photos[0]).published, 'PUBLIC')
+
+    def test_visibility_route_rejects_empty_selection(self):
+        """Test visibility route gets a 400 status code without ids or everything."""
+        self.client.login(username='bob', password='password')
+        response = self.client.post(reverse_lazy('api_visibility'),
+                                    {'kind': 'photos', 'published': 'PUBLIC'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_visibility_route_not_logged_in_is_forbidden(self):
+        """Test visibility route needs a login."""
+        response = self.client.post(reverse_lazy('api_visibility'),
+                                    {'kind': 'photos', 'published': 'PUBLIC',
+                                     'everything': 'on'})
+        self.assertEqual(response.status_code, 403)
+
+
+class FavoriteAPIRouteTests(TestCase):
+    """Route tests for favoriting photos and reading favorites."""
+
+    @classmethod
+    @override_settings(MEDIA_ROOT=os.path.join(settings.BASE_DIR,
+                                               "test_media_for_favorite_api"))
+    def setUpClass(cls):
+        """Add a photographer with two public photos and a fan."""
+        super(FavoriteAPIRouteTests, cls).setUpClass()
+        os.system('mkdir {}'.format(
+            os.path.join(settings.BASE_DIR, 'test_media_for_favorite_api')
+        ))
+        owner = UserFactory(username='owner')
+        owner.set_password('password')
+        owner.save()
+        fan = UserFactory(username='fan')
+        fan.set_password('password')
+        fan.save()
+        cls.photos = []
+        for title in ('first', 'second'):
+            photo = PhotoFactory(user=owner, published='PUBLIC', title=title)
+            photo.save()
+            cls.photos.append(photo.id)
+
+    @classmethod
+    def tearDownClass(cls):
+        """Remove the test directory."""
+        super(FavoriteAPIRouteTests, cls).tearDownClass()
+        os.system('rm -rf {}'.format(
+            os.path.join(settings.BASE_DIR, 'test_media_for_favorite_api')))
+
+    def favorite_url(self, photo_id):
+        """The favorite route of a photo."""
+        return reverse_lazy('api_photo_favorite', kwargs={'id': photo_id})
+
+    def test_favorite_route_returns_like_count(self):
+        """Test favorite route favorites with POST and unfavorites with DELETE."""
+        self.client.login(username='fan', password='password')
+        response = self.client.post(self.favorite_url(self.photos[0]))
+        self.assertEqual(response.json(), {'favorited': True, 'like_count': 1})
+        response = self.client.delete(self.favorite_url(self.photos[0]))
+        self.assertEqual(response.json(), {'favorited': False, 'like_count': 0})
+
+    def test_favorite_route_rejects_own_photo(self):
+        """Test favorite route gets a 400 status code for the user's own photo."""
+        self.client.login(username='owner', password='password')
+        response = self.client.post(self.favorite_url(self.photos[0]))
+        self.assertEqual(response.status_code, 400)
+
+    def test_favorites_route_pages_newest_first(self):
+        """Test favorites route returns favorites newest first with a cursor."""
+        self.client.login(username='fan', password='password')
+        for photo_id in self.photos:
+            self.client.post(self.favorite_url(photo_id))
+        response = self.client.get(reverse_lazy('api_favorites'))
+        self.assertEqual([photo['title'] for photo in response.json()['results']],
+                         ['second', 'first'])
+        self.assertEqual(response.json()['results'][0]['like_count'], 1)
+        self.assertIsNone(response.json()['next'])
+
+    def test_check_route_returns_favorited_ids(self):
+        """Test check route says which of the ids asked about are favorites."""
+        self.client.login(username='fan', password='password')
+        self.client.post(self.favorite_url(self.photos[1]))
+        response = self.client.get(reverse_lazy('api_favorites_check'),
+                                   {'ids': '{},{}'.format(*self.photos)})
+        self.assertEqual(response.json(), {'favorited': [self.photos[1]]})
+
+    def test_check_route_rejects_bad_ids(self):
+        """Test check route gets a 400 status code for ids that are not numbers."""
+        self.client.login(username='fan', password='password')
+        response = self.client.get(reverse_lazy('api_favorites_check'), {'ids': 'one'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_favorites_route_not_logged_in_is_forbidden(self):
+        """Test favorites route needs a login."""
+        response = self.client.get(reverse_lazy('api_favorites'))
+        self.assertEqual(response.status_code, 403)
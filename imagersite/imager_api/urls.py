@@ -1,6 +1,22 @@
 from django.conf.urls import url
-from imager_api.views import PhotoListAPI
+from imager_api.views import (AlbumPhotoListAPI, AlbumPhotoMoveAPI, DecodeMetricsAPI,
+                              FavoriteAPI, FavoriteCheckAPI, FavoriteListAPI, FeedAPI,
+                              FollowAPI, PhotographerListAPI, PhotoListAPI, SearchAPI,
+                              VisibilityAPI)
 
 urlpatterns = [
     url(r'^photos/$', PhotoListAPI.as_view(), name='api_photo_list'),
+    url(r'^metrics/decode/$', DecodeMetricsAPI.as_view(), name='api_decode_metrics'),
+    url(r'^albums/(?P<id>\d+)/photos/$', AlbumPhotoListAPI.as_view(),
+        name='api_album_photos'),
+    url(r'^albums/(?P<id>\d+)/photos/(?P<photo_id>\d+)/move/$', AlbumPhotoMoveAPI.as_view(),
+        name='api_album_photo_move'),
+    url(r'^favorites/$', FavoriteListAPI.as_view(), name='api_favorites'),
+    url(r'^favorites/check/$', FavoriteCheckAPI.as_view(), name='api_favorites_check'),
+    url(r'^feed/$', FeedAPI.as_view(), name='api_feed'),
+    url(r'^follow/(?P<username>[\w.@+-]+)/$', FollowAPI.as_view(), name='api_follow'),
+    url(r'^photos/(?P<id>\d+)/favorite/$', FavoriteAPI.as_view(), name='api_photo_favorite'),
+    url(r'^photographers/$', PhotographerListAPI.as_view(), name='api_photographers'),
+    url(r'^search/$', SearchAPI.as_view(), name='api_search'),
+    url(r'^visibility/$', VisibilityAPI.as_view(), name='api_visibility'),
 ]
@@ -1,7 +1,23 @@
-from imager_images.models import Photo
-from imager_api.serializers import PhotoSerializer
-from rest_framework import generics
-from rest_framework.permissions import IsAuthenticated
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.db.models import prefetch_related_objects, Q
+from django.shortcuts import get_object_or_404
+from imager_images.decoding import get_budget
+from imager_images.favorites import (can_favorite, favorite, favorited_ids, read_favorites,
+                                     unfavorite)
+from imager_images.feed import follow, read_feed, unfollow
+from imager_images.models import Album, AlbumPhoto, IdListField, Photo, VisibilityForm
+from imager_images.ordering import move_photo, ordered_photos
+from imager_images.search import search
+from imager_images.tags import filter_by_tags, tag_names
+from imager_images.visibility import change_visibility, chosen_items
+from imager_profile.directory import find_photographers
+from imager_profile.models import DirectoryForm
+from imager_api.serializers import AlbumSerializer, PhotographerSerializer, PhotoSerializer
+from rest_framework import generics, status
+from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
 
 
 class PhotoListAPI(generics.ListAPIView):
@@ -11,6 +27,212 @@ class PhotoListAPI(generics.ListAPIView):
 
     serializer_class = PhotoSerializer
 
+    use_replica = True
+
     def get_queryset(self):
-        """Limit listed photos to those owned by the user."""
-        return Photo.objects.filter(user=self.request.user)
+        """Limit listed photos to those owned by the user and any tags asked for."""
+        photos = Photo.objects.filter(user=self.request.user).prefetch_related('tags')
+        return filter_by_tags(photos, tag_names(self.request.GET.getlist('tag')))
+
+
+class PhotographerListAPI(APIView):
+    """Find photographers by services, photostyles, camera, fee and location."""
+
+    permission_classes = (AllowAny,)
+
+    use_replica = True
+
+    def get(self, request, format=None):
+        """Return a page of matching profiles and the cursor of the next page."""
+        form = DirectoryForm(request.query_params)
+        if not form.is_valid():
+            return Response(form.errors, status=status.HTTP_400_BAD_REQUEST)
+        profiles, next_cursor = find_photographers(form.cleaned_data,
+                                                   request.query_params.get('after'))
+        serializer = PhotographerSerializer(profiles, many=True)
+        return Response({'results': serializer.data, 'next': next_cursor})
+
+
+class DecodeMetricsAPI(APIView):
+    """Report the image decode budget of the serving process."""
+
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request, format=None):
+        """Return the queued, rejected and in-flight decode counters."""
+        return Response(get_budget().metrics())
+
+
+class SearchAPI(APIView):
+    """Search photos or albums visible to the requester."""
+
+    permission_classes = (AllowAny,)
+
+    serializers = {'photos': PhotoSerializer, 'albums': AlbumSerializer}
+
+    def get(self, request, format=None):
+        """Return a page of matches for ``q`` and the cursor of the next page."""
+        text = request.query_params.get('q', '').strip()
+        kind = request.query_params.get('type', 'photos')
+        if kind not in self.serializers:
+            return Response({'type': 'Must be photos or albums.'}, status=400)
+        if not text:
+            return Response({'results': [], 'next': None})
+        results, next_cursor = search(text, request.user, kind,
+                                      request.query_params.get('after'))
+        if kind == 'photos':
+            prefetch_related_objects(results, 'tags')
+        serializer = self.serializers[kind](results, many=True,
+                                            context={'request': request})
+        return Response({'results': serializer.data, 'next': next_cursor})
+
+
+class AlbumPhotoListAPI(generics.ListAPIView):
+    """List an album's photos in the owner's order."""
+
+    permission_classes = (AllowAny,)
+
+    serializer_class = PhotoSerializer
+
+    def get_queryset(self):
+        """Get the photos of a public album or one owned by the user."""
+        visible = Q(published='PUBLIC')
+        if self.request.user.is_authenticated:
+            visible |= Q(user=self.request.user)
+        album = get_object_or_404(Album.active.filter(visible), id=self.kwargs['id'])
+        return ordered_photos(album).prefetch_related('tags')
+
+
+class AlbumPhotoMoveAPI(APIView):
+    """Move a photo within one of the user's albums."""
+
+    permission_classes = (IsAuthenticated,)
+
+    def post(self, request, id, photo_id, format=None):
+        """Place the photo after ``after``, before ``before``, or at the end."""
+        album = get_object_or_404(Album, id=id, user=request.user)
+        neighbours = {}
+        for side in ('after', 'before'):
+            if request.data.get(side) is not None:
+                try:
+                    neighbours[side] = int(request.data[side])
+                except (TypeError, ValueError):
+                    return Response({side: 'Must be a photo id.'},
+                                    status=status.HTTP_400_BAD_REQUEST)
+        if len(neighbours) > 1:
+            return Response({'detail': 'Give either after or before, not both.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        try:
+            rank = move_photo(album, int(photo_id), **neighbours)
+        except AlbumPhoto.DoesNotExist:
+            return Response({'detail': 'Photo is not in this album.'},
+                            status=status.HTTP_404_NOT_FOUND)
+        return Response({'photo': int(photo_id), 'rank': rank})
+
+
+class VisibilityAPI(APIView):
+    """Change the visibility of many of the user's photos or albums."""
+
+    permission_classes = (IsAuthenticated,)
+
+    def post(self, request, format=None):
+        """Set ``published`` on the items in ``ids``, or on all of them with ``everything``."""
+        form = VisibilityForm(request.data)
+        if not form.is_valid():
+            return Response(form.errors, status=status.HTTP_400_BAD_REQUEST)
+        changed = change_visibility(chosen_items(request.user, form.cleaned_data),
+                                    form.cleaned_data['published'])
+        return Response({'changed': changed})
+
+
+class FeedAPI(APIView):
+    """The newest photos and albums from the photographers the user follows."""
+
+    permission_classes = (IsAuthenticated,)
+
+    serializers = {'photo': PhotoSerializer, 'album': AlbumSerializer}
+
+    def get(self, request, format=None):
+        """Return a page of the feed and the cursor of the next page."""
+        items, next_cursor = read_feed(request.user, request.query_params.get('after'))
+        prefetch_related_objects([item for kind, item in items if kind == 'photo'], 'tags')
+        results = [{'kind': kind, 'item': self.serializers[kind](
+            item, context={'request': request}).data} for kind, item in items]
+        return Response({'results': results, 'next': next_cursor})
+
+
+class FavoriteAPI(APIView):
+    """Favorite a photo with POST and stop with DELETE."""
+
+    permission_classes = (IsAuthenticated,)
+
+    def post(self, request, id, format=None):
+        """Favorite the photo."""
+        photo = get_object_or_404(Photo.active, id=id)
+        if not can_favorite(request.user, photo):
+            return Response({'detail': 'You can only favorite public photos of others.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        favorite(request.user, photo)
+        return Response({'favorited': True,
+                         'like_count': Photo.objects.get(id=id).like_count})
+
+    def delete(self, request, id, format=None):
+        """Stop favoriting the photo."""
+        photo = get_object_or_404(Photo.objects, id=id)
+        unfavorite(request.user, photo)
+        return Response({'favorited': False,
+                         'like_count': Photo.objects.get(id=id).like_count})
+
+
+class FavoriteListAPI(APIView):
+    """The photos the user has favorited, newest first."""
+
+    permission_classes = (IsAuthenticated,)
+
+    def get(self, request, format=None):
+        """Return a page of favorites and the cursor of the next page."""
+        photos, next_cursor = read_favorites(request.user, request.query_params.get('after'))
+        prefetch_related_objects(photos, 'tags')
+        results = PhotoSerializer(photos, many=True, context={'request': request}).data
+        return Response({'results': results, 'next': next_cursor})
+
+
+class FavoriteCheckAPI(APIView):
+    """Which of a page of photos the user has favorited, in one query."""
+
+    permission_classes = (IsAuthenticated,)
+
+    max_ids = 100
+
+    def get(self, request, format=None):
+        """Return the favorited ids among the ``ids`` asked about."""
+        try:
+            ids = IdListField().clean([pk for value in request.query_params.getlist('ids')
+                                       for pk in value.split(',') if pk])
+        except ValidationError as error:
+            return Response({'ids': error.messages}, status=status.HTTP_400_BAD_REQUEST)
+        if len(ids) > self.max_ids:
+            return Response({'ids': ['Ask about at most {} photos.'.format(self.max_ids)]},
+                            status=status.HTTP_400_BAD_REQUEST)
+        return Response({'favorited': sorted(favorited_ids(request.user, ids))})
+
+
+class FollowAPI(APIView):
+    """Follow a photographer with POST and stop with DELETE."""
+
+    permission_classes = (IsAuthenticated,)
+
+    def post(self, request, username, format=None):
+        """Follow the photographer."""
+        followed = get_object_or_404(User, username=username, is_active=True)
+        if followed == request.user:
+            return Response({'detail': 'You cannot follow yourself.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        follow(request.user, followed)
+        return Response({'following': True})
+
+    def delete(self, request, username, format=None):
+        """Stop following the photographer."""
+        followed = get_object_or_404(User, username=username)
+        unfollow(request.user, followed)
+        return Response({'following': False})
@@ -0,0 +1,35 @@
+"""A Bloom filter for testing membership of millions of names in little memory."""
+import hashlib
+import math
+
+
+class BloomFilter(object):
+    """A fixed-size set that may report false positives but never false negatives.
+
+    It is sized for ``capacity`` keys at the given false positive rate, and
+    needs about 1.8 bytes a key at the default rate of one in a thousand.
+    """
+
+    def __init__(self, capacity, error_rate=0.001):
+        """Allocate the bit array for the expected number of keys."""
+        capacity = max(capacity, 1)
+        self.size = int(math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, int(round(self.size / capacity * math.log(2))))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def positions(self, key):
+        """The bit positions of a key, by double hashing one SHA-1 digest."""
+        digest = hashlib.sha1(key.encode('utf8')).digest()
+        first = int.from_bytes(digest[:8], 'big')
+        second = int.from_bytes(digest[8:16], 'big') | 1
+        return ((first + index * second) % self.size for index in range(self.hashes))
+
+    def add(self, key):
+        """Add a key to the set."""
+        for position in self.positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key):
+        """Whether the key may have been added."""
+        return all(self.bits[position >> 3] & (1 << (position & 7))
+                   for position in self.positions(key))
@@ -0,0 +1,187 @@
+"""Photo and album view counts, gathered in memory and written in batches."""
+from collections import Counter
+import fcntl
+import logging
+import os
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.db import DatabaseError, transaction
+from imager_images.models import ViewCount
+
+logger = logging.getLogger(__name__)
+
+
+def current_hour():
+    """The start of the current hour in seconds since the epoch."""
+    return int(time.time()) // 3600 * 3600
+
+
+def read_spool(spool):
+    """The ``(kind, object_id, hour)`` counts written to an open spool file."""
+    counts = Counter()
+    for line in spool:
+        try:
+            kind, object_id, hour = line.split()
+            counts[kind, int(object_id), int(hour)] += 1
+        except ValueError:
+            continue
+    return counts
+
+
+class ViewBuffer(object):
+    """Counts views in memory and adds them to the database in one batch.
+
+    Each view is also appended to a spool file that this process holds
+    locked. A flush rotates the spool and swaps out the counts, writes
+    them, then deletes the rotated spool, so the views of a process that
+    dies between flushes are still on disk for ``recover_spools``. Views
+    left unflushed by a process that gets no more requests are handed to
+    ``recover_spools`` by a timer.
+    """
+
+    def __init__(self, root, flush_seconds, flush_size):
+        """Open a new spool file of this process under ``root``."""
+        self.root = root
+        self.flush_seconds = flush_seconds
+        self.flush_size = flush_size
+        self.lock = threading.Lock()
+        self.name = '{}-{}'.format(os.getpid(), uuid.uuid4().hex)
+        self.rotations = 0
+        os.makedirs(root, exist_ok=True)
+        self.counts = Counter()
+        self.spool = self.open_spool()
+        self.flushed = self.recorded = time.time()
+
+    def open_spool(self):
+        """Create and lock the spool file new views are appended to."""
+        spool = open(os.path.join(self.root, self.name + '.spool'), 'a')
+        fcntl.flock(spool, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return spool
+
+    def record(self, kind, object_id):
+        """Count one view, and flush if the buffer is old or full enough."""
+        hour = current_hour()
+        with self.lock:
+            self.counts[kind, object_id, hour] += 1
+            self.spool.write('{} {} {}\n'.format(kind, object_id, hour))
+            self.spool.flush()
+            self.recorded = time.time()
+            due = (len(self.counts) >= self.flush_size or
+                   time.time() - self.flushed >= self.flush_seconds)
+        if due:
+            self.flush()
+
+    def flush(self):
+        """Write the buffered counts in one transaction and drop their spool.
+
+        This runs in the request that filled the buffer, so a database
+        error is logged rather than raised; the rotated spool is then left
+        for ``recover_spools``, which the next ``flush_views`` pass runs.
+        """
+        with self.lock:
+            if not self.counts:
+                return
+            counts, self.counts = self.counts, Counter()
+            self.rotations += 1
+            rotated = os.path.join(self.root, '{}.{}.flushing'.format(
+                self.name, self.rotations))
+            os.rename(self.spool.name, rotated)
+            spool, self.spool = self.spool, self.open_spool()
+            self.flushed = time.time()
+        try:
+            with transaction.atomic():
+                ViewCount.add(counts)
+        except DatabaseError:
+            logger.exception('Could not write %d views; %s is left to recover.',
+                             sum(counts.values()), rotated)
+        else:
+            os.remove(rotated)
+        finally:
+            spool.close()
+
+    def release_idle(self):
+        """Hand views with no newer view for ``flush_seconds`` over to ``recover_spools``.
+
+        A process that gets no requests never reaches ``flush``. Its spool
+        is rotated to a name it does not lock and its counts are dropped,
+        so the next ``flush_views`` pass writes them; the timer opens no
+        database connection of its own.
+        """
+        with self.lock:
+            if not self.counts or time.time() - self.recorded < self.flush_seconds:
+                return
+            self.rotations += 1
+            released = os.path.join(self.root, '{}.{}.idle'.format(
+                self.name, self.rotations))
+            try:
+                os.rename(self.spool.name, released)
+            except FileNotFoundError:
+                return
+            self.counts = Counter()
+            spool, self.spool = self.spool, self.open_spool()
+            self.flushed = time.time()
+        spool.close()
+
+    def watch(self):
+        """Release idle views every ``flush_seconds`` while this is the process's buffer."""
+        while _buffer is self:
+            time.sleep(self.flush_seconds)
+            if _buffer is self:
+                self.release_idle()
+
+
+def recover_spools(root):
+    """Add the views left in the spools of stopped processes, and return them.
+
+    A spool whose lock can be taken has no live owner. A process that
+    stopped after writing its counts but before deleting the spool will
+    have those views counted twice, which is the price of never losing one.
+    A spool its owner flushed and deleted between being listed and locked
+    here is no longer at its path once the lock is taken, and is skipped.
+    """
+    recovered = 0
+    try:
+        names = os.listdir(root)
+    except FileNotFoundError:
+        return recovered
+    for name in sorted(names):
+        path = os.path.join(root, name)
+        try:
+            spool = open(path)
+        except FileNotFoundError:
+            continue
+        with spool:
+            try:
+                fcntl.flock(spool, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                if os.stat(path).st_ino != os.fstat(spool.fileno()).st_ino:
+                    continue
+            except (BlockingIOError, FileNotFoundError):
+                continue
+            counts = read_spool(spool)
+            with transaction.atomic():
+                ViewCount.add(counts)
+            os.remove(path)
+        recovered += sum(counts.values())
+    return recovered
+
+
+_buffer = None
+
+
+def get_buffer():
+    """Return the view buffer of this process, opening a new one after a fork."""
+    global _buffer
+    if (_buffer is None or _buffer.root != settings.VIEW_SPOOL_ROOT or
+            not _buffer.name.startswith('{}-'.format(os.getpid()))):
+        _buffer = ViewBuffer(settings.VIEW_SPOOL_ROOT, settings.VIEW_FLUSH_SECONDS,
+                             settings.VIEW_FLUSH_SIZE)
+        threading.Thread(target=_buffer.watch, daemon=True).start()
+    return _buffer
+
+
+def record_view(kind, object_id):
+    """Count a view of a photo or album without writing to the database."""
+    get_buffer().record(kind, object_id)
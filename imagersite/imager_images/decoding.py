@@ -0,0 +1,143 @@
+"""Process-wide memory budget for decoding images with Pillow."""
+import threading
+import time
+
+from django.conf import settings
+from PIL import Image
+
+
+BYTES_PER_PIXEL = {
+    '1': 1, 'L': 1, 'P': 1, 'I;16': 2, 'LA': 2, 'PA': 2,
+    'RGB': 3, 'YCbCr': 3, 'LAB': 3, 'HSV': 3,
+    'RGBA': 4, 'RGBX': 4, 'CMYK': 4, 'I': 4, 'F': 4,
+}
+
+
+class DecodeRejected(IOError):
+    """The image can not be decoded within the memory budget."""
+
+
+class DecodeTimedOut(DecodeRejected):
+    """The image fits the budget, but not enough of it was free in time."""
+
+
+class DecodeBudget(object):
+    """Cap the bytes of image data being decoded at once in this process.
+
+    Decodes that fit wait in line for the memory held by other decodes,
+    for at most ``timeout`` seconds. Images over ``max_pixels`` or whose
+    decode alone would exceed ``max_bytes`` are rejected outright.
+    """
+
+    def __init__(self, max_bytes, max_pixels, timeout):
+        """Set up an empty budget."""
+        self.max_bytes = max_bytes
+        self.max_pixels = max_pixels
+        self.timeout = timeout
+        self.in_use = 0
+        self.active = 0
+        self.waiting = 0
+        self.decoded = 0
+        self.queued = 0
+        self.rejected = 0
+        self.peak = 0
+        self._condition = threading.Condition()
+
+    def estimate(self, width, height, mode):
+        """Estimate the bytes needed to decode an image of the given size.
+
+        Modes other than RGB and L also pay for the RGB copy made when
+        thumbnails are converted.
+        """
+        pixels = width * height
+        size = pixels * BYTES_PER_PIXEL.get(mode, 4)
+        if mode not in ('RGB', 'L'):
+            size += pixels * 3
+        return size
+
+    def check(self, width, height, mode):
+        """Return the estimated decode size or reject images over the limits."""
+        if width * height > self.max_pixels:
+            self._reject()
+            raise DecodeRejected(
+                'Image of {}x{} pixels is over the limit of {} pixels.'.format(
+                    width, height, self.max_pixels))
+        size = self.estimate(width, height, mode)
+        if size > self.max_bytes:
+            self._reject()
+            raise DecodeRejected(
+                'Image of {}x{} pixels needs more memory than allowed.'.format(
+                    width, height))
+        return size
+
+    def acquire(self, size, timeout=None):
+        """Wait until ``size`` bytes of the budget are free and hold them."""
+        timeout = self.timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            if self.in_use + size > self.max_bytes:
+                self.queued += 1
+                self.waiting += 1
+                try:
+                    while self.in_use + size > self.max_bytes:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self.rejected += 1
+                            raise DecodeTimedOut(
+                                'Timed out waiting for memory to decode the image.')
+                        self._condition.wait(remaining)
+                finally:
+                    self.waiting -= 1
+            self.in_use += size
+            self.active += 1
+            self.decoded += 1
+            self.peak = max(self.peak, self.in_use)
+
+    def release(self, size):
+        """Give ``size`` bytes back to the budget and wake waiting decodes."""
+        with self._condition:
+            self.in_use -= size
+            self.active -= 1
+            self._condition.notify_all()
+
+    def reserve(self, width, height, mode, timeout=None):
+        """Check and acquire the budget for an image, returning the size held."""
+        size = self.check(width, height, mode)
+        self.acquire(size, timeout)
+        return size
+
+    def metrics(self):
+        """Counters describing the decodes seen by this process."""
+        with self._condition:
+            return {
+                'max_bytes': self.max_bytes,
+                'max_pixels': self.max_pixels,
+                'in_use_bytes': self.in_use,
+                'peak_bytes': self.peak,
+                'active': self.active,
+                'waiting': self.waiting,
+                'decoded': self.decoded,
+                'queued': self.queued,
+                'rejected': self.rejected,
+            }
+
+    def _reject(self):
+        """Count a rejected decode."""
+        with self._condition:
+            self.rejected += 1
+
+
+_budget = None
+_budget_lock = threading.Lock()
+
+
+def get_budget():
+    """Return the budget shared by every thread in this process."""
+    global _budget
+    with _budget_lock:
+        if _budget is None:
+            _budget = DecodeBudget(settings.IMAGE_DECODE_MAX_BYTES,
+                                   settings.IMAGE_DECODE_MAX_PIXELS,
+                                   settings.IMAGE_DECODE_TIMEOUT)
+            Image.MAX_IMAGE_PIXELS = settings.IMAGE_DECODE_MAX_PIXELS
+        return _budget
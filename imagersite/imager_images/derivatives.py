@@ -0,0 +1,230 @@
+"""Resized copies of photos rendered on request and kept in a disk cache."""
+from collections import namedtuple
+import hashlib
+import os
+import re
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.urls import reverse
+from django.utils.crypto import constant_time_compare, salted_hmac
+from imager_images.decoding import get_budget
+from PIL import Image, ImageOps
+
+
+Params = namedtuple('Params', ['width', 'height', 'fit', 'quality', 'format'])
+
+PARAMS_PATTERN = re.compile(
+    r'^(?P<width>\d{1,5})x(?P<height>\d{1,5})-(?P<fit>cover|contain)'
+    r'-q(?P<quality>\d{1,3})\.(?P<format>jpg|png|webp)$')
+FORMATS = {'jpg': ('JPEG', 'image/jpeg'),
+           'png': ('PNG', 'image/png'),
+           'webp': ('WEBP', 'image/webp')}
+SIGNATURE_SALT = 'imager_images.derivatives'
+
+# Hits only refresh a file's place in the LRU order this often.
+TOUCH_INTERVAL = 60
+
+EXIF_ORIENTATION = 0x0112
+ORIENTATION_TRANSPOSE = {2: Image.FLIP_LEFT_RIGHT, 3: Image.ROTATE_180,
+                         4: Image.FLIP_TOP_BOTTOM, 5: Image.TRANSPOSE,
+                         6: Image.ROTATE_270, 7: Image.TRANSVERSE,
+                         8: Image.ROTATE_90}
+
+
+class InvalidParams(ValueError):
+    """The derivative parameters are malformed or out of range."""
+
+
+def format_params(width, height, fit='cover', quality=85, format='jpg'):
+    """The canonical parameter string, like ``250x250-cover-q85.jpg``."""
+    return '{}x{}-{}-q{}.{}'.format(width, height, fit, quality, format)
+
+
+def parse_params(value):
+    """Parse and range check a parameter string."""
+    match = PARAMS_PATTERN.match(value)
+    if not match:
+        raise InvalidParams('Malformed derivative parameters.')
+    params = Params(int(match.group('width')), int(match.group('height')),
+                    match.group('fit'), int(match.group('quality')),
+                    match.group('format'))
+    largest = settings.DERIVATIVE_MAX_DIMENSION
+    if not (0 < params.width <= largest and 0 < params.height <= largest):
+        raise InvalidParams('Derivative size out of range.')
+    if not 1 <= params.quality <= 100:
+        raise InvalidParams('Derivative quality out of range.')
+    Image.init()
+    if FORMATS[params.format][0] not in Image.SAVE:
+        raise InvalidParams('Derivative format not supported.')
+    return params
+
+
+def sign(photo_id, params):
+    """The HMAC of a photo id and parameter string."""
+    value = '{}/{}'.format(photo_id, params)
+    return salted_hmac(SIGNATURE_SALT, value).hexdigest()[:20]
+
+
+def verify(photo_id, params, signature):
+    """Whether the signature was made for this photo and these parameters."""
+    return constant_time_compare(sign(photo_id, params), signature)
+
+
+def derivative_url(photo, width, height, fit='cover', quality=85, format='jpg'):
+    """The signed URL of a resized copy of the photo."""
+    params = format_params(width, height, fit, quality, format)
+    return reverse('photo_derivative', kwargs={
+        'id': photo.id, 'signature': sign(photo.id, params), 'params': params})
+
+
+def cache_path(photo, params):
+    """Where the derivative of the photo's current image is cached.
+
+    The name includes a hash of the image name, so replacing a photo's
+    image never serves derivatives of the old one.
+    """
+    source = hashlib.sha1(photo.image.name.encode('utf8')).hexdigest()[:12]
+    return os.path.join(settings.DERIVATIVE_CACHE_ROOT, str(photo.id),
+                        '{}-{}'.format(source, params))
+
+
+def render(photo, params):
+    """Resize the photo's original image to the parameters."""
+    with photo.image.storage.open(photo.image.name, 'rb') as original:
+        image = Image.open(original)
+        if image.format == 'JPEG':
+            image.draft('RGB', (params.width, params.height))
+        width, height = image.size
+        budget = get_budget()
+        reserved = budget.reserve(width, height, image.mode)
+        try:
+            image = orient(image)
+            if params.fit == 'cover':
+                image = ImageOps.fit(image, (params.width, params.height), Image.LANCZOS)
+            else:
+                image = image.copy()
+                image.thumbnail((params.width, params.height), Image.LANCZOS)
+        finally:
+            budget.release(reserved)
+    if params.format == 'jpg' and image.mode != 'RGB':
+        image = image.convert('RGB')
+    return image
+
+
+def orient(image):
+    """Turn the image upright according to its EXIF orientation."""
+    try:
+        orientation = image._getexif().get(EXIF_ORIENTATION)
+    except Exception:
+        return image
+    if orientation in ORIENTATION_TRANSPOSE:
+        return image.transpose(ORIENTATION_TRANSPOSE[orientation])
+    return image
+
+
+class DerivativeCache(object):
+    """A size-bounded directory of derivatives evicted least recently used.
+
+    Recency is the file's modification time, refreshed on hits, so every
+    process sharing the directory agrees on the order.
+    """
+
+    def __init__(self, root, max_bytes):
+        """Track the approximate size of the directory."""
+        self.root = root
+        self.max_bytes = max_bytes
+        self.size = None
+        self._lock = threading.Lock()
+
+    def get(self, path):
+        """Return the path if cached, marking it as recently used."""
+        try:
+            modified = os.stat(path).st_mtime
+        except OSError:
+            return None
+        if time.time() - modified > TOUCH_INTERVAL:
+            try:
+                os.utime(path)
+            except OSError:
+                return None
+        return path
+
+    def put(self, path, image, params):
+        """Encode the image into the cache and evict if over the size bound."""
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        format, _ = FORMATS[params.format]
+        handle, temporary = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(handle, 'wb') as output:
+                image.save(output, format, quality=params.quality)
+            os.replace(temporary, path)
+        except Exception:
+            os.unlink(temporary)
+            raise
+        with self._lock:
+            if self.size is None:
+                self.size = self.scan()[1]
+            else:
+                self.size += os.path.getsize(path)
+            if self.size > self.max_bytes:
+                self.evict()
+        return path
+
+    def scan(self):
+        """List cached files oldest first with the total size."""
+        entries = []
+        total = 0
+        for directory, _, names in os.walk(self.root):
+            for name in names:
+                path = os.path.join(directory, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+        entries.sort()
+        return entries, total
+
+    def evict(self):
+        """Delete least recently used files until the cache is under 90% of its bound."""
+        entries, total = self.scan()
+        target = self.max_bytes * 0.9
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                os.unlink(path)
+            except OSError:
+                continue
+            total -= size
+        self.size = total
+
+    def purge(self, photo_id):
+        """Delete every cached derivative of a photo."""
+        directory = os.path.join(self.root, str(photo_id))
+        if not os.path.isdir(directory):
+            return
+        for name in os.listdir(directory):
+            try:
+                os.unlink(os.path.join(directory, name))
+            except OSError:
+                pass
+        with self._lock:
+            self.size = None
+
+
+_cache = None
+
+
+def get_cache():
+    """Return the derivative cache shared by this process."""
+    global _cache
+    if _cache is None or _cache.root != settings.DERIVATIVE_CACHE_ROOT:
+        _cache = DerivativeCache(settings.DERIVATIVE_CACHE_ROOT,
+                                 settings.DERIVATIVE_CACHE_MAX_BYTES)
+    return _cache
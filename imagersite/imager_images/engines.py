@@ -0,0 +1,53 @@
+"""Thumbnail engine that decodes within the process memory budget."""
+from contextlib import contextmanager
+
+from sorl.thumbnail.engines.pil_engine import Engine
+
+from imager_images.decoding import get_budget
+
+
+class BudgetedEngine(Engine):
+    """Pillow engine holding decode memory from open until cleanup.
+
+    sorl reads an opened image's info and size before it enters the
+    ``try`` whose ``finally`` calls ``cleanup``, so those reads release
+    the reservation themselves if they raise.
+    """
+
+    def get_image(self, source):
+        """Open the image and reserve the memory needed to decode it."""
+        image = super(BudgetedEngine, self).get_image(source)
+        width, height = image.size
+        image.decode_reservation = get_budget().reserve(width, height, image.mode)
+        return image
+
+    @contextmanager
+    def released_on_error(self, image):
+        """Release the image's reservation if the block raises."""
+        try:
+            yield
+        except BaseException:
+            self.release(image)
+            raise
+
+    def get_image_info(self, image):
+        """The image's info, releasing its memory if reading it fails."""
+        with self.released_on_error(image):
+            return super(BudgetedEngine, self).get_image_info(image)
+
+    def get_image_size(self, image):
+        """The image's size, releasing its memory if reading it fails."""
+        with self.released_on_error(image):
+            return super(BudgetedEngine, self).get_image_size(image)
+
+    def release(self, image):
+        """Release the memory reserved for the image, once."""
+        size = getattr(image, 'decode_reservation', None)
+        if size is not None:
+            del image.decode_reservation
+            get_budget().release(size)
+
+    def cleanup(self, image):
+        """Release the memory reserved for the image."""
+        super(BudgetedEngine, self).cleanup(image)
+        self.release(image)
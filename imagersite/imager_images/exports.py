@@ -0,0 +1,306 @@
+"""Copies of whole accounts, written to media storage as ZIP archives a piece at a time."""
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from itertools import chain, groupby
+import json
+import os
+import tempfile
+import time
+import uuid
+import zipfile
+
+from django.conf import settings
+from django.core.mail import send_mail
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Q
+from django.template.loader import render_to_string
+from django.utils import timezone
+from imager_images.models import Album, AlbumPhoto, Photo
+from imager_profile.models import AccountExport
+
+CHUNK_SIZE = 1024 * 1024
+HEARTBEAT_SECONDS = 60
+PROFILE_FIELDS = ('website', 'location', 'fee', 'camera', 'bio', 'phone')
+
+
+def request_export(user, page_url):
+    """Queue an export of the user's account, unless one is already waiting."""
+    with transaction.atomic():
+        pending = (AccountExport.objects.select_for_update()
+                   .filter(user=user, completed=None, failed=False).first())
+        return pending or AccountExport.objects.create(user=user, page_url=page_url)
+
+
+def claim_export():
+    """Claim the oldest export that no live worker is building, or return None.
+
+    The claim records the name the archive will be written to, so claiming
+    an export again after its worker died deletes what that worker left.
+    """
+    stale = timezone.now() - timedelta(seconds=settings.ACCOUNT_EXPORT_STALE_SECONDS)
+    with transaction.atomic():
+        export = (AccountExport.objects.select_for_update(skip_locked=True)
+                  .filter(completed=None, failed=False)
+                  .filter(Q(heartbeat=None) | Q(heartbeat__lt=stale))
+                  .select_related('user').order_by('requested').first())
+        if export is None:
+            return None
+        partial = export.archive.name
+        export.heartbeat = timezone.now()
+        export.archive = 'exports/{}/{}.zip'.format(export.user_id, uuid.uuid4().hex)
+        export.save(update_fields=['heartbeat', 'archive'])
+    if partial:
+        export.archive.storage.delete(partial)
+    return export
+
+
+def batches(queryset, batch_size):
+    """Yield the queryset's rows in id order, one query per batch."""
+    last_id = 0
+    while True:
+        batch = list(queryset.filter(id__gt=last_id).order_by('id')[:batch_size])
+        if not batch:
+            return
+        last_id = batch[-1].id
+        yield batch
+
+
+def archive_name(photo):
+    """Where a photo's original goes in the archive."""
+    return 'photos/{}{}'.format(photo.id, os.path.splitext(photo.image.name)[1].lower())
+
+
+def user_entry(user):
+    """The manifest entry of the user and their profile."""
+    profile = user.profile
+    entry = {field: getattr(user, field) for field in
+             ('username', 'email', 'first_name', 'last_name', 'date_joined')}
+    entry.update({field: getattr(profile, field) for field in PROFILE_FIELDS})
+    entry.update(services=profile.service_list, photostyles=profile.photostyle_list)
+    return entry
+
+
+def item_entry(item):
+    """The manifest fields a photo and an album share."""
+    return {field: getattr(item, field) for field in
+            ('id', 'title', 'description', 'published', 'date_uploaded',
+             'date_modified', 'date_published')}
+
+
+def album_entries(user, batch_size):
+    """Yield the manifest entry of each album, with its photos in album order."""
+    for batch in batches(Album.objects.filter(user=user), batch_size):
+        members = (AlbumPhoto.objects.filter(album_id__in=[album.id for album in batch])
+                   .order_by('album_id', 'rank').values_list('album_id', 'photo_id'))
+        photos = {album_id: [photo_id for _, photo_id in rows]
+                  for album_id, rows in groupby(members, lambda row: row[0])}
+        for album in batch:
+            entry = item_entry(album)
+            entry.update(cover=album.cover_id, photos=photos.get(album.id, []))
+            yield entry
+
+
+def photo_entries(user, batch_size):
+    """Yield the manifest entry of each photo, naming its original in the archive."""
+    photos = Photo.objects.filter(user=user).prefetch_related('tags')
+    for batch in batches(photos, batch_size):
+        for photo in batch:
+            entry = item_entry(photo)
+            entry.update(file=archive_name(photo), width=photo.width, height=photo.height,
+                         tags=sorted(tag.name for tag in photo.tags.all()))
+            yield entry
+
+
+def manifest_chunks(user, batch_size):
+    """Yield the JSON manifest of the account a piece at a time."""
+    def dump(value):
+        """A manifest value as JSON."""
+        return json.dumps(value, cls=DjangoJSONEncoder)
+
+    yield '{"user": ' + dump(user_entry(user))
+    for key, entries in (('albums', album_entries(user, batch_size)),
+                         ('photos', photo_entries(user, batch_size))):
+        yield ', "{}": ['.format(key)
+        for index, entry in enumerate(entries):
+            yield (', ' if index else '') + dump(entry)
+        yield ']'
+    yield '}'
+
+
+def fetch(storage, name):
+    """Copy a stored file to a rewound temporary file, or None if it cannot be read.
+
+    The copy is kept in memory up to ``CHUNK_SIZE`` and on local disk past
+    that, so no original is ever held in memory whole.
+    """
+    spool = tempfile.SpooledTemporaryFile(max_size=CHUNK_SIZE)
+    try:
+        with storage.open(name) as original:
+            for chunk in original.chunks(CHUNK_SIZE):
+                spool.write(chunk)
+    except (IOError, OSError):
+        spool.close()
+        return None
+    spool.seek(0)
+    return spool
+
+
+def close_fetched(future):
+    """Close the copy a fetch made once it finishes, if it made one."""
+    if not future.cancelled() and future.exception() is None and future.result():
+        future.result().close()
+
+
+def prefetched(storage, photos, workers):
+    """Yield each photo with the copy of its original, fetching up to ``workers`` ahead.
+
+    The caller closes each copy it is given; copies still waiting when the
+    caller stops are closed here.
+    """
+    pending = deque()
+    with ThreadPoolExecutor(workers) as pool:
+        try:
+            for photo in photos:
+                if len(pending) >= workers:
+                    ready, future = pending.popleft()
+                    yield ready, future.result()
+                pending.append((photo, pool.submit(fetch, storage, photo.image.name)))
+            while pending:
+                ready, future = pending.popleft()
+                yield ready, future.result()
+        finally:
+            for _, future in pending:
+                future.cancel()
+                future.add_done_callback(close_fetched)
+
+
+class StreamWriter(object):
+    """A forward-only view of a storage file being written.
+
+    Files such as S3 multipart uploads cannot be rewritten, so zipfile is
+    given no ``seek`` and writes each entry's sizes after its data instead.
+    """
+
+    def __init__(self, file):
+        """Count the bytes written to ``file``."""
+        self.file = file
+        self.written = 0
+
+    def write(self, data):
+        """Append data to the file."""
+        self.file.write(data)
+        self.written += len(data)
+        return len(data)
+
+    def tell(self):
+        """The number of bytes written so far."""
+        return self.written
+
+    def flush(self):
+        """Leave flushing to closing the storage file."""
+
+
+def open_for_writing(storage, name):
+    """Open a new storage file to write a piece at a time."""
+    try:
+        os.makedirs(os.path.dirname(storage.path(name)), exist_ok=True)
+    except NotImplementedError:
+        pass
+    return storage.open(name, 'wb')
+
+
+def write_archive(export, name, workers, batch_size):
+    """Write the export's archive to storage and return its size and photo count.
+
+    The manifest comes first, then every original, stored uncompressed as
+    it already is. Missing originals are listed in ``missing.txt``.
+    """
+    user = export.user
+    originals = Photo._meta.get_field('image').storage
+    storage = AccountExport._meta.get_field('archive').storage
+    beaten = time.monotonic()
+    copied = 0
+    missing = []
+    with open_for_writing(storage, name) as out:
+        writer = StreamWriter(out)
+        with zipfile.ZipFile(writer, 'w', zipfile.ZIP_DEFLATED, allowZip64=True) as archive:
+            with archive.open('manifest.json', 'w') as entry:
+                for chunk in manifest_chunks(user, batch_size):
+                    entry.write(chunk.encode('utf8'))
+
+            photos = chain.from_iterable(batches(Photo.objects.filter(user=user), batch_size))
+            for photo, copy in prefetched(originals, photos, workers):
+                if copy is None:
+                    missing.append(photo.image.name)
+                    continue
+                with copy:
+                    info = zipfile.ZipInfo(archive_name(photo),
+                                           photo.date_uploaded.timetuple()[:6])
+                    info.compress_type = zipfile.ZIP_STORED
+                    copy.seek(0, os.SEEK_END)
+                    info.file_size = copy.tell()
+                    copy.seek(0)
+                    with archive.open(info, 'w') as entry:
+                        for chunk in iter(lambda: copy.read(CHUNK_SIZE), b''):
+                            entry.write(chunk)
+                copied += 1
+                if time.monotonic() - beaten >= HEARTBEAT_SECONDS:
+                    AccountExport.objects.filter(id=export.id).update(heartbeat=timezone.now())
+                    beaten = time.monotonic()
+
+            if missing:
+                archive.writestr('missing.txt', '\n'.join(missing) + '\n')
+    return writer.written, copied
+
+
+def notify(export):
+    """Email the user that their archive is ready to download."""
+    if not export.user.email:
+        return
+    context = {'user': export.user, 'export': export, 'days': settings.ACCOUNT_EXPORT_DAYS}
+    send_mail(render_to_string('imager_profile/export_ready_email_subject.txt', context).strip(),
+              render_to_string('imager_profile/export_ready_email.txt', context),
+              None, [export.user.email])
+
+
+def run_export(export, workers=8, batch_size=500):
+    """Build a claimed export under the name its claim recorded, mark it done and tell its user.
+
+    Exports of deactivated accounts fail without being built. If writing
+    fails, the partial archive is deleted, the export marked failed, and
+    the error raised.
+    """
+    if not export.user.is_active:
+        AccountExport.objects.filter(id=export.id).update(failed=True, archive='')
+        return
+    name = export.archive.name
+    try:
+        size, copied = write_archive(export, name, workers, batch_size)
+    except Exception:
+        export.archive.storage.delete(name)
+        AccountExport.objects.filter(id=export.id).update(failed=True, archive='')
+        raise
+    export.size = size
+    export.photo_count = copied
+    export.completed = timezone.now()
+    export.save(update_fields=['size', 'photo_count', 'completed'])
+    notify(export)
+
+
+def delete_archives(exports):
+    """Delete the archives of the exports from storage and forget them."""
+    storage = AccountExport._meta.get_field('archive').storage
+    deleted = 0
+    for export in exports.exclude(archive=''):
+        storage.delete(export.archive.name)
+        AccountExport.objects.filter(id=export.id).update(archive='')
+        deleted += 1
+    return deleted
+
+
+def expire_exports():
+    """Delete the archives of exports finished more than ACCOUNT_EXPORT_DAYS ago."""
+    cutoff = timezone.now() - timedelta(days=settings.ACCOUNT_EXPORT_DAYS)
+    return delete_archives(AccountExport.objects.filter(completed__lt=cutoff))
@@ -0,0 +1,48 @@
+"""Photos users have favorited, and the like counts kept from them."""
+from imager_images.models import Favorite
+
+
+def can_favorite(user, photo):
+    """Whether the user may favorite the photo: someone else's public photo."""
+    return photo.user_id != user.id and photo.published == 'PUBLIC'
+
+
+def favorite(user, photo):
+    """Favorite a photo, and return whether it was not a favorite already."""
+    if not can_favorite(user, photo):
+        return False
+    _, created = Favorite.objects.get_or_create(user=user, photo=photo)
+    return created
+
+
+def unfavorite(user, photo):
+    """Stop favoriting a photo, and return whether it was a favorite."""
+    deleted, _ = Favorite.objects.filter(user=user, photo=photo).delete()
+    return bool(deleted)
+
+
+def favorited_ids(user, photo_ids):
+    """The ids among ``photo_ids`` the user has favorited, in one query."""
+    if not user.is_authenticated or not photo_ids:
+        return set()
+    return set(Favorite.objects.filter(user=user, photo_id__in=photo_ids)
+               .values_list('photo_id', flat=True))
+
+
+def read_favorites(user, after=None, limit=20):
+    """Return a page of the user's favorite photos newest first and the next cursor.
+
+    Pages continue from the id of the last favorite seen, so each is a
+    range scan of the ``(user, id)`` index. Photos that are no longer
+    public are left out but stay favorited.
+    """
+    favorites = (Favorite.objects.filter(user=user, photo__published='PUBLIC',
+                                         photo__user__is_active=True)
+                 .select_related('photo__user').order_by('-id'))
+    try:
+        favorites = favorites.filter(id__lt=int(after)) if after else favorites
+    except ValueError:
+        pass
+    page = list(favorites[:limit + 1])
+    next_cursor = str(page[limit - 1].id) if len(page) > limit else None
+    return [favorite.photo for favorite in page[:limit]], next_cursor
@@ -0,0 +1,153 @@
+"""Following photographers and reading their newly published photos and albums."""
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from imager_images.models import FanOutJob, FEED_KINDS, TimelineEntry
+from imager_profile.models import Follow, ImagerProfile
+
+FEED_MODELS = {kind: model for model, kind in FEED_KINDS.items()}
+
+
+def is_pulled(author_id):
+    """Whether the author has too many followers to copy items into their timelines."""
+    return ImagerProfile.objects.filter(
+        user_id=author_id, follower_count__gte=settings.FEED_FAN_OUT_LIMIT).exists()
+
+
+def follow(follower, followed):
+    """Follow a photographer and copy their latest public items into the timeline."""
+    if follower.id == followed.id:
+        return False
+    with transaction.atomic():
+        _, created = Follow.objects.get_or_create(follower=follower, followed=followed)
+        if created and not is_pulled(followed.id):
+            for model, kind in FEED_KINDS.items():
+                latest = (model.active.filter(user=followed, published='PUBLIC')
+                          .order_by('-date_published')
+                          .values_list('id', 'date_published')[:settings.FEED_BACKFILL])
+                for pk, published in latest:
+                    TimelineEntry.add([follower.id], followed.id, kind, pk, published)
+    return created
+
+
+def unfollow(follower, followed):
+    """Stop following a photographer and drop their items from the timeline."""
+    with transaction.atomic():
+        deleted, _ = Follow.objects.filter(follower=follower, followed=followed).delete()
+        TimelineEntry.objects.filter(owner=follower, author=followed).delete()
+    return bool(deleted)
+
+
+def fan_out_batch(batch_size=1000):
+    """Copy the oldest queued item to its next batch of followers.
+
+    Jobs are claimed with ``FOR UPDATE SKIP LOCKED`` so several workers
+    can run, and each batch is one transaction. Returns False once the
+    queue is empty.
+    """
+    with transaction.atomic():
+        job = FanOutJob.objects.select_for_update(skip_locked=True).order_by('id').first()
+        if job is None:
+            return False
+        followers = []
+        if not is_pulled(job.author_id):
+            followers = list(Follow.objects.filter(
+                followed_id=job.author_id, follower_id__gt=job.last_follower_id)
+                .order_by('follower_id').values_list('follower_id', flat=True)[:batch_size])
+            TimelineEntry.add(followers, job.author_id, job.kind, job.object_id, job.published)
+        if len(followers) < batch_size:
+            job.delete()
+        else:
+            job.last_follower_id = followers[-1]
+            job.save(update_fields=['last_follower_id'])
+    return True
+
+
+def encode_cursor(key):
+    """The position after a ``(published, kind, id)`` feed key."""
+    published, kind, pk = key
+    return '{}_{}_{}'.format(published.isoformat(), kind, pk)
+
+
+def decode_cursor(cursor):
+    """Split a cursor into its feed key, or None if malformed."""
+    try:
+        published, kind, pk = cursor.rsplit('_', 2)
+        published = parse_datetime(published)
+        if published is None or kind not in FEED_MODELS:
+            return None
+        return published, kind, int(pk)
+    except (AttributeError, ValueError):
+        return None
+
+
+def pulled_authors(user):
+    """The ids of the followed authors whose items are read rather than copied."""
+    return list(Follow.objects.filter(
+        follower=user, followed__profile__follower_count__gte=settings.FEED_FAN_OUT_LIMIT
+    ).values_list('followed_id', flat=True))
+
+
+def timeline_keys(user, position, limit, pulled=()):
+    """Keys of the user's timeline after the position, by one index range scan.
+
+    Entries of the ``pulled`` authors are left out: they were copied
+    before the author passed the fan out limit, and ``pulled_keys``
+    returns the same items.
+    """
+    entries = TimelineEntry.objects.filter(owner=user).exclude(
+        author_id__in=pulled).order_by('-published', '-kind', '-object_id')
+    if position:
+        entries = entries.extra(where=['(published, kind, object_id) < (%s, %s, %s)'],
+                                params=list(position))
+    return list(entries.values_list('published', 'kind', 'object_id')[:limit])
+
+
+def pulled_keys(authors, position, limit):
+    """Keys of items after the position by the given authors, whose items are not copied."""
+    keys = []
+    if not authors:
+        return keys
+    for model, kind in FEED_KINDS.items():
+        items = model.active.filter(user_id__in=authors, published='PUBLIC')
+        if position:
+            published, after_kind, pk = position
+            before = Q(date_published__lt=published)
+            if kind < after_kind:
+                before |= Q(date_published=published)
+            elif kind == after_kind:
+                before |= Q(date_published=published, id__lt=pk)
+            items = items.filter(before)
+        keys.extend((published, kind, pk) for published, pk in items.order_by(
+            '-date_published', '-id').values_list('date_published', 'id')[:limit])
+    return keys
+
+
+def read_feed(user, cursor=None, limit=20):
+    """Return a page of ``(kind, item)`` newest first and the cursor for the next page.
+
+    Copied timeline entries are merged with the items of followed authors
+    too popular to copy, each item once. Items since made private,
+    deleted or belonging to deactivated accounts are skipped.
+    """
+    position = decode_cursor(cursor) if cursor else None
+    pulled = pulled_authors(user)
+    page = []
+    while len(page) <= limit:
+        keys = sorted(timeline_keys(user, position, limit + 1, pulled) +
+                      pulled_keys(pulled, position, limit + 1), reverse=True)[:limit + 1]
+        if not keys:
+            break
+        visible = {}
+        for kind, model in FEED_MODELS.items():
+            ids = [pk for _, key_kind, pk in keys if key_kind == kind]
+            visible[kind] = model.active.filter(published='PUBLIC').select_related(
+                'user').in_bulk(ids)
+        page.extend((key, key[1], visible[key[1]][key[2]]) for key in keys
+                    if key[2] in visible[key[1]])
+        position = keys[-1]
+        if len(keys) <= limit:
+            break
+    next_cursor = encode_cursor(page[limit - 1][0]) if len(page) > limit else None
+    return [(kind, item) for _, kind, item in page[:limit]], next_cursor
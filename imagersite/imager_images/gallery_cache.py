@@ -0,0 +1,34 @@
+"""The version that keys the cached public galleries."""
+import time
+
+from django.core.cache import cache
+from django.db import connection, transaction
+
+VERSION_KEY = 'gallery-version'
+
+
+def new_version():
+    """A version no earlier one can equal, even after the key was evicted."""
+    return int(time.time() * 1000000)
+
+
+def gallery_version():
+    """The current version, which changes whenever the galleries must be rebuilt."""
+    return cache.get_or_set(VERSION_KEY, new_version, None)
+
+
+def invalidate_galleries():
+    """Move to a new version, so every cached gallery is rebuilt on next view.
+
+    The version is replaced rather than incremented, as the database cache
+    increments by reading and writing back, and two processes doing so at
+    once would leave one change behind a version already in use. Inside a
+    transaction it moves again on commit, as another process may have
+    cached a gallery of the rows as they were before it.
+    """
+    def replace():
+        """Store a new version."""
+        cache.set(VERSION_KEY, new_version(), None)
+    replace()
+    if connection.in_atomic_block:
+        transaction.on_commit(replace)
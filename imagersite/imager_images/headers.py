@@ -0,0 +1,127 @@
+"""Read the format and dimensions of an image from its container header."""
+from collections import namedtuple
+import struct
+
+
+ImageHeader = namedtuple('ImageHeader', ['format', 'width', 'height', 'mode'])
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+PNG_MODES = {0: 'L', 2: 'RGB', 3: 'P', 4: 'LA', 6: 'RGBA'}
+JPEG_MODES = {1: 'L', 3: 'RGB', 4: 'CMYK'}
+JPEG_SOF_MARKERS = {0xc0, 0xc1, 0xc2, 0xc3, 0xc5, 0xc6, 0xc7,
+                    0xc9, 0xca, 0xcb, 0xcd, 0xce, 0xcf}
+JPEG_STANDALONE_MARKERS = {0x01} | set(range(0xd0, 0xd8))
+
+# JPEG files can carry large EXIF and ICC segments ahead of the frame header.
+JPEG_MAX_SCAN = 1024 * 1024
+
+
+class HeaderError(ValueError):
+    """The file is not a supported image or its header is cut short."""
+
+
+def read_image_header(image):
+    """Parse the header of a JPEG, PNG, GIF or WebP file.
+
+    Only the first bytes of the file are read, and the file position is
+    restored afterwards.
+    """
+    position = image.tell()
+    try:
+        image.seek(0)
+        start = image.read(16)
+        if start.startswith(PNG_SIGNATURE):
+            return _read_png(start, image)
+        if start.startswith(b'\xff\xd8'):
+            image.seek(2)
+            return _read_jpeg(image)
+        if start[:6] in (b'GIF87a', b'GIF89a'):
+            return _read_gif(start)
+        if start[:4] == b'RIFF' and start[8:12] == b'WEBP':
+            image.seek(12)
+            return _read_webp(image)
+        raise HeaderError('Unsupported image format.')
+    finally:
+        image.seek(position)
+
+
+def _read_exactly(image, size):
+    """Read ``size`` bytes or fail because the file is truncated."""
+    data = image.read(size)
+    if len(data) < size:
+        raise HeaderError('The image file is truncated.')
+    return data
+
+
+def _read_png(start, image):
+    """Read the IHDR chunk that must follow the PNG signature."""
+    data = start[8:] + _read_exactly(image, 17)
+    length, chunk_type = struct.unpack('>I4s', data[:8])
+    if chunk_type != b'IHDR' or length != 13:
+        raise HeaderError('The PNG header is missing.')
+    width, height, _, color_type = struct.unpack('>IIBB', data[8:18])
+    return ImageHeader('PNG', width, height, PNG_MODES.get(color_type, 'RGBA'))
+
+
+def _read_jpeg(image):
+    """Walk the JPEG segments up to the first start-of-frame marker."""
+    scanned = 0
+    while scanned < JPEG_MAX_SCAN:
+        byte = _read_exactly(image, 1)
+        scanned += 1
+        if byte != b'\xff':
+            raise HeaderError('The JPEG header is corrupt.')
+        marker = _read_exactly(image, 1)[0]
+        while marker == 0xff:
+            marker = _read_exactly(image, 1)[0]
+        scanned += 1
+        if marker in JPEG_STANDALONE_MARKERS:
+            continue
+        if marker in (0xd9, 0xda):
+            break
+        length = struct.unpack('>H', _read_exactly(image, 2))[0]
+        if length < 2:
+            raise HeaderError('The JPEG header is corrupt.')
+        if marker in JPEG_SOF_MARKERS:
+            frame = _read_exactly(image, 6)
+            _, height, width, components = struct.unpack('>BHHB', frame)
+            return ImageHeader('JPEG', width, height,
+                               JPEG_MODES.get(components, 'CMYK'))
+        _read_exactly(image, length - 2)
+        scanned += length
+    raise HeaderError('The JPEG frame header is missing.')
+
+
+def _read_gif(start):
+    """Read the logical screen size that follows the GIF signature."""
+    if len(start) < 10:
+        raise HeaderError('The image file is truncated.')
+    width, height = struct.unpack('<HH', start[6:10])
+    return ImageHeader('GIF', width, height, 'P')
+
+
+def _read_webp(image):
+    """Read the size from the first VP8, VP8L or VP8X chunk."""
+    chunk_type = _read_exactly(image, 8)[:4]
+    if chunk_type == b'VP8 ':
+        frame = _read_exactly(image, 10)
+        if frame[3:6] != b'\x9d\x01\x2a':
+            raise HeaderError('The WebP header is corrupt.')
+        width, height = struct.unpack('<HH', frame[6:10])
+        return ImageHeader('WEBP', width & 0x3fff, height & 0x3fff, 'RGB')
+    if chunk_type == b'VP8L':
+        frame = _read_exactly(image, 5)
+        if frame[0] != 0x2f:
+            raise HeaderError('The WebP header is corrupt.')
+        bits = struct.unpack('<I', frame[1:])[0]
+        width = (bits & 0x3fff) + 1
+        height = ((bits >> 14) & 0x3fff) + 1
+        mode = 'RGBA' if bits >> 28 & 1 else 'RGB'
+        return ImageHeader('WEBP', width, height, mode)
+    if chunk_type == b'VP8X':
+        frame = _read_exactly(image, 10)
+        width = int.from_bytes(frame[4:7], 'little') + 1
+        height = int.from_bytes(frame[7:10], 'little') + 1
+        mode = 'RGBA' if frame[0] & 0x10 else 'RGB'
+        return ImageHeader('WEBP', width, height, mode)
+    raise HeaderError('Unsupported WebP encoding.')
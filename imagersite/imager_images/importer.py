@@ -0,0 +1,120 @@
+"""Import directories of image files as one user's photos, in bulk."""
+from itertools import groupby
+import os
+
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.utils import timezone
+from imager_images.decoding import DecodeRejected, get_budget
+from imager_images.gallery_cache import invalidate_galleries
+from imager_images.headers import HeaderError, read_image_header
+from imager_images.models import Album, Photo, touch_feeds, UPLOAD_FORMATS
+from imager_images.storage import hash_file
+from imagersite.sitemap_cache import invalidate_shards
+
+EXTENSIONS = {'JPEG': '.jpg', 'PNG': '.png', 'GIF': '.gif', 'WEBP': '.webp'}
+
+
+def find_files(root):
+    """Yield ``(path, folder)`` for every file below ``root`` in name order.
+
+    ``folder`` is the file's directory relative to ``root``, or empty at
+    the top. Hidden files are left out.
+    """
+    for directory, subdirectories, names in os.walk(root):
+        subdirectories.sort()
+        folder = os.path.relpath(directory, root)
+        for name in sorted(names):
+            if not name.startswith('.'):
+                yield os.path.join(directory, name), '' if folder == '.' else folder
+
+
+def inspect(path):
+    """Check a file as an upload would be, and read its header and SHA-1.
+
+    This runs in a worker process. Returns ``(header, digest, None)``, or
+    ``(None, None, reason)`` for a file an upload would refuse.
+    """
+    try:
+        size = os.path.getsize(path)
+        if size > settings.IMAGE_UPLOAD_MAX_BYTES:
+            return None, None, 'over {} bytes'.format(settings.IMAGE_UPLOAD_MAX_BYTES)
+        with open(path, 'rb') as image:
+            header = read_image_header(image)
+            if header.format not in UPLOAD_FORMATS:
+                return None, None, 'unsupported format {}'.format(header.format)
+            get_budget().check(header.width, header.height, header.mode)
+            return header, hash_file(File(image)), None
+    except (HeaderError, DecodeRejected, OSError) as error:
+        return None, None, str(error)
+
+
+def store(storage, name, path):
+    """Save a file under its content name, unless an earlier run already did."""
+    if storage.exists(name):
+        return
+    with open(path, 'rb') as content:
+        storage.save(name, File(content))
+
+
+def album_for(user, folder, published, albums):
+    """The user's album titled after a folder, made on first use and kept in ``albums``."""
+    if folder not in albums:
+        title = folder.replace(os.sep, ' / ')[:180]
+        albums[folder] = (Album.objects.filter(user=user, title=title).order_by('id').first() or
+                          Album.objects.create(user=user, title=title, published=published))
+    return albums[folder]
+
+
+def import_batch(user, files, published, pool, albums=None):
+    """Store a batch of checked files and create their photos in one INSERT.
+
+    ``files`` holds ``(path, folder, header, digest)``. Originals are named
+    by their content and written by the thread ``pool``, so a file this
+    user already imported, by an earlier run or twice in one, becomes a
+    single photo. ``bulk_create`` sends no signals, so the caller runs
+    ``finish_import`` once at the end. With ``albums``, a dict, each photo
+    is added to the album of its folder. Returns the new photos' count.
+    """
+    field = Photo._meta.get_field('image')
+    names = [field.upload_to.path_for(digest, EXTENSIONS[header.format])
+             for _, _, header, digest in files]
+    ids = dict(Photo.objects.filter(user=user, image__in=names).values_list('image', 'id'))
+    new = {}
+    for (path, _, header, _), name in zip(files, names):
+        if name not in ids:
+            new.setdefault(name, (path, header))
+    list(pool.map(lambda item: store(field.storage, item[0], item[1][0]), new.items()))
+
+    now = timezone.now() if published == 'PUBLIC' else None
+    with transaction.atomic():
+        photos = Photo.objects.bulk_create(
+            Photo(user=user, image=name, published=published, date_published=now,
+                  title=os.path.splitext(os.path.basename(path))[0][:180],
+                  width=header.width, height=header.height, image_format=header.format)
+            for name, (path, header) in new.items())
+        ids.update((photo.image.name, photo.id) for photo in photos)
+        if albums is not None:
+            members = [(folder, ids[name]) for (_, folder, _, _), name in zip(files, names)
+                       if folder]
+            for folder, rows in groupby(members, lambda row: row[0]):
+                photo_ids = [pk for _, pk in rows]
+                album = album_for(user, folder, published, albums)
+                album.photos.add(*photo_ids)
+                if album.cover_id is None:
+                    album.cover_id = photo_ids[0]
+                    album.save()
+    invalidate_shards('photos', [photo.id for photo in photos])
+    return len(photos)
+
+
+def finish_import(user, published):
+    """Drop what the skipped signals would have as photos were created.
+
+    Imported photos are not fanned out to followers' timelines, as an
+    import is an archive rather than news.
+    """
+    invalidate_galleries()
+    if published == 'PUBLIC':
+        touch_feeds([user.id])
@@ -0,0 +1,271 @@
+"""Synthetic users, photos, albums and links at production scale, for measuring performance."""
+from collections import Counter
+from datetime import datetime, timedelta
+import io
+from itertools import accumulate
+import math
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.contrib.postgres.search import SearchVectorField
+from django.core.files.base import ContentFile
+from django.db import connection, transaction
+from django.utils import timezone
+from imager_images.models import (Album, cover_urls, Photo, Tag, TagCount, UserTagCount)
+from imager_profile.models import Follow, ImagerProfile
+from imagersite.sitemap_cache import invalidate_shards
+from PIL import Image
+
+PLACEHOLDER_SIZES = ((1600, 1067), (1067, 1600), (2048, 1365), (1200, 1200),
+                     (4000, 2667), (800, 533))
+VISIBILITY = (('PUBLIC', 0.6), ('SHARED', 0.1), ('PRIVATE', 0.3))
+WORDS = ('sunset', 'beach', 'city', 'night', 'portrait', 'mountain', 'forest', 'street',
+         'wedding', 'river', 'snow', 'autumn', 'market', 'bridge', 'harbor', 'desert',
+         'garden', 'family', 'concert', 'coffee', 'rain', 'lake', 'festival', 'train',
+         'skyline', 'flowers', 'dog', 'cat', 'light', 'shadow', 'window', 'road')
+
+
+def skewed(rng, mean, sigma=1.2, cap=None):
+    """A whole number drawn from a lognormal with about the given mean.
+
+    Most draws are small and a few are many times the mean, like the
+    photo counts of real accounts.
+    """
+    if mean <= 0:
+        return 0
+    value = int(round(rng.lognormvariate(math.log(mean) - sigma ** 2 / 2, sigma)))
+    return min(value, cap) if cap is not None else value
+
+
+class ZipfChoice(object):
+    """Picks items with weights falling off as one over their rank, so a few are picked most."""
+
+    def __init__(self, items, exponent=1.0):
+        """Rank the items in the order given."""
+        self.items = items
+        self.cum_weights = list(accumulate(1 / (rank ** exponent)
+                                           for rank in range(1, len(items) + 1)))
+
+    def sample(self, rng, count):
+        """Up to ``count`` distinct items; popular ones are drawn more than once and merged."""
+        return set(rng.choices(self.items, cum_weights=self.cum_weights, k=count))
+
+
+def copy_value(value):
+    """A value in the text format of COPY."""
+    if value is None:
+        return r'\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, (list, tuple)):
+        return '{' + ','.join(value) + '}'
+    return (str(value).replace('\\', '\\\\').replace('\t', '\\t')
+            .replace('\n', '\\n').replace('\r', '\\r'))
+
+
+def copy_rows(model, rows):
+    """Load dicts of field values into the model's table with one COPY.
+
+    Fields a row leaves out get their model default, without a model
+    instance or signal per row. The primary key is left to the database
+    unless the rows carry ``id``. Generated columns such as
+    ``search_vector`` are left to their triggers. Returns the row count.
+    """
+    if not rows:
+        return 0
+    fields = [field for field in model._meta.concrete_fields
+              if not isinstance(field, SearchVectorField) and
+              (not field.primary_key or field.attname in rows[0])]
+    defaults = {field.attname: field.get_default() for field in fields}
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write('\t'.join(copy_value(row.get(field.attname, defaults[field.attname]))
+                               for field in fields))
+        buffer.write('\n')
+    buffer.seek(0)
+    with connection.cursor() as cursor:
+        cursor.copy_expert('COPY {} ({}) FROM STDIN'.format(
+            model._meta.db_table, ', '.join(field.column for field in fields)), buffer)
+    return len(rows)
+
+
+def reserve_ids(model, count):
+    """Take ``count`` ids from the model's sequence, so COPY can write rows that refer to them."""
+    if not count:
+        return []
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT nextval(pg_get_serial_sequence(%s, 'id')) "
+                       'FROM generate_series(1, %s)', [model._meta.db_table, count])
+        return [row[0] for row in cursor.fetchall()]
+
+
+def make_placeholders(storage):
+    """Store the few images every generated photo shares, and describe them.
+
+    Returns ``(name, width, height, cover URLs)`` for each, made once
+    whatever the number of photos.
+    """
+    placeholders = []
+    for index, (width, height) in enumerate(PLACEHOLDER_SIZES):
+        name = 'images/load/placeholder-{}x{}.jpg'.format(width, height)
+        if not storage.exists(name):
+            content = io.BytesIO()
+            Image.new('RGB', (width, height), (40 * index, 120, 200 - 30 * index)).save(
+                content, 'JPEG', quality=60)
+            storage.save(name, ContentFile(content.getvalue()))
+        placeholders.append((name, width, height, cover_urls(Photo(image=name))))
+    return placeholders
+
+
+def make_tags(size):
+    """The ids of a vocabulary of ``size`` tags, most common first, made where missing."""
+    names = [WORDS[index % len(WORDS)] + ('-{}'.format(index // len(WORDS))
+                                          if index >= len(WORDS) else '')
+             for index in range(size)]
+    known = dict(Tag.objects.filter(name__in=names).values_list('name', 'id'))
+    Tag.objects.bulk_create(Tag(name=name) for name in names if name not in known)
+    known = dict(Tag.objects.filter(name__in=names).values_list('name', 'id'))
+    return [known[name] for name in names]
+
+
+def words(rng, low, high):
+    """A few random words, for titles and descriptions."""
+    return ' '.join(rng.choice(WORDS) for _ in range(rng.randint(low, high)))
+
+
+def visibility(rng):
+    """A published state, with the weights real libraries have."""
+    return rng.choices([value for value, _ in VISIBILITY],
+                       [weight for _, weight in VISIBILITY])[0]
+
+
+class LoadGenerator(object):
+    """Writes synthetic accounts a batch of users at a time, each batch one transaction."""
+
+    def __init__(self, rng, options, placeholders, tag_ids):
+        """Keep the options, shared media and tag vocabulary of the run."""
+        self.rng = rng
+        self.options = options
+        self.placeholders = placeholders
+        self.cover_urls = {name: urls for name, _, _, urls in placeholders}
+        self.tags = ZipfChoice(tag_ids)
+        self.now = timezone.now()
+        self.password = make_password('password')
+        self.user_ids = []
+        self.totals = Counter()
+
+    def when(self):
+        """A time within the last ``days``, more often recent than not."""
+        return self.now - timedelta(days=self.options['days'] * self.rng.random() ** 2)
+
+    def add_users(self, count):
+        """Write a batch of users with their profiles, photos, tags and albums."""
+        rng = self.rng
+        user_ids = reserve_ids(User, count)
+        users, profiles, photos, taggings, albums, members = [], [], [], [], [], []
+        public_tags, user_tags = Counter(), Counter()
+        most = int(self.options['photos'] * 100)
+        photo_counts = [skewed(rng, self.options['photos'], cap=most) for _ in user_ids]
+        photo_ids = iter(reserve_ids(Photo, sum(photo_counts)))
+
+        for user_id, photo_count in zip(user_ids, photo_counts):
+            joined = self.when()
+            username = '{}{}'.format(self.options['prefix'], user_id)
+            users.append({'id': user_id, 'username': username, 'password': self.password,
+                          'email': username + '@example.com', 'is_active': True,
+                          'date_joined': joined})
+            profiles.append({'user_id': user_id, 'feed_updated': self.now})
+
+            library = []
+            for _ in range(photo_count):
+                image, width, height, _ = rng.choice(self.placeholders)
+                uploaded = joined + (self.now - joined) * rng.random()
+                published = visibility(rng)
+                photo = {'id': next(photo_ids), 'user_id': user_id, 'image': image,
+                         'title': words(rng, 1, 4), 'published': published,
+                         'description': words(rng, 5, 20) if rng.random() < 0.5 else None,
+                         'date_uploaded': uploaded, 'date_modified': uploaded,
+                         'date_published': uploaded if published == 'PUBLIC' else None,
+                         'width': width, 'height': height, 'image_format': 'JPEG'}
+                photos.append(photo)
+                library.append(photo)
+                for tag_id in self.tags.sample(rng, skewed(rng, self.options['tags_per_photo'],
+                                                           cap=10)):
+                    taggings.append({'photo_id': photo['id'], 'tag_id': tag_id})
+                    user_tags[user_id, tag_id] += 1
+                    if published == 'PUBLIC':
+                        public_tags[tag_id] += 1
+
+            for _ in range(skewed(rng, self.options['albums']) if library else 0):
+                chosen = rng.sample(library, max(1, min(
+                    len(library), skewed(rng, self.options['album_size']))))
+                albums.append((user_id, chosen))
+
+        album_ids = reserve_ids(Album, len(albums))
+        album_rows = []
+        for album_id, (user_id, chosen) in zip(album_ids, albums):
+            created = min(photo['date_uploaded'] for photo in chosen)
+            published = visibility(rng)
+            cover = chosen[0]
+            album_rows.append(dict(
+                self.cover_urls[cover['image']], id=album_id, user_id=user_id,
+                title=words(rng, 1, 3), published=published,
+                cover_id=cover['id'], photo_count=len(chosen),
+                date_uploaded=created, date_modified=created,
+                date_published=created if published == 'PUBLIC' else None,
+                last_photo_added=max(photo['date_uploaded'] for photo in chosen)))
+            members.extend({'album_id': album_id, 'photo_id': photo['id']} for photo in chosen)
+
+        with transaction.atomic():
+            self.totals['users'] += copy_rows(User, users)
+            copy_rows(ImagerProfile, profiles)
+            self.totals['photos'] += copy_rows(Photo, photos)
+            self.totals['tags'] += copy_rows(Photo.tags.through, taggings)
+            self.totals['albums'] += copy_rows(Album, album_rows)
+            self.totals['album photos'] += copy_rows(Album.photos.through, members)
+            TagCount.add(public_tags)
+            UserTagCount.add(user_tags)
+        invalidate_shards('photos', [photo['id'] for photo in photos])
+        invalidate_shards('albums', album_ids)
+        invalidate_shards('profiles', ImagerProfile.objects.filter(
+            user_id__in=user_ids).values_list('id', flat=True))
+        self.user_ids.extend(user_ids)
+
+    def add_follows(self, batch_size):
+        """Have each generated user follow others, a few of whom are followed by most.
+
+        Popularity is ranked in a shuffled order, so it does not follow
+        the ids. Follower counts are recounted once every follow is in.
+        """
+        ranked = list(self.user_ids)
+        self.rng.shuffle(ranked)
+        popular = ZipfChoice(ranked)
+        for start in range(0, len(self.user_ids), batch_size):
+            follows = []
+            for follower_id in self.user_ids[start:start + batch_size]:
+                count = skewed(self.rng, self.options['follows'], cap=len(ranked) - 1)
+                follows.extend({'follower_id': follower_id, 'followed_id': followed_id,
+                                'created': self.when()}
+                               for followed_id in popular.sample(self.rng, count)
+                               if followed_id != follower_id)
+            with transaction.atomic():
+                self.totals['follows'] += copy_rows(Follow, follows)
+        if not self.user_ids:
+            return
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'UPDATE {profile} SET follower_count = counts.total FROM ('
+                'SELECT followed_id, count(*) AS total FROM {follow} '
+                'WHERE followed_id BETWEEN %s AND %s GROUP BY followed_id) AS counts '
+                'WHERE {profile}.user_id = counts.followed_id'.format(
+                    profile=ImagerProfile._meta.db_table, follow=Follow._meta.db_table),
+                [min(self.user_ids), max(self.user_ids)])
+
+    def analyze(self):
+        """Refresh the planner statistics of every table written to."""
+        with connection.cursor() as cursor:
+            for model in (User, ImagerProfile, Photo, Photo.tags.through, Album,
+                          Album.photos.through, Follow, TagCount, UserTagCount):
+                cursor.execute('ANALYZE {}'.format(model._meta.db_table))
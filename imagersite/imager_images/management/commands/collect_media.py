@@ -0,0 +1,153 @@
+"""Delete photo files, thumbnails and contact sheets that nothing refers to any more."""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from itertools import islice
+import json
+import posixpath
+
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.template.defaultfilters import filesizeformat
+from django.utils import timezone
+from imager_images.bloom import BloomFilter
+from imager_images import sprites
+from imager_images.models import Photo
+from sorl.thumbnail import default
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.images import ImageFile
+from sorl.thumbnail.kvstores.base import add_prefix, del_prefix
+from sorl.thumbnail.models import KVStore
+
+
+def walk(storage, path):
+    """Yield the name of every file below ``path``, one directory at a time."""
+    try:
+        directories, files = storage.listdir(path)
+    except (IOError, OSError):
+        return
+    for name in files:
+        yield posixpath.join(path, name)
+    for directory in directories:
+        yield from walk(storage, posixpath.join(path, directory))
+
+
+class Command(BaseCommand):
+    """Compare a listing of the media storage with the names still in use.
+
+    This is also where old contact sheets go: a changed album or library
+    page gets a new sheet rather than a rewritten one, and a sheet whose
+    cache entry has expired is swept here, not by ``imager_images.sprites``.
+    """
+
+    help = ('Delete original images and sorl thumbnails that no Photo refers to, and '
+            'contact sheets (under sprites/) whose cache entry has expired, when they '
+            'are older than the grace period. This is the only cleanup of old sheets.')
+
+    def add_arguments(self, parser):
+        """Add the grace period, concurrency and batching options."""
+        parser.add_argument('--grace-hours', type=int, default=24,
+                            help='Only delete files last modified this long ago.')
+        parser.add_argument('--workers', type=int, default=8,
+                            help='Number of files checked or deleted at the same time.')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Number of listed files compared at a time.')
+        parser.add_argument('--error-rate', type=float, default=0.001,
+                            help='False positive rate of the in-use name filter.')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only report the files that would be deleted.')
+
+    def handle(self, *args, **options):
+        """Build the filter of names in use, then sweep the storage batch by batch."""
+        field = Photo._meta.get_field('image')
+        self.storage = field.storage
+        self.cutoff = timezone.now() - timedelta(hours=options['grace_hours'])
+        in_use = self.names_in_use(options['error_rate'])
+
+        listed = orphans = size = 0
+        prefixes = [field.upload_to.prefix, thumbnail_settings.THUMBNAIL_PREFIX.rstrip('/'),
+                    sprites.PREFIX]
+        with ThreadPoolExecutor(options['workers']) as pool:
+            for prefix, storage in zip(prefixes, [self.storage, default.storage,
+                                                  default_storage]):
+                is_sheet = prefix == sprites.PREFIX
+                names = walk(storage, prefix)
+                while True:
+                    batch = list(islice(names, options['batch_size']))
+                    if not batch:
+                        break
+                    listed += len(batch)
+                    used = sprites.sheets_in_use(batch) if is_sheet else in_use
+                    candidates = [name for name in batch if name not in used]
+                    sweep = self.check if options['dry_run'] else self.delete
+                    swept = []
+                    for name, deleted in zip(candidates, pool.map(
+                            lambda name: sweep(storage, name), candidates)):
+                        if deleted is None:
+                            continue
+                        swept.append(name)
+                        orphans += 1
+                        size += deleted
+                        if options['verbosity'] >= 2:
+                            self.stdout.write(name)
+                    if is_sheet and not options['dry_run']:
+                        self.forget_sheets(swept)
+
+        verb = 'Would delete' if options['dry_run'] else 'Deleted'
+        self.stdout.write('{} {} orphaned files ({}) of {} listed.'.format(
+            verb, orphans, filesizeformat(size), listed))
+
+    def names_in_use(self, error_rate):
+        """A Bloom filter of every photo's image and its current thumbnails.
+
+        Thumbnails are found through sorl's key-value store: the photo's
+        source key leads to its thumbnail keys, and those to their names.
+        Rows are streamed, so memory is the filter's size alone.
+        """
+        image_prefix = add_prefix('', 'image')
+        images = KVStore.objects.filter(key__startswith=image_prefix)
+        thumbnail_lists = KVStore.objects.filter(
+            key__startswith=add_prefix('', 'thumbnails'))
+        photos = Photo.objects.count()
+
+        names = BloomFilter(photos + images.count(), error_rate)
+        sources = BloomFilter(photos, error_rate)
+        for name in Photo.objects.values_list('image', flat=True).iterator():
+            names.add(name)
+            sources.add(ImageFile(name, self.storage).key)
+
+        thumbnails = BloomFilter(images.count(), error_rate)
+        for key, value in thumbnail_lists.values_list('key', 'value').iterator():
+            if del_prefix(key) in sources:
+                for thumbnail_key in json.loads(value):
+                    thumbnails.add(thumbnail_key)
+
+        for key, value in images.values_list('key', 'value').iterator():
+            if del_prefix(key) in thumbnails:
+                names.add(json.loads(value)['name'])
+        return names
+
+    def forget_sheets(self, names):
+        """Drop the cache entries of deleted contact sheets.
+
+        A view that read a sheet's manifest just before it was deleted may
+        have cached it since; without the entry the next view builds the
+        sheet again.
+        """
+        cache.delete_many({sprites.cache_key(name) for name in names})
+
+    def check(self, storage, name):
+        """The size of an unused file past the grace period, or None."""
+        try:
+            if storage.get_modified_time(name) >= self.cutoff:
+                return None
+            return storage.size(name)
+        except (IOError, OSError):
+            return None
+
+    def delete(self, storage, name):
+        """Delete an unused file past the grace period and return its size."""
+        size = self.check(storage, name)
+        if size is not None:
+            storage.delete(name)
+        return size
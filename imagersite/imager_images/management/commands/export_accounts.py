@@ -0,0 +1,42 @@
+"""Build the archives of requested account exports."""
+import time
+
+from django.core.management.base import BaseCommand
+from imager_images.exports import claim_export, expire_exports, run_export
+
+
+class Command(BaseCommand):
+    """Work through the requested exports oldest first, one at a time."""
+
+    help = ('Write a ZIP of each requested account export to media storage, email '
+            'its owner, and delete expired archives.')
+
+    def add_arguments(self, parser):
+        """Add the concurrency, batching, interval and single-pass options."""
+        parser.add_argument('--workers', type=int, default=8,
+                            help='Number of originals fetched ahead of the archive.')
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Number of rows read per query.')
+        parser.add_argument('--interval', type=float, default=30,
+                            help='Seconds to wait when no export is waiting.')
+        parser.add_argument('--once', action='store_true',
+                            help='Build the waiting exports and exit.')
+
+    def handle(self, *args, **options):
+        """Build exports until stopped, or until none are waiting with --once."""
+        while True:
+            expired = expire_exports()
+            built = 0
+            export = claim_export()
+            while export is not None:
+                try:
+                    run_export(export, options['workers'], options['batch_size'])
+                    built += 1
+                except Exception as error:
+                    self.stderr.write('Export {} failed: {}'.format(export.id, error))
+                export = claim_export()
+            if built or expired or options['once']:
+                self.stdout.write('Built {} exports and expired {}.'.format(built, expired))
+            if options['once']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,32 @@
+"""Copy newly published photos and albums into followers' timelines."""
+import time
+
+from django.core.management.base import BaseCommand
+from imager_images.feed import fan_out_batch
+
+
+class Command(BaseCommand):
+    """Work through the fan out queue a batch of followers at a time."""
+
+    help = "Copy newly published photos and albums into their followers' timelines."
+
+    def add_arguments(self, parser):
+        """Add the batching, interval and single-pass options."""
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Number of followers reached per transaction.')
+        parser.add_argument('--interval', type=float, default=5,
+                            help='Seconds to wait when the queue is empty.')
+        parser.add_argument('--once', action='store_true',
+                            help='Empty the queue and exit.')
+
+    def handle(self, *args, **options):
+        """Run batches until stopped, or until the queue is empty with --once."""
+        while True:
+            batches = 0
+            while fan_out_batch(options['batch_size']):
+                batches += 1
+            if batches or options['once']:
+                self.stdout.write('Ran {} fan out batches.'.format(batches))
+            if options['once']:
+                return
+            time.sleep(options['interval'])
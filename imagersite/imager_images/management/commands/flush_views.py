@@ -0,0 +1,30 @@
+"""Add the views left in the spools of stopped web processes."""
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from imager_images.counters import recover_spools
+
+
+class Command(BaseCommand):
+    """Write the spools no live process holds, then wait and look again."""
+
+    help = ('Count the photo and album views spooled by web processes that '
+            'stopped before writing them.')
+
+    def add_arguments(self, parser):
+        """Add the interval and single-pass options."""
+        parser.add_argument('--interval', type=float, default=60,
+                            help='Seconds to wait between scans.')
+        parser.add_argument('--once', action='store_true',
+                            help='Recover the spools there are now and exit.')
+
+    def handle(self, *args, **options):
+        """Recover every unlocked spool under VIEW_SPOOL_ROOT until stopped."""
+        while True:
+            views = recover_spools(settings.VIEW_SPOOL_ROOT)
+            if views or options['once']:
+                self.stdout.write('Recovered {} views.'.format(views))
+            if options['once']:
+                return
+            time.sleep(options['interval'])
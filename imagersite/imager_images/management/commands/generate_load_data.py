@@ -0,0 +1,55 @@
+"""Fill the database with synthetic accounts for performance work."""
+import random
+
+from django.core.management.base import BaseCommand
+from imager_images.gallery_cache import invalidate_galleries
+from imager_images.load_data import LoadGenerator, make_placeholders, make_tags
+from imager_images.models import Photo
+
+
+class Command(BaseCommand):
+    """Write users, photos, albums, tags and follows with COPY, a batch of users at a time."""
+
+    help = ('Generate synthetic users, photos, albums, tags and follows with skewed, '
+            'realistic distributions. Every photo shares a few placeholder images.')
+
+    def add_arguments(self, parser):
+        """Add the volume, distribution, seed and batching options."""
+        parser.add_argument('--users', type=int, default=1000,
+                            help='Number of users to generate.')
+        parser.add_argument('--photos', type=float, default=50,
+                            help='Mean number of photos per user.')
+        parser.add_argument('--albums', type=float, default=3,
+                            help='Mean number of albums per user with photos.')
+        parser.add_argument('--album-size', type=float, default=20,
+                            help='Mean number of photos per album.')
+        parser.add_argument('--tags', type=int, default=1000,
+                            help='Number of distinct tags.')
+        parser.add_argument('--tags-per-photo', type=float, default=2,
+                            help='Mean number of tags per photo.')
+        parser.add_argument('--follows', type=float, default=20,
+                            help='Mean number of users each user follows.')
+        parser.add_argument('--days', type=float, default=3 * 365,
+                            help='How far back uploads and sign ups go.')
+        parser.add_argument('--prefix', default='load',
+                            help='Start of every generated username, followed by its id.')
+        parser.add_argument('--seed', type=int, default=None,
+                            help='Seed, to generate the same data again.')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Number of users written per transaction.')
+
+    def handle(self, *args, **options):
+        """Write the users batch by batch, then the follows, then refresh statistics."""
+        rng = random.Random(options['seed'])
+        placeholders = make_placeholders(Photo._meta.get_field('image').storage)
+        generator = LoadGenerator(rng, options, placeholders, make_tags(options['tags']))
+        for start in range(0, options['users'], options['batch_size']):
+            generator.add_users(min(options['batch_size'], options['users'] - start))
+            if options['verbosity'] >= 2:
+                self.stdout.write('Generated {} users.'.format(generator.totals['users']))
+        generator.add_follows(options['batch_size'])
+        invalidate_galleries()
+        generator.analyze()
+        self.stdout.write('Generated {}.'.format(', '.join(
+            '{} {}'.format(generator.totals[kind], kind) for kind in
+            ('users', 'photos', 'tags', 'albums', 'album photos', 'follows'))))
@@ -0,0 +1,68 @@
+"""Import a directory tree of images as a user's photos."""
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import islice
+import os
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from imager_images.importer import find_files, finish_import, import_batch, inspect
+from imager_images.models import Photo
+
+
+class Command(BaseCommand):
+    """Check files across processes, store them across threads, and insert photos in batches."""
+
+    help = ('Import every image below a directory as photos of a user, optionally '
+            'with an album for each folder. Running it again picks up where it stopped.')
+
+    def add_arguments(self, parser):
+        """Add the user, directory, visibility, album and concurrency options."""
+        parser.add_argument('username')
+        parser.add_argument('directory')
+        parser.add_argument('--published', default='PRIVATE',
+                            choices=[value for value, _ in
+                                     Photo._meta.get_field('published').choices],
+                            help='Who can see the imported photos and albums.')
+        parser.add_argument('--albums', action='store_true',
+                            help='Add the photos of each folder to an album named after it.')
+        parser.add_argument('--processes', type=int, default=None,
+                            help='Number of processes checking files, one per CPU by default.')
+        parser.add_argument('--workers', type=int, default=8,
+                            help='Number of files written to storage at the same time.')
+        parser.add_argument('--batch-size', type=int, default=200,
+                            help='Number of photos created per INSERT.')
+
+    def handle(self, *args, **options):
+        """Import the files batch by batch and report what was skipped."""
+        try:
+            user = User.objects.get(username=options['username'], is_active=True)
+        except User.DoesNotExist:
+            raise CommandError('No active user {}.'.format(options['username']))
+        if not os.path.isdir(options['directory']):
+            raise CommandError('{} is not a directory.'.format(options['directory']))
+
+        files = list(find_files(options['directory']))
+        albums = {} if options['albums'] else None
+        imported = skipped = 0
+        with ProcessPoolExecutor(options['processes']) as processes, \
+                ThreadPoolExecutor(options['workers']) as threads:
+            checked = zip(files, processes.map(
+                inspect, [path for path, _ in files], chunksize=16))
+            while True:
+                batch = list(islice(checked, options['batch_size']))
+                if not batch:
+                    break
+                accepted = []
+                for (path, folder), (header, digest, reason) in batch:
+                    if reason:
+                        skipped += 1
+                        self.stderr.write('Skipped {}: {}'.format(path, reason))
+                    else:
+                        accepted.append((path, folder, header, digest))
+                imported += import_batch(user, accepted, options['published'], threads, albums)
+                if options['verbosity'] >= 2:
+                    self.stdout.write('Imported {} photos so far.'.format(imported))
+        finish_import(user, options['published'])
+
+        self.stdout.write('Imported {} photos, {} already imported, {} skipped.'.format(
+            imported, len(files) - imported - skipped, skipped))
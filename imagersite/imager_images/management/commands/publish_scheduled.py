@@ -0,0 +1,37 @@
+"""Publish photos and albums when their scheduled time comes."""
+import time
+
+from django.core.management.base import BaseCommand
+from imager_images.models import Album, Photo
+from imager_images.visibility import publish_due
+
+
+class Command(BaseCommand):
+    """Claim and publish due items in batches, then wait and scan again."""
+
+    help = 'Make photos and albums public once their publish_at time has passed.'
+
+    def add_arguments(self, parser):
+        """Add the batching, interval and single-pass options."""
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Number of items claimed per transaction.')
+        parser.add_argument('--interval', type=float, default=10,
+                            help='Seconds to wait between scans.')
+        parser.add_argument('--once', action='store_true',
+                            help='Publish what is due now and exit.')
+
+    def handle(self, *args, **options):
+        """Scan until stopped, or once with --once."""
+        while True:
+            published = 0
+            for model in (Photo, Album):
+                while True:
+                    count = publish_due(model, options['batch_size'])
+                    published += count
+                    if count < options['batch_size']:
+                        break
+            if published or options['once']:
+                self.stdout.write('Published {} items.'.format(published))
+            if options['once']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,32 @@
+"""Score new photo views and rewrite the trending and most viewed galleries."""
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from imager_images.ranking import rank_galleries, score_views
+
+
+class Command(BaseCommand):
+    """Score the hours of views completed since the last run, then rank."""
+
+    help = 'Update the trending and most viewed photo galleries.'
+
+    def add_arguments(self, parser):
+        """Add the gallery size, interval and single-pass options."""
+        parser.add_argument('--size', type=int, default=settings.RANKED_GALLERY_SIZE,
+                            help='Number of photos kept in each gallery.')
+        parser.add_argument('--interval', type=float, default=300,
+                            help='Seconds to wait between runs.')
+        parser.add_argument('--once', action='store_true',
+                            help='Rank once and exit.')
+
+    def handle(self, *args, **options):
+        """Rank until stopped, or once with --once."""
+        while True:
+            hours = score_views()
+            rank_galleries(options['size'])
+            if hours or options['once']:
+                self.stdout.write('Scored {} hours of views.'.format(hours))
+            if options['once']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,26 @@
+"""Remove the rows and files of accounts deleted by their owners."""
+from django.core.management.base import BaseCommand
+from imager_images.reaper import reap
+from imager_profile.models import AccountTombstone
+
+
+class Command(BaseCommand):
+    """Work through the pending tombstones oldest first."""
+
+    help = 'Delete the photos, albums, files and user rows of deleted accounts.'
+
+    def add_arguments(self, parser):
+        """Add the concurrency and batching options."""
+        parser.add_argument('--workers', type=int, default=8,
+                            help='Number of files deleted at the same time.')
+        parser.add_argument('--batch-size', type=int, default=100,
+                            help='Number of rows deleted per transaction.')
+
+    def handle(self, *args, **options):
+        """Reap each pending account."""
+        pending = AccountTombstone.objects.filter(completed=None).order_by('requested')
+        accounts = photos = 0
+        for tombstone in pending:
+            photos += reap(tombstone, options['workers'], options['batch_size'])
+            accounts += 1
+        self.stdout.write('Reaped {} accounts and {} photos.'.format(accounts, photos))
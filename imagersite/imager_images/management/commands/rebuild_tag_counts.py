@@ -0,0 +1,16 @@
+"""Recompute the tag count tables from the photos."""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from imager_images.tags import rebuild_counts
+
+
+class Command(BaseCommand):
+    """Replace the incrementally kept tag counts with fresh totals."""
+
+    help = 'Recompute the public and per-user tag counts.'
+
+    def handle(self, *args, **options):
+        """Rebuild the counts in one transaction."""
+        with transaction.atomic():
+            rebuild_counts()
+        self.stdout.write('Rebuilt tag counts.')
@@ -0,0 +1,29 @@
+"""Recompute the photo counts and cover URLs stored on albums."""
+from django.core.management.base import BaseCommand
+from imager_images.models import Album, refresh_album_counts, refresh_album_covers
+
+
+class Command(BaseCommand):
+    """Rewrite every album's stored aggregates from its photos."""
+
+    help = 'Recompute Album.photo_count and the stored cover URLs.'
+
+    def add_arguments(self, parser):
+        """Add the batching option."""
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Number of albums refreshed at a time.')
+
+    def handle(self, *args, **options):
+        """Refresh the albums batch by batch."""
+        albums = Album.objects.select_related('cover').order_by('id')
+        refreshed = 0
+        last_id = 0
+        while True:
+            batch = list(albums.filter(id__gt=last_id)[:options['batch_size']])
+            if not batch:
+                break
+            last_id = batch[-1].id
+            refresh_album_counts([album.id for album in batch])
+            refresh_album_covers(batch)
+            refreshed += len(batch)
+        self.stdout.write('Refreshed {} albums.'.format(refreshed))
@@ -0,0 +1,20 @@
+"""Respace the photo ranks of albums whose gaps have worn thin."""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from imager_images.models import Album
+from imager_images.ordering import renumber
+
+
+class Command(BaseCommand):
+    """Renumber every album flagged by a move into a narrow gap."""
+
+    help = 'Respace the photo ranks of albums flagged for renumbering.'
+
+    def handle(self, *args, **options):
+        """Renumber the flagged albums one transaction each."""
+        renumbered = 0
+        for album in Album.objects.filter(needs_renumbering=True).only('id'):
+            with transaction.atomic():
+                renumber(album)
+            renumbered += 1
+        self.stdout.write('Renumbered {} albums.'.format(renumbered))
@@ -0,0 +1,80 @@
+"""Move photo files stored before sharding into hashed subdirectories."""
+from concurrent.futures import ThreadPoolExecutor
+import os
+
+from django.core.management.base import BaseCommand
+from django.db.models import Case, CharField, F, Q, Value, When
+from imager_images.models import Album, Photo, refresh_album_covers
+from imager_images.storage import move_file
+from sorl.thumbnail import delete
+
+
+class Command(BaseCommand):
+    """Copy unsharded photos to their sharded names and repoint the rows."""
+
+    help = 'Move photo files into the sharded layout and rewrite Photo.image.'
+
+    def add_arguments(self, parser):
+        """Add the concurrency and batching options."""
+        parser.add_argument('--workers', type=int, default=8,
+                            help='Number of files copied at the same time.')
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Number of photos repointed per UPDATE.')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only count the photos that would move.')
+
+    def handle(self, *args, **options):
+        """Move the photos batch by batch."""
+        field = Photo._meta.get_field('image')
+        self.upload_to = field.upload_to
+        self.storage = field.storage
+        pending = (Photo.objects.exclude(image__regex=self.upload_to.pattern())
+                   .only('id', 'image').order_by('id'))
+
+        moved = failed = 0
+        last_id = 0
+        with ThreadPoolExecutor(options['workers']) as pool:
+            while True:
+                batch = list(pending.filter(id__gt=last_id)[:options['batch_size']])
+                if not batch:
+                    break
+                last_id = batch[-1].id
+                if options['dry_run']:
+                    moved += len(batch)
+                    continue
+
+                renames = {}
+                for photo, new_name in zip(batch, pool.map(self.copy, batch)):
+                    if new_name is None:
+                        failed += 1
+                    else:
+                        renames[photo.id] = (photo.image.name, new_name)
+                if not renames:
+                    continue
+
+                Photo.objects.filter(id__in=renames).update(image=Case(
+                    *[When(Q(id=pk, image=old), then=Value(new))
+                      for pk, (old, new) in renames.items()],
+                    default=F('image'), output_field=CharField()))
+                current = dict(Photo.objects.filter(id__in=renames)
+                               .values_list('id', 'image'))
+                stale = [old if current.get(pk) == new else new
+                         for pk, (old, new) in renames.items()]
+                list(pool.map(delete, stale))
+                refresh_album_covers(Album.objects.filter(cover_id__in=renames)
+                                     .select_related('cover'))
+                moved += sum(1 for pk, (old, new) in renames.items()
+                             if current.get(pk) == new)
+
+        verb = 'Would move' if options['dry_run'] else 'Moved'
+        self.stdout.write('{} {} photos, {} failed.'.format(verb, moved, failed))
+
+    def copy(self, photo):
+        """Copy the photo's file to its sharded name, or None if it is missing."""
+        old_name = photo.image.name
+        try:
+            new_name = self.upload_to(photo, os.path.basename(old_name))
+            return move_file(self.storage, old_name, new_name)
+        except (IOError, OSError) as error:
+            self.stderr.write('Could not move {}: {}'.format(old_name, error))
+            return None
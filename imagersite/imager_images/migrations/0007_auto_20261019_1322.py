@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-19 13:22
+from __future__ import unicode_literals
+
+from django.db import migrations
+import imager_images.models
+import sorl.thumbnail.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('imager_images', '0006_auto_20171204_1924'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='photo',
+            name='image',
+            field=sorl.thumbnail.fields.ImageField(upload_to='images', validators=[imager_images.models.validate_decode_budget]),
+        ),
+    ]
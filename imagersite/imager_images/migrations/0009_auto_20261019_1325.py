@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-19 13:25
+from __future__ import unicode_literals
+
+from django.db import migrations
+import imager_images.models
+import imager_images.storage
+import sorl.thumbnail.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('imager_images', '0008_auto_20261019_1324'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='photo',
+            name='image',
+            field=sorl.thumbnail.fields.ImageField(upload_to=imager_images.storage.ShardedUploadTo('images'), validators=[imager_images.models.validate_decode_budget]),
+        ),
+    ]
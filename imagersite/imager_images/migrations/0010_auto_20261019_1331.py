@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-19 13:31
+from __future__ import unicode_literals
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+SEARCH_VECTOR_FUNCTION = """
+CREATE FUNCTION imager_images_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('pg_catalog.english', coalesce(NEW.title, '')), 'A') ||
+        setweight(to_tsvector('pg_catalog.english', coalesce(NEW.description, '')), 'B');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+"""
+
+SEARCH_VECTOR_TRIGGER = """
+CREATE TRIGGER {table}_search_vector_update
+    BEFORE INSERT OR UPDATE OF title, description, search_vector ON {table}
+    FOR EACH ROW EXECUTE PROCEDURE imager_images_search_vector_update();
+UPDATE {table} SET search_vector = NULL;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('imager_images', '0009_auto_20261019_1325'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='album',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='photo',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='album',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='imager_imag_search__88c71a_gin'),
+        ),
+        migrations.AddIndex(
+            model_name='photo',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='imager_imag_search__8cf7f3_gin'),
+        ),
+        migrations.RunSQL(
+            SEARCH_VECTOR_FUNCTION,
+            'DROP FUNCTION imager_images_search_vector_update();'),
+        migrations.RunSQL(
+            SEARCH_VECTOR_TRIGGER.format(table='imager_images_photo'),
+            'DROP TRIGGER imager_images_photo_search_vector_update ON imager_images_photo;'),
+        migrations.RunSQL(
+            SEARCH_VECTOR_TRIGGER.format(table='imager_images_album'),
+            'DROP TRIGGER imager_images_album_search_vector_update ON imager_images_album;'),
+    ]
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-19 13:41
+from __future__ import unicode_literals
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('imager_images', '0010_auto_20261019_1331'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tag',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='UserTagCount',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('count', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='TagCount',
+            fields=[
+                ('tag', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='public_count', serialize=False, to='imager_images.Tag')),
+                ('count', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='usertagcount',
+            name='tag',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='user_counts', to='imager_images.Tag'),
+        ),
+        migrations.AddField(
+            model_name='usertagcount',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tag_counts', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='photo',
+            name='tags',
+            field=models.ManyToManyField(blank=True, related_name='photos', to='imager_images.Tag'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='usertagcount',
+            unique_together=set([('user', 'tag')]),
+        ),
+        migrations.RunSQL(
+            'CREATE INDEX imager_images_photo_tags_tag_photo '
+            'ON imager_images_photo_tags (tag_id, photo_id);',
+            'DROP INDEX imager_images_photo_tags_tag_photo;',
+        ),
+    ]
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-19 13:43
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+# Existing photos keep their upload order, spaced ordering.RANK_GAP apart, and the
+# sequence continues past every album's length so new rows sort last.
+ALBUM_PHOTO_RANK = """
+CREATE SEQUENCE imager_images_album_photos_rank_seq;
+ALTER TABLE imager_images_album_photos ADD COLUMN rank double precision;
+UPDATE imager_images_album_photos AS member SET rank = ordered.position * 1024
+    FROM (SELECT membership.id, row_number() OVER (
+              PARTITION BY membership.album_id
+              ORDER BY photo.date_uploaded, photo.id) AS position
+          FROM imager_images_album_photos AS membership
+          JOIN imager_images_photo AS photo ON photo.id = membership.photo_id) AS ordered
+    WHERE member.id = ordered.id;
+SELECT setval('imager_images_album_photos_rank_seq', coalesce(
+    (SELECT max(rank) / 1024 FROM imager_images_album_photos), 0)::bigint + 1, false);
+ALTER TABLE imager_images_album_photos
+    ALTER COLUMN rank SET DEFAULT nextval('imager_images_album_photos_rank_seq') * 1024,
+    ALTER COLUMN rank SET NOT NULL;
+ALTER SEQUENCE imager_images_album_photos_rank_seq
+    OWNED BY imager_images_album_photos.rank;
+CREATE INDEX imager_images_album_photos_album_rank
+    ON imager_images_album_photos (album_id, rank);
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('imager_images', '0011_auto_20261019_1341'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AlbumPhoto',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.FloatField()),
+            ],
+            options={
+                'db_table': 'imager_images_album_photos',
+                'managed': False,
+            },
+        ),
+        migrations.AddField(
+            model_name='album',
+            name='needs_renumbering',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.RunSQL(
+            ALBUM_PHOTO_RANK,
+            'ALTER TABLE imager_images_album_photos DROP COLUMN rank;',
+        ),
+    ]
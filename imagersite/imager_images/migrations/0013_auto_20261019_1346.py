@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-19 13:46
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('imager_images', '0012_auto_20261019_1343'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='album',
+            name='cover_image_url',
+            field=models.CharField(blank=True, editable=False, max_length=500),
+        ),
+        migrations.AddField(
+            model_name='album',
+            name='cover_thumbnail_url',
+            field=models.CharField(blank=True, editable=False, max_length=500),
+        ),
+        migrations.AddField(
+            model_name='album',
+            name='last_photo_added',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='album',
+            name='photo_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='album',
+            name='cover',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='imager_images.Photo'),
+        ),
+        migrations.RunSQL(
+            'UPDATE imager_images_album AS album SET photo_count = '
+            '(SELECT count(*) FROM imager_images_album_photos WHERE album_id = album.id);',
+            migrations.RunSQL.noop,
+        ),
+    ]
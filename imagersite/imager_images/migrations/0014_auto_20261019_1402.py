@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-19 14:02
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import imager_images.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('imager_images', '0013_auto_20261019_1346'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='album',
+            name='publish_at',
+            field=models.DateTimeField(blank=True, help_text='Make it public at this time, as YYYY-MM-DD HH:MM.', null=True, validators=[imager_images.models.validate_future]),
+        ),
+        migrations.AddField(
+            model_name='photo',
+            name='publish_at',
+            field=models.DateTimeField(blank=True, help_text='Make it public at this time, as YYYY-MM-DD HH:MM.', null=True, validators=[imager_images.models.validate_future]),
+        ),
+        migrations.RunSQL(
+            'CREATE INDEX imager_images_photo_pending_publish '
+            'ON imager_images_photo (publish_at) WHERE publish_at IS NOT NULL;',
+            'DROP INDEX imager_images_photo_pending_publish;',
+        ),
+        migrations.RunSQL(
+            'CREATE INDEX imager_images_album_pending_publish '
+            'ON imager_images_album (publish_at) WHERE publish_at IS NOT NULL;',
+            'DROP INDEX imager_images_album_pending_publish;',
+        ),
+    ]
@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-19 14:18
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('imager_images', '0016_view_counts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GalleryRank',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('board', models.CharField(choices=[('trending', 'Trending'), ('popular', 'Most viewed this week')], max_length=8)),
+                ('position', models.PositiveIntegerField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PhotoScore',
+            fields=[
+                ('photo', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='score', serialize=False, to='imager_images.Photo')),
+                ('trending', models.FloatField(default=0)),
+                ('week_views', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='RankingState',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scored_hour', models.DateTimeField()),
+                ('landmark', models.DateTimeField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='galleryrank',
+            name='photo',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='imager_images.Photo'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='galleryrank',
+            unique_together=set([('board', 'position')]),
+        ),
+    ]
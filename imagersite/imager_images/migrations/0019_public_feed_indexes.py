@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-19 14:35
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('imager_images', '0018_favorites'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            'CREATE INDEX imager_images_photo_public_feed '
+            'ON imager_images_photo (user_id, date_published DESC) '
+            "WHERE published = 'PUBLIC' AND date_published IS NOT NULL;",
+            'DROP INDEX imager_images_photo_public_feed;',
+        ),
+        migrations.RunSQL(
+            'CREATE INDEX imager_images_album_public_feed '
+            'ON imager_images_album (user_id, date_published DESC) '
+            "WHERE published = 'PUBLIC' AND date_published IS NOT NULL;",
+            'DROP INDEX imager_images_album_public_feed;',
+        ),
+    ]
@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-19 15:24
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('imager_images', '0019_public_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='viewcount',
+            name='scored',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunSQL(
+            'UPDATE imager_images_viewcount SET scored = views '
+            "WHERE kind = 'photo' AND hour <= "
+            '(SELECT scored_hour FROM imager_images_rankingstate WHERE id = 1);',
+            migrations.RunSQL.noop,
+        ),
+        migrations.RunSQL(
+            'UPDATE imager_images_photoscore AS score SET week_views = coalesce(('
+            'SELECT sum(views.scored) FROM imager_images_viewcount AS views, '
+            'imager_images_rankingstate AS state '
+            "WHERE state.id = 1 AND views.kind = 'photo' AND views.object_id = score.photo_id "
+            "AND views.hour > state.scored_hour - interval '7 days' "
+            'AND views.hour <= state.scored_hour), 0);',
+            migrations.RunSQL.noop,
+        ),
+    ]
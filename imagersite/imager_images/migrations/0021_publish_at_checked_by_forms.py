@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-19 15:44
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('imager_images', '0020_view_count_scored'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='album',
+            name='publish_at',
+            field=models.DateTimeField(blank=True, help_text='Make it public at this time, as YYYY-MM-DD HH:MM.', null=True),
+        ),
+        migrations.AlterField(
+            model_name='photo',
+            name='publish_at',
+            field=models.DateTimeField(blank=True, help_text='Make it public at this time, as YYYY-MM-DD HH:MM.', null=True),
+        ),
+    ]
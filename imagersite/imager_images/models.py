@@ -1,86 +1,892 @@
 """Photo and Album models created by a User."""
-from django.db import models
-from django.dispatch import receiver
+from collections import Counter
+from datetime import timedelta
+import re
+
+from django import forms
+from django.conf import settings
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
+from django.core.exceptions import ValidationError
+from django.db import connection, models
+from django.db.models.functions import Coalesce, Greatest
+from django.dispatch import receiver, Signal
 from django.contrib.auth.models import User
 from django.forms import ModelForm
+from django.template.defaultfilters import filesizeformat
 from django.utils import timezone
-from sorl.thumbnail import ImageField
+from imager_images.decoding import DecodeRejected, get_budget
+from imager_images.gallery_cache import invalidate_galleries
+from imager_images.headers import HeaderError, read_image_header
+from imager_images.storage import ShardedUploadTo
+from imager_images.widgets import PhotoPickerWidget
+from imager_profile.models import ImagerProfile
+from imagersite.kept_fields import KeptFieldsMixin
+from imagersite.sitemap_cache import invalidate_shards
+from sorl.thumbnail import get_thumbnail, ImageField
+from sorl.thumbnail.fields import ImageFormField
+
+UPLOAD_FORMATS = ('JPEG', 'PNG', 'GIF', 'WEBP')
+COVER_THUMBNAIL = '250x250'
+TAG_PATTERN = re.compile(r'^[\w-]{1,50}$')
+
+# Sent by change_visibility for each batch, with the ``(id, old published)``
+# pairs it changed and the ids published for the first time, from inside
+# the batch's transaction.
+visibility_changed = Signal(providing_args=['changes', 'published', 'first_published'])
+
+
+def validate_decode_budget(image):
+    """Reject images too large to decode within the memory budget."""
+    if getattr(image, '_committed', False):
+        return
+    header = getattr(getattr(image, 'file', image), 'image_header', None)
+    if header is None:
+        try:
+            header = read_image_header(image)
+        except HeaderError:
+            return
+    try:
+        get_budget().check(header.width, header.height, header.mode)
+    except DecodeRejected as error:
+        raise ValidationError(str(error), code='too_large')
+
+
+def validate_future(value):
+    """Reject times that have already passed.
+
+    Forms run it on a changed ``publish_at`` only, so an item whose time
+    passed before the scheduler got to it can still be edited.
+    """
+    if value <= timezone.now():
+        raise ValidationError('Pick a time in the future.', code='past')
+
+
+class HeaderCheckedImageField(ImageFormField):
+    """Image upload field that checks the file header before decoding.
+
+    The parsed header is kept on the upload as ``image_header``.
+    """
+
+    default_error_messages = {
+        'file_too_big': 'Upload an image of at most %(max)s; this one is %(size)s.',
+        'unsupported': 'Upload a JPEG, PNG, GIF or WebP image.',
+        'header': 'Upload a valid image: %(error)s',
+        'too_large': '%(error)s',
+    }
+
+    def to_python(self, data):
+        """Reject uploads by size and header before the image is opened."""
+        if data in self.empty_values:
+            return super(HeaderCheckedImageField, self).to_python(data)
+        size = getattr(data, 'size', 0)
+        if size > settings.IMAGE_UPLOAD_MAX_BYTES:
+            raise ValidationError(
+                self.error_messages['file_too_big'], code='file_too_big',
+                params={'max': filesizeformat(settings.IMAGE_UPLOAD_MAX_BYTES),
+                        'size': filesizeformat(size)})
+        try:
+            header = read_image_header(data)
+        except HeaderError as error:
+            raise ValidationError(self.error_messages['header'], code='header',
+                                  params={'error': error})
+        if header.format not in UPLOAD_FORMATS:
+            raise ValidationError(self.error_messages['unsupported'],
+                                  code='unsupported')
+        try:
+            get_budget().check(header.width, header.height, header.mode)
+        except DecodeRejected as error:
+            raise ValidationError(self.error_messages['too_large'],
+                                  code='too_large', params={'error': error})
+        upload = super(HeaderCheckedImageField, self).to_python(data)
+        upload.image_header = header
+        return upload
+
+
+class TagListField(forms.CharField):
+    """Comma separated tags, cleaned to a list of lowercase names."""
+
+    def to_python(self, value):
+        """Split, lowercase and de-duplicate the tag names."""
+        value = super(TagListField, self).to_python(value)
+        names = []
+        for name in value.split(','):
+            name = name.strip().lower().replace(' ', '-')
+            if not name or name in names:
+                continue
+            if not TAG_PATTERN.match(name):
+                raise ValidationError(
+                    'Tags may only use letters, digits, hyphens and underscores, '
+                    'up to 50 characters: %(name)s', code='invalid_tag',
+                    params={'name': name})
+            names.append(name)
+        return names
+
+
+class IdListField(forms.Field):
+    """Ids from repeated form fields or a JSON list, cleaned to sorted integers."""
+
+    widget = forms.MultipleHiddenInput
+
+    def to_python(self, value):
+        """Convert each id to an integer."""
+        if not value:
+            return []
+        if not isinstance(value, (list, tuple)):
+            raise ValidationError('Enter a list of ids.', code='invalid_list')
+        try:
+            return sorted({int(pk) for pk in value})
+        except (TypeError, ValueError):
+            raise ValidationError('Ids must be whole numbers.', code='invalid_id')
+
+
+class Tag(models.Model):
+    """A lowercase label for photos, like ``sunset``."""
+
+    name = models.CharField(max_length=50, unique=True)
+
+    def __str__(self):
+        """The string form of the tag."""
+        return self.name
+
+
+class TagCount(models.Model):
+    """The number of public photos with a tag."""
 
+    tag = models.OneToOneField(Tag, on_delete=models.CASCADE, primary_key=True,
+                               related_name='public_count')
+    count = models.IntegerField(default=0)
 
-class Photo(models.Model):
+    @classmethod
+    def add(cls, deltas):
+        """Add ``{tag_id: delta}`` to the counts in one statement."""
+        rows = sorted((tag_id, delta) for tag_id, delta in deltas.items() if delta)
+        if not rows:
+            return
+        tag_ids, counts = zip(*rows)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'INSERT INTO {0} (tag_id, count) '
+                'SELECT * FROM unnest(%s::integer[], %s::integer[]) '
+                'ON CONFLICT (tag_id) DO UPDATE '
+                'SET count = {0}.count + EXCLUDED.count'.format(cls._meta.db_table),
+                [list(tag_ids), list(counts)])
+
+
+class UserTagCount(models.Model):
+    """The number of a user's photos with a tag."""
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='tag_counts')
+    tag = models.ForeignKey(Tag, on_delete=models.CASCADE, related_name='user_counts')
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        """Meta."""
+
+        unique_together = ('user', 'tag')
+
+    @classmethod
+    def add(cls, deltas):
+        """Add ``{(user_id, tag_id): delta}`` to the counts in one statement."""
+        rows = sorted((key + (delta,)) for key, delta in deltas.items() if delta)
+        if not rows:
+            return
+        user_ids, tag_ids, counts = zip(*rows)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'INSERT INTO {0} (user_id, tag_id, count) '
+                'SELECT * FROM unnest(%s::integer[], %s::integer[], %s::integer[]) '
+                'ON CONFLICT (user_id, tag_id) DO UPDATE '
+                'SET count = {0}.count + EXCLUDED.count'.format(cls._meta.db_table),
+                [list(user_ids), list(tag_ids), list(counts)])
+
+
+class ActiveOwnerManager(models.Manager):
+    """Custom manager for only rows owned by active users."""
+
+    def get_queryset(self):
+        """Leave out rows of deactivated and deleted accounts."""
+        return super(ActiveOwnerManager, self).get_queryset().filter(user__is_active=True)
+
+
+class Photo(KeptFieldsMixin, models.Model):
     """Photo uploaded by a User."""
 
+    objects = models.Manager()
+    active = ActiveOwnerManager()
+
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='photos')
-    image = ImageField(upload_to='images')
+    image = ImageField(upload_to=ShardedUploadTo('images'),
+                       validators=[validate_decode_budget])
     title = models.CharField(max_length=180, blank=True, default='Untitled')
     description = models.TextField(blank=True, null=True)
     date_uploaded = models.DateTimeField(auto_now_add=True)
     date_modified = models.DateTimeField(auto_now=True)
     date_published = models.DateTimeField(blank=True, null=True)
+    publish_at = models.DateTimeField(
+        blank=True, null=True,
+        help_text='Make it public at this time, as YYYY-MM-DD HH:MM.')
     published = models.CharField(
         max_length=7,
         choices=(('PRIVATE', 'Private'),
                  ('SHARED', 'Shared'),
                  ('PUBLIC', 'Public'))
     )
+    width = models.PositiveIntegerField(blank=True, null=True, editable=False)
+    height = models.PositiveIntegerField(blank=True, null=True, editable=False)
+    image_format = models.CharField(max_length=4, blank=True, editable=False)
+    search_vector = SearchVectorField(blank=True, null=True, editable=False)
+    tags = models.ManyToManyField(Tag, related_name='photos', blank=True)
+    views = models.PositiveIntegerField(default=0, editable=False)
+    like_count = models.PositiveIntegerField(default=0, editable=False)
+
+    KEPT_FIELDS = ('views', 'like_count')
+
+    class Meta:
+        """Meta."""
+
+        indexes = [GinIndex(fields=['search_vector'])]
 
     def __str__(self):
         """The string from of the image."""
         return self.title
 
 
-@receiver(models.signals.post_save, sender=Photo)
+@receiver(models.signals.pre_save, sender=Photo)
 def set_photo_published_date(sender, instance, **kwargs):
-    """Update the date published if published."""
-    if instance.published == 'PUBLIC' and not instance.date_published:
-        instance.date_published = timezone.now()
-        instance.save()
+    """Stamp the date published in the same write that first publishes."""
+    if instance.published == 'PUBLIC':
+        instance.publish_at = None
+        if not instance.date_published:
+            instance.date_published = timezone.now()
+            instance._first_published = True
+
+
+def adjust_tag_counts(pairs, delta):
+    """Add ``delta`` to the counts of each ``(photo_id, tag_id)`` pair."""
+    if not pairs:
+        return
+    photos = {photo_id: (user_id, published) for photo_id, user_id, published in
+              Photo.objects.filter(id__in={photo_id for photo_id, _ in pairs})
+              .values_list('id', 'user_id', 'published')}
+    per_user = Counter()
+    public = Counter()
+    for photo_id, tag_id in pairs:
+        if photo_id not in photos:
+            continue
+        user_id, published = photos[photo_id]
+        per_user[(user_id, tag_id)] += delta
+        if published == 'PUBLIC':
+            public[tag_id] += delta
+    UserTagCount.add(per_user)
+    TagCount.add(public)
+
+
+def current_taggings(instance, reverse, pk_set=None):
+    """The ``(photo_id, tag_id)`` rows that a removal or clear will delete."""
+    rows = Photo.tags.through.objects.filter(
+        **{'tag_id' if reverse else 'photo_id': instance.pk})
+    if pk_set is not None:
+        rows = rows.filter(**{'photo_id__in' if reverse else 'tag_id__in': pk_set})
+    return list(rows.values_list('photo_id', 'tag_id'))
+
+
+@receiver(models.signals.m2m_changed, sender=Photo.tags.through)
+def count_tag_changes(sender, instance, action, reverse, pk_set, **kwargs):
+    """Keep the tag counts in step with tags added to or removed from photos."""
+    if action == 'post_add' and pk_set:
+        if reverse:
+            adjust_tag_counts([(photo_id, instance.pk) for photo_id in pk_set], 1)
+        else:
+            adjust_tag_counts([(instance.pk, tag_id) for tag_id in pk_set], 1)
+    elif action in ('pre_remove', 'pre_clear'):
+        instance._removed_taggings = current_taggings(
+            instance, reverse, pk_set if action == 'pre_remove' else None)
+    elif action in ('post_remove', 'post_clear'):
+        adjust_tag_counts(instance.__dict__.pop('_removed_taggings', []), -1)
 
 
-class Album(models.Model):
+@receiver(models.signals.post_init, sender=Photo)
+def remember_photo_published(sender, instance, **kwargs):
+    """Note the loaded published state so saves can tell when it changes.
+
+    Reads the instance dict so photos loaded without the field stay deferred.
+    """
+    instance._published_was = instance.__dict__.get('published')
+
+
+@receiver(models.signals.post_save, sender=Photo)
+def count_published_tags(sender, instance, created, **kwargs):
+    """Move a photo's tags in or out of the public counts when it changes state."""
+    was = instance._published_was
+    instance._published_was = instance.__dict__.get('published')
+    if created or was is None or (was == 'PUBLIC') == (instance.published == 'PUBLIC'):
+        return
+    was_public = was == 'PUBLIC'
+    tag_ids = Photo.tags.through.objects.filter(
+        photo_id=instance.pk).values_list('tag_id', flat=True)
+    TagCount.add({tag_id: -1 if was_public else 1 for tag_id in tag_ids})
+
+
+@receiver(visibility_changed, sender=Photo)
+def count_bulk_published_tags(sender, changes, published, **kwargs):
+    """Move the tags of photos that crossed into or out of public in the counts."""
+    now_public = published == 'PUBLIC'
+    crossed = [pk for pk, was in changes if (was == 'PUBLIC') != now_public]
+    tag_ids = Counter(Photo.tags.through.objects.filter(
+        photo_id__in=crossed).values_list('tag_id', flat=True))
+    TagCount.add({tag_id: count if now_public else -count
+                  for tag_id, count in tag_ids.items()})
+
+
+@receiver(models.signals.pre_delete, sender=Photo)
+def uncount_deleted_photo_tags(sender, instance, **kwargs):
+    """Remove a deleted photo's tags from the counts."""
+    adjust_tag_counts(current_taggings(instance, reverse=False), -1)
+
+
+class Album(KeptFieldsMixin, models.Model):
     """Album of Photos created by the User."""
 
-    # objects = models.ModelManager()
+    objects = models.Manager()
+    active = ActiveOwnerManager()
+
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='albums')
     photos = models.ManyToManyField(Photo, related_name='albums')
     title = models.CharField(max_length=180, blank=True, default='Untitled')
-    cover = models.ForeignKey(Photo, blank=True, null=True, related_name='+')
+    cover = models.ForeignKey(Photo, blank=True, null=True, related_name='+',
+                              on_delete=models.SET_NULL)
     description = models.TextField(blank=True, null=True)
     date_uploaded = models.DateTimeField(auto_now_add=True)
     date_modified = models.DateTimeField(auto_now=True)
     date_published = models.DateTimeField(blank=True, null=True)
+    publish_at = models.DateTimeField(
+        blank=True, null=True,
+        help_text='Make it public at this time, as YYYY-MM-DD HH:MM.')
     published = models.CharField(
         max_length=7,
         choices=(('PRIVATE', 'Private'),
                  ('SHARED', 'Shared'),
                  ('PUBLIC', 'Public'))
     )
+    search_vector = SearchVectorField(blank=True, null=True, editable=False)
+    needs_renumbering = models.BooleanField(default=False, editable=False)
+    photo_count = models.PositiveIntegerField(default=0, editable=False)
+    cover_image_url = models.CharField(max_length=500, blank=True, editable=False)
+    cover_thumbnail_url = models.CharField(max_length=500, blank=True, editable=False)
+    last_photo_added = models.DateTimeField(blank=True, null=True, editable=False)
+    views = models.PositiveIntegerField(default=0, editable=False)
+
+    KEPT_FIELDS = ('needs_renumbering', 'photo_count', 'cover_image_url',
+                   'cover_thumbnail_url', 'last_photo_added', 'views')
+
+    class Meta:
+        """Meta."""
+
+        indexes = [GinIndex(fields=['search_vector'])]
 
     def __str__(self):
         """The string from of the album."""
         return self.title
 
 
-@receiver(models.signals.post_save, sender=Album)
+class AlbumPhoto(models.Model):
+    """A photo's place in an album.
+
+    This reads the table behind ``Album.photos``, where a migration adds
+    ``rank``. New rows get their rank from a sequence, so they sort last.
+    """
+
+    album = models.ForeignKey(Album, on_delete=models.CASCADE, related_name='memberships')
+    photo = models.ForeignKey(Photo, on_delete=models.CASCADE,
+                              related_name='album_memberships')
+    rank = models.FloatField()
+
+    class Meta:
+        """Meta."""
+
+        managed = False
+        db_table = 'imager_images_album_photos'
+
+
+@receiver(models.signals.pre_save, sender=Album)
 def set_album_published_date(sender, instance, **kwargs):
-    """Update the date published if published."""
-    if instance.published == 'PUBLIC' and not instance.date_published:
-        instance.date_published = timezone.now()
-        instance.save()
+    """Stamp the date published in the same write that first publishes."""
+    if instance.published == 'PUBLIC':
+        instance.publish_at = None
+        if not instance.date_published:
+            instance.date_published = timezone.now()
+            instance._first_published = True
+
+
+SITEMAP_SECTIONS = {Photo: 'photos', Album: 'albums'}
 
 
-class AlbumForm(ModelForm):
+@receiver(models.signals.post_save, sender=Photo)
+@receiver(models.signals.post_delete, sender=Photo)
+@receiver(models.signals.post_save, sender=Album)
+@receiver(models.signals.post_delete, sender=Album)
+@receiver(visibility_changed)
+def forget_galleries(sender, **kwargs):
+    """Drop the cached public galleries when a photo or album changes."""
+    invalidate_galleries()
+
+
+@receiver(models.signals.post_save, sender=Photo)
+@receiver(models.signals.post_delete, sender=Photo)
+@receiver(models.signals.post_save, sender=Album)
+@receiver(models.signals.post_delete, sender=Album)
+def forget_sitemap_shard(sender, instance, **kwargs):
+    """Drop the cached sitemap shard of a changed photo or album."""
+    invalidate_shards(SITEMAP_SECTIONS[sender], [instance.id])
+
+
+@receiver(visibility_changed)
+def forget_sitemap_shards(sender, changes=(), **kwargs):
+    """Drop the cached sitemap shards of photos or albums changed in bulk."""
+    invalidate_shards(SITEMAP_SECTIONS[sender], [pk for pk, _ in changes])
+
+
+def cover_urls(photo):
+    """The URLs of a cover photo's image and its album thumbnail."""
+    if photo is None:
+        return {'cover_image_url': '', 'cover_thumbnail_url': ''}
+    thumbnail = get_thumbnail(photo.image, COVER_THUMBNAIL, crop='center')
+    return {'cover_image_url': photo.image.url, 'cover_thumbnail_url': thumbnail.url}
+
+
+def refresh_album_counts(album_ids):
+    """Recount the photos of the albums in one UPDATE."""
+    members = (AlbumPhoto.objects.filter(album=models.OuterRef('pk'))
+               .order_by().values('album').annotate(total=models.Count('id')))
+    Album.objects.filter(id__in=album_ids).update(photo_count=Coalesce(
+        models.Subquery(members.values('total'), output_field=models.IntegerField()), 0))
+
+
+def refresh_album_covers(albums):
+    """Store the cover URLs of each album."""
+    for album in albums:
+        Album.objects.filter(id=album.id).update(**cover_urls(album.cover))
+
+
+@receiver(models.signals.m2m_changed, sender=Album.photos.through)
+def count_album_photos(sender, instance, action, reverse, pk_set, **kwargs):
+    """Keep the albums' photo counts and last addition time current."""
+    if action == 'pre_clear' and reverse:
+        instance._cleared_album_ids = list(instance.albums.values_list('id', flat=True))
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        album_ids = [instance.pk]
+    elif action == 'post_clear':
+        album_ids = instance.__dict__.pop('_cleared_album_ids', [])
+    else:
+        album_ids = list(pk_set or ())
+    refresh_album_counts(album_ids)
+    if action == 'post_add' and pk_set:
+        Album.objects.filter(id__in=album_ids).update(last_photo_added=timezone.now())
+
+
+@receiver(models.signals.post_init, sender=Album)
+def remember_album_cover(sender, instance, **kwargs):
+    """Note the loaded cover so saves can tell when it changes."""
+    instance._cover_id_was = instance.__dict__.get('cover_id')
+
+
+@receiver(models.signals.post_save, sender=Album)
+def store_album_cover(sender, instance, created, **kwargs):
+    """Store the cover URLs when an album's cover changes."""
+    changed = instance.cover_id != instance._cover_id_was
+    instance._cover_id_was = instance.cover_id
+    if not (changed or created and instance.cover_id):
+        return
+    urls = cover_urls(instance.cover)
+    Album.objects.filter(id=instance.id).update(**urls)
+    instance.__dict__.update(urls)
+
+
+@receiver(models.signals.post_init, sender=Photo)
+def remember_photo_image(sender, instance, **kwargs):
+    """Note the loaded image name so saves can tell when it is replaced."""
+    image = instance.__dict__.get('image')
+    instance._image_name_was = getattr(image, 'name', image)
+
+
+@receiver(models.signals.post_save, sender=Photo)
+def store_replaced_cover(sender, instance, created, **kwargs):
+    """Store new cover URLs for albums whose cover photo's image changed."""
+    name = instance.image.name
+    if created or instance._image_name_was in (None, name):
+        return
+    instance._image_name_was = name
+    refresh_album_covers(Album.objects.filter(cover=instance).select_related('cover'))
+
+
+@receiver(models.signals.pre_delete, sender=Photo)
+def remember_photo_albums(sender, instance, **kwargs):
+    """Note the albums of a photo about to be deleted."""
+    instance._album_ids = list(instance.albums.values_list('id', flat=True))
+    instance._covered_album_ids = list(
+        Album.objects.filter(cover=instance).values_list('id', flat=True))
+
+
+@receiver(models.signals.post_delete, sender=Photo)
+def refresh_deleted_photo_albums(sender, instance, **kwargs):
+    """Recount the albums a deleted photo was in and clear its cover URLs."""
+    refresh_album_counts(getattr(instance, '_album_ids', []))
+    Album.objects.filter(id__in=getattr(instance, '_covered_album_ids', [])).update(
+        **cover_urls(None))
+
+
+class TimelineEntry(models.Model):
+    """A photo or album by someone the owner follows, in the owner's feed.
+
+    Feeds are read newest first with one range scan of the
+    ``(owner, published, kind, object_id)`` index.
+    """
+
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='timeline')
+    author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    kind = models.CharField(max_length=5, choices=(('photo', 'Photo'), ('album', 'Album')))
+    object_id = models.IntegerField()
+    published = models.DateTimeField()
+
+    class Meta:
+        """Meta."""
+
+        unique_together = ('owner', 'kind', 'object_id')
+        indexes = [models.Index(fields=['owner', 'published', 'kind', 'object_id']),
+                   models.Index(fields=['kind', 'object_id'])]
+
+    @classmethod
+    def add(cls, owner_ids, author_id, kind, object_id, published):
+        """Put one item in the timelines of the owners in one statement."""
+        if not owner_ids:
+            return
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'INSERT INTO {} (owner_id, author_id, kind, object_id, published) '
+                'SELECT owner_id, %s, %s, %s, %s FROM unnest(%s::integer[]) AS owner_id '
+                'ON CONFLICT (owner_id, kind, object_id) DO NOTHING'.format(cls._meta.db_table),
+                [author_id, kind, object_id, published, list(owner_ids)])
+
+
+class FanOutJob(models.Model):
+    """A newly published photo or album still being copied into followers' timelines.
+
+    ``last_follower_id`` records how far the copy has got, so each batch
+    of followers is its own short transaction.
+    """
+
+    author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    kind = models.CharField(max_length=5, choices=(('photo', 'Photo'), ('album', 'Album')))
+    object_id = models.IntegerField()
+    published = models.DateTimeField()
+    last_follower_id = models.IntegerField(default=0)
+
+
+FEED_KINDS = {Photo: 'photo', Album: 'album'}
+
+
+@receiver(models.signals.post_save, sender=Photo)
+@receiver(models.signals.post_save, sender=Album)
+def queue_first_publish_fan_out(sender, instance, **kwargs):
+    """Queue the fan out of a photo or album saved as public for the first time."""
+    if instance.__dict__.pop('_first_published', False):
+        FanOutJob.objects.create(author_id=instance.user_id, kind=FEED_KINDS[sender],
+                                 object_id=instance.id, published=instance.date_published)
+
+
+@receiver(visibility_changed)
+def queue_bulk_fan_out(sender, first_published=(), **kwargs):
+    """Queue the fan out of items a bulk change published for the first time."""
+    FanOutJob.objects.bulk_create(
+        FanOutJob(author_id=user_id, kind=FEED_KINDS[sender], object_id=pk,
+                  published=date_published)
+        for pk, user_id, date_published in sender.objects.filter(
+            id__in=first_published).values_list('id', 'user_id', 'date_published'))
+
+
+@receiver(models.signals.post_delete, sender=Photo)
+@receiver(models.signals.post_delete, sender=Album)
+def remove_deleted_from_timelines(sender, instance, **kwargs):
+    """Drop a deleted photo or album from every timeline and the fan out queue."""
+    TimelineEntry.objects.filter(kind=FEED_KINDS[sender], object_id=instance.id).delete()
+    FanOutJob.objects.filter(kind=FEED_KINDS[sender], object_id=instance.id).delete()
+
+
+def touch_feeds(user_ids):
+    """Move the users' feed stamps forward, by at least a whole second each time.
+
+    The stamp is sent as ``Last-Modified``, which only has whole seconds,
+    so two changes within one second still get different stamps.
+    """
+    now = timezone.now().replace(microsecond=0) + timedelta(seconds=1)
+    ImagerProfile.objects.filter(user_id__in=user_ids).update(feed_updated=Greatest(
+        models.Value(now), models.F('feed_updated') + timedelta(seconds=1)))
+
+
+@receiver(models.signals.post_init, sender=Photo)
+@receiver(models.signals.post_init, sender=Album)
+def remember_public(sender, instance, **kwargs):
+    """Note whether the loaded item was public so saves can tell if its feed changes."""
+    instance._was_public = instance.__dict__.get('published') == 'PUBLIC'
+
+
+@receiver(models.signals.post_save, sender=Photo)
+@receiver(models.signals.post_save, sender=Album)
+def touch_saved_item_feed(sender, instance, **kwargs):
+    """Restamp the owner's feed when a public item is saved or stops being public."""
+    was_public, instance._was_public = instance._was_public, instance.published == 'PUBLIC'
+    if was_public or instance._was_public:
+        touch_feeds([instance.user_id])
+
+
+@receiver(models.signals.post_delete, sender=Photo)
+@receiver(models.signals.post_delete, sender=Album)
+def touch_deleted_item_feed(sender, instance, **kwargs):
+    """Restamp the owner's feed when a public item is deleted."""
+    if instance.__dict__.get('published') == 'PUBLIC':
+        touch_feeds([instance.user_id])
+
+
+@receiver(visibility_changed)
+def touch_bulk_changed_feeds(sender, changes=(), published=None, **kwargs):
+    """Restamp the feeds of owners whose items a bulk change moved into or out of public."""
+    crossed = [pk for pk, was in changes if (was == 'PUBLIC') != (published == 'PUBLIC')]
+    if crossed:
+        touch_feeds(sender.objects.filter(id__in=crossed).values('user_id'))
+
+
+class ViewCount(models.Model):
+    """The views of a photo or album in one hour.
+
+    Views are added here and to the item's ``views`` total in batches by
+    ``imager_images.counters``, never one request at a time. ``scored`` is
+    how many of them ``imager_images.ranking`` has added to the photo's
+    scores, so it takes back out exactly that many.
+    """
+
+    kind = models.CharField(max_length=5, choices=(('photo', 'Photo'), ('album', 'Album')))
+    object_id = models.IntegerField()
+    hour = models.DateTimeField()
+    views = models.PositiveIntegerField(default=0)
+    scored = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        """Meta."""
+
+        unique_together = ('kind', 'object_id', 'hour')
+        indexes = [models.Index(fields=['hour'])]
+
+    @classmethod
+    def add(cls, counts):
+        """Add ``{(kind, object_id, hour): views}`` to the hourly rows and the totals.
+
+        Rows are written in key order, so concurrent flushes lock them in
+        the same order and cannot deadlock.
+        """
+        if not counts:
+            return
+        keys = sorted(counts)
+        columns = [[key[0] for key in keys], [key[1] for key in keys],
+                   [key[2] for key in keys], [counts[key] for key in keys]]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'INSERT INTO {table} (kind, object_id, hour, views, scored) '
+                'SELECT kind, object_id, to_timestamp(hour), views, 0 FROM unnest('
+                '%s::varchar[], %s::integer[], %s::bigint[], %s::integer[]) '
+                'AS added(kind, object_id, hour, views) '
+                'ON CONFLICT (kind, object_id, hour) '
+                'DO UPDATE SET views = {table}.views + EXCLUDED.views'.format(
+                    table=cls._meta.db_table), columns)
+            for kind, model in (('photo', Photo), ('album', Album)):
+                totals = Counter()
+                for key in keys:
+                    if key[0] == kind:
+                        totals[key[1]] += counts[key]
+                if not totals:
+                    continue
+                ids = sorted(totals)
+                cursor.execute(
+                    'UPDATE {table} SET views = {table}.views + added.views '
+                    'FROM unnest(%s::integer[], %s::integer[]) AS added(id, views) '
+                    'WHERE {table}.id = added.id'.format(table=model._meta.db_table),
+                    [ids, [totals[pk] for pk in ids]])
+
+
+class Favorite(models.Model):
+    """A photo a user has favorited.
+
+    Each user's favorites are read newest first with one range scan of
+    the ``(user, id)`` index.
+    """
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='favorites')
+    photo = models.ForeignKey(Photo, on_delete=models.CASCADE, related_name='favorites')
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        """Meta."""
+
+        unique_together = ('user', 'photo')
+        indexes = [models.Index(fields=['user', 'id'])]
+
+    def __str__(self):
+        """The user and the photo they favorited."""
+        return '{} favorited {}'.format(self.user_id, self.photo_id)
+
+
+@receiver(models.signals.post_save, sender=Favorite)
+def count_new_favorite(sender, instance, created, **kwargs):
+    """Add a new favorite to the photo's like count."""
+    if created:
+        Photo.objects.filter(id=instance.photo_id).update(
+            like_count=models.F('like_count') + 1)
+
+
+@receiver(models.signals.post_delete, sender=Favorite)
+def uncount_favorite(sender, instance, **kwargs):
+    """Remove a deleted favorite from the photo's like count."""
+    Photo.objects.filter(id=instance.photo_id).update(
+        like_count=models.F('like_count') - 1)
+
+
+class PhotoScore(models.Model):
+    """A photo's running engagement scores, kept up to date by ``rank_photos``.
+
+    ``trending`` is a forward decayed sum: each hour's views are weighted
+    by how many half-lives that hour lies after ``RankingState.landmark``,
+    so newer views count more without older scores ever being touched.
+    """
+
+    photo = models.OneToOneField(Photo, on_delete=models.CASCADE, primary_key=True,
+                                 related_name='score')
+    trending = models.FloatField(default=0)
+    week_views = models.IntegerField(default=0)
+
+
+class RankingState(models.Model):
+    """The last hour of views scored and the landmark trending scores are relative to."""
+
+    scored_hour = models.DateTimeField()
+    landmark = models.DateTimeField()
+
+
+class GalleryRank(models.Model):
+    """A photo's place in a ranked gallery, rewritten by each ``rank_photos`` run."""
+
+    BOARDS = (('trending', 'Trending'), ('popular', 'Most viewed this week'))
+
+    board = models.CharField(max_length=8, choices=BOARDS)
+    position = models.PositiveIntegerField()
+    photo = models.ForeignKey(Photo, on_delete=models.CASCADE, related_name='+')
+
+    class Meta:
+        """Meta."""
+
+        unique_together = ('board', 'position')
+
+
+@receiver(models.signals.post_save, sender=Photo)
+def unrank_hidden_photo(sender, instance, created=False, **kwargs):
+    """Take a photo that is no longer public out of the ranked galleries."""
+    if not created and instance.published != 'PUBLIC':
+        GalleryRank.objects.filter(photo_id=instance.id).delete()
+
+
+@receiver(visibility_changed)
+def unrank_hidden_photos(sender, changes=(), published=None, **kwargs):
+    """Take photos a bulk change made private or shared out of the ranked galleries."""
+    if sender is Photo and published != 'PUBLIC':
+        GalleryRank.objects.filter(photo_id__in=[pk for pk, _ in changes]).delete()
+
+
+class ScheduleFormMixin(object):
+    """Check a model form's ``publish_at`` when it is changed, not on every edit."""
+
+    def clean_publish_at(self):
+        """A new publish time must be in the future."""
+        value = self.cleaned_data.get('publish_at')
+        if value and 'publish_at' in self.changed_data:
+            validate_future(value)
+        return value
+
+
+class AlbumForm(ScheduleFormMixin, ModelForm):
     """Form for an Album."""
 
     class Meta:
         """Meta."""
 
         model = Album
-        fields = ['title', 'description', 'photos', 'cover', 'published']
+        fields = ['title', 'description', 'photos', 'cover', 'published', 'publish_at']
+        widgets = {'photos': PhotoPickerWidget(multiple=True),
+                   'cover': PhotoPickerWidget()}
 
     def __init__(self, *args, **kwargs):
-        """Limit photos to only those by the user."""
+        """Limit photos to only those by the user.
+
+        The pickers never list the querysets, and validation only looks up
+        the submitted ids.
+        """
         username = kwargs.pop('username')
         super(AlbumForm, self).__init__(*args, **kwargs)
         self.fields['photos'].queryset = Photo.objects.filter(user__username=username)
         self.fields['cover'].queryset = Photo.objects.filter(user__username=username)
+
+
+class PhotoForm(ScheduleFormMixin, ModelForm):
+    """Form for a Photo."""
+
+    image = HeaderCheckedImageField()
+    tags = TagListField(required=False, help_text='Separate tags with commas.')
+
+    class Meta:
+        """Meta."""
+
+        model = Photo
+        fields = ['title', 'description', 'image', 'published', 'publish_at']
+
+    def __init__(self, *args, **kwargs):
+        """Show the photo's current tags."""
+        super(PhotoForm, self).__init__(*args, **kwargs)
+        if self.instance.pk:
+            self.initial['tags'] = ', '.join(
+                self.instance.tags.order_by('name').values_list('name', flat=True))
+
+    def save(self, commit=True):
+        """Record the dimensions read from the header of a new upload."""
+        header = getattr(self.cleaned_data.get('image'), 'image_header', None)
+        if header:
+            self.instance.width = header.width
+            self.instance.height = header.height
+            self.instance.image_format = header.format
+        return super(PhotoForm, self).save(commit)
+
+    def _save_m2m(self):
+        """Set the photo's tags, creating any that are new."""
+        super(PhotoForm, self)._save_m2m()
+        names = self.cleaned_data.get('tags', [])
+        tags = list(Tag.objects.filter(name__in=names))
+        known = {tag.name for tag in tags}
+        tags.extend(Tag.objects.get_or_create(name=name)[0]
+                    for name in names if name not in known)
+        self.instance.tags.set(tags)
+
+
+class VisibilityForm(forms.Form):
+    """Form for changing the visibility of many photos or albums at once."""
+
+    kind = forms.ChoiceField(choices=(('photos', 'Photos'), ('albums', 'Albums')))
+    published = forms.ChoiceField(choices=Photo._meta.get_field('published').choices)
+    ids = IdListField(required=False)
+    everything = forms.BooleanField(required=False)
+    tags = TagListField(required=False)
+
+    def clean(self):
+        """Require either some ids or everything."""
+        cleaned_data = super(VisibilityForm, self).clean()
+        if not cleaned_data.get('ids') and not cleaned_data.get('everything'):
+            raise ValidationError('Choose some items or all of them.', code='empty')
+        return cleaned_data
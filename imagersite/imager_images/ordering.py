@@ -0,0 +1,75 @@
+"""The order of photos within an album.
+
+Each membership row has a floating point rank. Moving a photo gives it
+the midpoint of its new neighbours' ranks, so a move writes one row.
+Repeated moves into the same gap halve it each time. Once a gap gets
+narrower than ``MIN_GAP``, the album is flagged, and the
+``renumber_albums`` command spaces its ranks out again.
+"""
+from django.db import connection, transaction
+from imager_images.models import Album, AlbumPhoto, Photo
+
+RANK_GAP = 1024.0
+MIN_GAP = 1e-6
+
+
+def ordered_photos(album):
+    """The album's photos in rank order."""
+    return Photo.objects.filter(album_memberships__album=album).order_by(
+        'album_memberships__rank', 'album_memberships__id')
+
+
+def next_rank():
+    """A rank after every rank handed out so far."""
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT nextval('imager_images_album_photos_rank_seq') * %s",
+                       [RANK_GAP])
+        return cursor.fetchone()[0]
+
+
+def move_photo(album, photo_id, after=None, before=None):
+    """Move a photo to just after or before another photo of the album.
+
+    With neither neighbour given the photo moves to the end. Raises
+    ``AlbumPhoto.DoesNotExist`` if either photo is not in the album.
+    """
+    members = AlbumPhoto.objects.filter(album=album)
+    with transaction.atomic():
+        membership = members.select_for_update().get(photo_id=photo_id)
+        others = members.exclude(id=membership.id)
+        if after is not None:
+            low = members.get(photo_id=after).rank
+            high = (others.filter(rank__gt=low).order_by('rank')
+                    .values_list('rank', flat=True).first())
+        elif before is not None:
+            high = members.get(photo_id=before).rank
+            low = (others.filter(rank__lt=high).order_by('-rank')
+                   .values_list('rank', flat=True).first())
+        else:
+            low = high = None
+
+        if high is None:
+            rank = next_rank()
+        elif low is None:
+            rank = high - RANK_GAP
+        else:
+            rank = (low + high) / 2
+            if not low < rank < high:
+                renumber(album)
+                return move_photo(album, photo_id, after, before)
+            if high - low < MIN_GAP * 2:
+                Album.objects.filter(id=album.id).update(needs_renumbering=True)
+        members.filter(id=membership.id).update(rank=rank)
+    return rank
+
+
+def renumber(album):
+    """Space the album's ranks ``RANK_GAP`` apart, keeping their order."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'UPDATE {0} AS member SET rank = ordered.position * %s '
+            'FROM (SELECT id, row_number() OVER (ORDER BY rank, id) AS position '
+            '      FROM {0} WHERE album_id = %s) AS ordered '
+            'WHERE member.id = ordered.id'.format(AlbumPhoto._meta.db_table),
+            [RANK_GAP, album.id])
+    Album.objects.filter(id=album.id).update(needs_renumbering=False)
@@ -0,0 +1,11 @@
+"""Paginators for lists whose length is already known."""
+from django.core.paginator import Paginator
+
+
+class CountedPaginator(Paginator):
+    """A paginator given its item count instead of running COUNT(*)."""
+
+    def __init__(self, object_list, per_page, count, **kwargs):
+        """Use ``count`` as the number of items in ``object_list``."""
+        super(CountedPaginator, self).__init__(object_list, per_page, **kwargs)
+        self.__dict__['count'] = count
@@ -0,0 +1,109 @@
+"""Trending and most viewed photos, scored as views arrive and ranked ahead of time."""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Min
+from django.utils import timezone
+from imager_images.gallery_cache import invalidate_galleries
+from imager_images.models import GalleryRank, Photo, PhotoScore, RankingState, ViewCount
+
+HOUR = timedelta(hours=1)
+WEEK = timedelta(days=7)
+LATE_VIEWS = timedelta(days=1)
+BOARD_SCORES = {'trending': 'trending', 'popular': 'week_views'}
+
+
+def tables():
+    """The table names the scoring statements are formatted with."""
+    return {'score': PhotoScore._meta.db_table, 'views': ViewCount._meta.db_table,
+            'photo': Photo._meta.db_table}
+
+
+def score_views(now=None):
+    """Add the views of every hour completed since the last run to the scores.
+
+    Only the new hours are read: they are added to each photo's trending
+    score with their forward decay weight and to its week's views, and the
+    hours that have left the week are taken back out. The first run starts
+    from the earliest views there are. Once the landmark is a week old
+    every trending score is scaled down to a new one, so the weights stay
+    small. An hour is scored once the web processes have had time to
+    flush it. Views written for it later, by an idle process or from a
+    recovered spool, are added by the next run within LATE_VIEWS; after
+    that they count towards the totals only. Each hourly row records the
+    views it added as ``scored``, and an hour leaving the week takes out
+    exactly those. Returns the number of hours scored.
+    """
+    settled = (now or timezone.now()) - timedelta(seconds=settings.VIEW_FLUSH_SECONDS)
+    last_hour = settled.replace(minute=0, second=0, microsecond=0) - HOUR
+    half_life = settings.TRENDING_HALF_LIFE_HOURS * 3600
+    with transaction.atomic():
+        state = RankingState.objects.select_for_update().filter(id=1).first()
+        if state is None:
+            first = ViewCount.objects.filter(kind='photo').aggregate(first=Min('hour'))['first']
+            state = RankingState.objects.create(
+                id=1, scored_hour=first - HOUR if first else last_hour,
+                landmark=last_hour - WEEK)
+        if state.scored_hour >= last_hour:
+            return 0
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'UPDATE {score} SET week_views = {score}.week_views - gone.views '
+                'FROM (SELECT object_id, sum(scored) AS views FROM {views} '
+                "WHERE kind = 'photo' AND hour > %s AND hour <= %s GROUP BY object_id) AS gone "
+                'WHERE {score}.photo_id = gone.object_id'.format(**tables()),
+                [state.scored_hour - WEEK, min(state.scored_hour, last_hour - WEEK)])
+            if last_hour - state.landmark >= WEEK:
+                cursor.execute(
+                    'UPDATE {score} SET trending = trending * power(2, %s)'.format(**tables()),
+                    [-(last_hour - state.landmark).total_seconds() / half_life])
+                cursor.execute(
+                    'DELETE FROM {score} WHERE week_views = 0 AND trending < %s'.format(
+                        **tables()), [settings.TRENDING_MIN_SCORE])
+                state.landmark = last_hour
+
+            cursor.execute(
+                'WITH fresh AS ('
+                'SELECT id, object_id, hour, views - scored AS views FROM {views} '
+                "WHERE kind = 'photo' AND hour > %s AND hour <= %s AND views > scored "
+                'ORDER BY object_id, hour FOR UPDATE), '
+                'marked AS (UPDATE {views} SET scored = {views}.scored + fresh.views '
+                'FROM fresh WHERE {views}.id = fresh.id) '
+                'INSERT INTO {score} (photo_id, trending, week_views) '
+                'SELECT fresh.object_id, '
+                'sum(fresh.views * power(2, extract(epoch FROM fresh.hour - %s) / %s)), '
+                'coalesce(sum(fresh.views) FILTER (WHERE fresh.hour > %s), 0) '
+                'FROM fresh JOIN {photo} AS photo ON photo.id = fresh.object_id '
+                'GROUP BY fresh.object_id '
+                'ON CONFLICT (photo_id) DO UPDATE SET '
+                'trending = {score}.trending + EXCLUDED.trending, '
+                'week_views = {score}.week_views + EXCLUDED.week_views'.format(**tables()),
+                [min(state.scored_hour, last_hour - LATE_VIEWS), last_hour,
+                 state.landmark, half_life, last_hour - WEEK])
+
+        hours = int((last_hour - state.scored_hour) / HOUR)
+        state.scored_hour = last_hour
+        state.save()
+    return hours
+
+
+def rank_galleries(size):
+    """Rewrite each board with its best scoring public photos, in order."""
+    for board, score in BOARD_SCORES.items():
+        column = 'score__{}'.format(score)
+        with transaction.atomic():
+            ids = list(Photo.active.filter(published='PUBLIC', **{column + '__gt': 0})
+                       .order_by('-' + column, '-id').values_list('id', flat=True)[:size])
+            GalleryRank.objects.filter(board=board).delete()
+            GalleryRank.objects.bulk_create(
+                GalleryRank(board=board, position=position, photo_id=pk)
+                for position, pk in enumerate(ids, 1))
+    invalidate_galleries()
+
+
+def ranked_photos(board):
+    """The ranks of a board in order, each with its photo, for slicing into pages."""
+    return (GalleryRank.objects.filter(board=board, photo__user__is_active=True)
+            .select_related('photo').order_by('position'))
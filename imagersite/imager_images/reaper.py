@@ -0,0 +1,72 @@
+"""Remove the rows and files of deleted accounts in small batches."""
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.utils import timezone
+from imager_images.derivatives import get_cache
+from imager_images.exports import delete_archives
+from imager_images.models import Album, Photo
+from imager_profile.models import AccountExport, AccountTombstone
+from sorl.thumbnail import delete
+
+
+def delete_media(photos):
+    """Delete the originals, thumbnails and cached derivatives of ``(id, name)`` pairs.
+
+    sorl's key-value store is in the database, so the pool thread this
+    runs in closes its connection when done rather than leaving it open.
+    """
+    try:
+        for photo_id, name in photos:
+            if name:
+                delete(name)
+            get_cache().purge(photo_id)
+    finally:
+        connection.close()
+
+
+def reap_photos(user_id, pool, workers, batch_size):
+    """Delete the user's photos a batch at a time, rows first and then files.
+
+    Each batch is its own short transaction, so no lock is held across the
+    whole account. Files are only removed once their rows are gone, and
+    never while another photo still points at the same name.
+    """
+    deleted = 0
+    photos = Photo.objects.filter(user_id=user_id).order_by('id')
+    while True:
+        batch = list(photos.values_list('id', 'image')[:batch_size])
+        if not batch:
+            return deleted
+        with transaction.atomic():
+            Photo.objects.filter(id__in=[pk for pk, _ in batch]).delete()
+        shared = set(Photo.objects.filter(image__in=[name for _, name in batch])
+                     .values_list('image', flat=True))
+        media = [(pk, name if name not in shared else '') for pk, name in batch]
+        list(pool.map(delete_media, [media[start::workers] for start in range(workers)]))
+        deleted += len(batch)
+
+
+def reap_albums(user_id, batch_size):
+    """Delete the user's albums a batch at a time."""
+    albums = Album.objects.filter(user_id=user_id).order_by('id')
+    while True:
+        ids = list(albums.values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return
+        with transaction.atomic():
+            Album.objects.filter(id__in=ids).delete()
+
+
+def reap(tombstone, workers=8, batch_size=100):
+    """Remove everything of a deleted account and mark the tombstone done."""
+    delete_archives(AccountExport.objects.filter(user_id=tombstone.user_id))
+    reap_albums(tombstone.user_id, batch_size)
+    with ThreadPoolExecutor(workers) as pool:
+        deleted = reap_photos(tombstone.user_id, pool, workers, batch_size)
+    with transaction.atomic():
+        User.objects.filter(id=tombstone.user_id).delete()
+        AccountTombstone.objects.filter(id=tombstone.id).update(
+            completed=timezone.now(), photos_deleted=deleted)
+    return deleted
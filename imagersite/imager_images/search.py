@@ -0,0 +1,53 @@
+"""Full-text search over photos and albums."""
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db.models import F, FloatField, Q
+from django.db.models.functions import Cast
+from imager_images.models import Album, Photo
+
+
+SEARCH_MODELS = {'photos': Photo, 'albums': Album}
+
+
+def visible_to(queryset, user):
+    """Limit a queryset to public items and the user's own items."""
+    if user.is_authenticated:
+        return queryset.filter(Q(published='PUBLIC') | Q(user=user))
+    return queryset.filter(published='PUBLIC')
+
+
+def encode_cursor(item):
+    """The position after ``item`` in ranked results."""
+    return '{!r}_{}'.format(item.rank, item.id)
+
+
+def decode_cursor(cursor):
+    """Split a cursor into its rank and id, or None if malformed."""
+    try:
+        rank, pk = cursor.split('_')
+        return float(rank), int(pk)
+    except (AttributeError, ValueError):
+        return None
+
+
+def search(text, user, kind='photos', cursor=None, limit=20):
+    """Return a page of matches best first and the cursor for the next page.
+
+    Matches are found through the GIN index on ``search_vector``, and
+    pages continue from the rank and id of the last item seen rather than
+    by offset. Ranks are cast to double precision so the cursor compares
+    equal to the value it was read from.
+    """
+    query = SearchQuery(text, config='english')
+    results = (visible_to(SEARCH_MODELS[kind].active.filter(search_vector=query), user)
+               .annotate(rank=Cast(SearchRank(F('search_vector'), query), FloatField()))
+               .select_related('user')
+               .order_by('-rank', '-id'))
+
+    position = decode_cursor(cursor) if cursor else None
+    if position:
+        rank, pk = position
+        results = results.filter(Q(rank__lt=rank) | Q(rank=rank, id__lt=pk))
+
+    page = list(results[:limit + 1])
+    next_cursor = encode_cursor(page[limit - 1]) if len(page) > limit else None
+    return page[:limit], next_cursor
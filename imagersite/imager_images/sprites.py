@@ -0,0 +1,103 @@
+"""Contact sheets that pack a page of photo thumbnails into one image."""
+from collections import namedtuple
+from io import BytesIO
+import hashlib
+import json
+import posixpath
+
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image
+from sorl.thumbnail import get_thumbnail
+
+
+Tile = namedtuple('Tile', ['photo', 'x', 'y'])
+Sprite = namedtuple('Sprite', ['url', 'width', 'height', 'tile_size', 'tiles'])
+
+PREFIX = 'sprites'
+TILE_SIZE = 250
+COLUMNS = 4
+CACHE_TIMEOUT = 60 * 60 * 24 * 7
+
+
+def sprite_name(photos, tile_size):
+    """A storage name that changes whenever the photos or their images do."""
+    content = '|'.join('{}:{}'.format(photo.id, photo.image.name) for photo in photos)
+    key = hashlib.sha1('{}|{}'.format(tile_size, content).encode('utf8')).hexdigest()
+    return '{}/{}/{}.jpg'.format(PREFIX, key[:2], key)
+
+
+def cache_key(name):
+    """The cache key of the sheet a stored sheet or manifest name belongs to."""
+    return 'sprite:' + posixpath.splitext(name)[0] + '.jpg'
+
+
+def layout(photos, tile_size, columns):
+    """The coordinates of each photo on the sheet and the sheet size."""
+    positions = [(photo.id, (index % columns) * tile_size, (index // columns) * tile_size)
+                 for index, photo in enumerate(photos)]
+    rows = (len(positions) + columns - 1) // columns
+    return positions, min(len(positions), columns) * tile_size, rows * tile_size
+
+
+def build(photos, name, tile_size, columns):
+    """Compose the sheet and its JSON manifest and write both to storage.
+
+    A sheet already stored with its manifest, by another process or before
+    its cache entry expired, is reused from the manifest.
+    """
+    manifest_name = name[:-len('.jpg')] + '.json'
+    if default_storage.exists(manifest_name) and default_storage.exists(name):
+        with default_storage.open(manifest_name) as stored:
+            return json.loads(stored.read().decode('utf8'))
+
+    positions, width, height = layout(photos, tile_size, columns)
+    sheet = Image.new('RGB', (width, height), 'white')
+    geometry = '{0}x{0}'.format(tile_size)
+    for photo, (_, x, y) in zip(photos, positions):
+        thumbnail = get_thumbnail(photo.image, geometry, crop='center')
+        tile = Image.open(BytesIO(thumbnail.read()))
+        sheet.paste(tile.convert('RGB'), (x, y))
+
+    output = BytesIO()
+    sheet.save(output, 'JPEG', quality=85, progressive=True)
+    default_storage.delete(name)
+    default_storage.save(name, ContentFile(output.getvalue()))
+    manifest = {'width': width, 'height': height, 'tile_size': tile_size,
+                'tiles': [{'id': pk, 'x': x, 'y': y} for pk, x, y in positions]}
+    default_storage.delete(manifest_name)
+    default_storage.save(manifest_name,
+                         ContentFile(json.dumps(manifest).encode('utf8')))
+    return manifest
+
+
+def get_sprite(photos, tile_size=TILE_SIZE, columns=COLUMNS):
+    """Return the sheet for the photos, building it on first use.
+
+    A sheet's name comes from its photos and their images, so a change
+    leads to a new sheet rather than a rewritten one. Each manifest is
+    kept in the shared cache, whose entries are also how ``collect_media``
+    tells the sheets in use from the old ones it deletes.
+    """
+    photos = list(photos)
+    if not photos:
+        return None
+    name = sprite_name(photos, tile_size)
+    manifest = cache.get(cache_key(name))
+    if manifest is None:
+        manifest = build(photos, name, tile_size, columns)
+        cache.set(cache_key(name), manifest, CACHE_TIMEOUT)
+
+    by_id = {photo.id: photo for photo in photos}
+    tiles = [Tile(by_id[tile['id']], tile['x'], tile['y'])
+             for tile in manifest['tiles']]
+    return Sprite(default_storage.url(name), manifest['width'],
+                  manifest['height'], manifest['tile_size'], tiles)
+
+
+def sheets_in_use(names):
+    """The stored sheet and manifest names among ``names`` whose sheet is cached."""
+    keys = {name: cache_key(name) for name in names}
+    cached = cache.get_many(set(keys.values()))
+    return {name for name, key in keys.items() if key in cached}
@@ -0,0 +1,80 @@
+"""Where photo files live in media storage."""
+import hashlib
+import os
+import re
+import uuid
+
+from django.utils.deconstruct import deconstructible
+
+
+@deconstructible
+class ShardedUploadTo(object):
+    """Spread uploads over hashed subdirectories, like images/ab/cd/<key>.jpg.
+
+    Keys are random by default; subclasses pick another key by overriding
+    ``key``.
+    """
+
+    def __init__(self, prefix, depth=2):
+        """Shard names under ``prefix`` into ``depth`` levels of directories."""
+        self.prefix = prefix
+        self.depth = depth
+
+    def __call__(self, instance, filename):
+        """Return the sharded name for a new upload."""
+        extension = os.path.splitext(filename)[1].lower()
+        return self.path_for(self.key(instance, filename), extension)
+
+    def key(self, instance, filename):
+        """A random hex key for the upload."""
+        return uuid.uuid4().hex
+
+    def path_for(self, key, extension):
+        """The storage name of the file with the given key."""
+        shards = [key[level * 2:level * 2 + 2] for level in range(self.depth)]
+        return '/'.join([self.prefix] + shards + [key + extension])
+
+    def is_sharded(self, name):
+        """Whether a stored name already follows the sharded layout."""
+        return re.match(self.pattern(), name) is not None
+
+    def pattern(self):
+        """A regular expression matching sharded names."""
+        return r'^{}/{}[0-9a-f]+(\.[^/]*)?$'.format(
+            re.escape(self.prefix), r'[0-9a-f]{2}/' * self.depth)
+
+
+@deconstructible
+class ContentHashUploadTo(ShardedUploadTo):
+    """Shard uploads by the SHA-1 of their content, so duplicates get the same name.
+
+    Whether they then share one file is up to the storage: S3 storage with
+    ``AWS_S3_FILE_OVERWRITE`` on, its default, writes over the identical
+    file, while ``FileSystemStorage`` saves the duplicate under a suffixed
+    name. Callers wanting one file per content check ``exists`` before
+    saving, as the importer does.
+    """
+
+    def __init__(self, prefix, field='image', depth=2):
+        """Hash the file held by ``field`` on the instance."""
+        super(ContentHashUploadTo, self).__init__(prefix, depth)
+        self.field = field
+
+    def key(self, instance, filename):
+        """The SHA-1 of the uploaded file."""
+        return hash_file(getattr(instance, self.field).file)
+
+
+def hash_file(content):
+    """The SHA-1 hex digest of a Django file, read in chunks."""
+    digest = hashlib.sha1()
+    for chunk in content.chunks():
+        digest.update(chunk)
+    content.seek(0)
+    return digest.hexdigest()
+
+
+def move_file(storage, old_name, new_name):
+    """Copy a stored file to a new name and return the name it was saved as."""
+    with storage.open(old_name) as content:
+        return storage.save(new_name, content)
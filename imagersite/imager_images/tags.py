@@ -0,0 +1,56 @@
+"""Filtering photos by tag and reading the precomputed tag counts."""
+from django.db.models import Count
+from imager_images.models import Photo, Tag, TagCount, UserTagCount
+
+
+def tag_names(values):
+    """Normalize the tag names given in a query string."""
+    names = []
+    for value in values:
+        name = value.strip().lower()
+        if name and name not in names:
+            names.append(name)
+    return names
+
+
+def filter_by_tags(queryset, names):
+    """Limit photos to those carrying every one of the named tags.
+
+    Each tag adds a join on the ``(tag_id, photo_id)`` index, rarest tag
+    first, so the intersection starts from the smallest set of photos.
+    """
+    if not names:
+        return queryset
+    tags = dict(Tag.objects.filter(name__in=names).values_list('id', 'public_count__count'))
+    if len(tags) < len(names):
+        return queryset.none()
+    for tag_id in sorted(tags, key=lambda tag_id: tags[tag_id] or 0):
+        queryset = queryset.filter(tags=tag_id)
+    return queryset
+
+
+def popular_tags(limit=20):
+    """The tags with the most public photos."""
+    return (TagCount.objects.filter(count__gt=0).select_related('tag')
+            .order_by('-count', 'tag__name')[:limit])
+
+
+def user_tags(user, limit=20):
+    """The tags the user has used most."""
+    return (UserTagCount.objects.filter(user=user, count__gt=0).select_related('tag')
+            .order_by('-count', 'tag__name')[:limit])
+
+
+def rebuild_counts():
+    """Recompute every tag count from the photos, replacing the stored ones."""
+    through = Photo.tags.through.objects
+    public = (through.filter(photo__published='PUBLIC').values('tag_id')
+              .annotate(total=Count('photo_id')))
+    per_user = through.values('photo__user_id', 'tag_id').annotate(total=Count('photo_id'))
+    TagCount.objects.all().delete()
+    TagCount.objects.bulk_create(
+        TagCount(tag_id=row['tag_id'], count=row['total']) for row in public)
+    UserTagCount.objects.all().delete()
+    UserTagCount.objects.bulk_create(
+        UserTagCount(user_id=row['photo__user_id'], tag_id=row['tag_id'], count=row['total'])
+        for row in per_user)
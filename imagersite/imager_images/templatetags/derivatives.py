@@ -0,0 +1,11 @@
+"""Template tags for resized copies of photos."""
+from django import template
+from imager_images import derivatives
+
+register = template.Library()
+
+
+@register.simple_tag
+def derivative_url(photo, width, height, fit='cover', quality=85, format='jpg'):
+    """The signed URL of a resized copy of the photo."""
+    return derivatives.derivative_url(photo, width, height, fit, quality, format)
@@ -128,7 +128,8 @@ class PhotoAlbumTests(TestCase):
     def test_all_photos_are_added_to_the_media_directory(self):
         """Test that all created photos are added to the media directory."""
         path = os.path.join(settings.MEDIA_ROOT, 'images')
-        files = [name for name in os.listdir(path) if name.endswith('.jpg')]
+        files = [name for _, _, names in os.walk(path)
+                 for name in names if name.endswith('.jpg')]
         self.assertEqual(len(files), 37)
 
     def test_photos_are_added_to_an_album(self):
@@ -1265,3 +1266,2710 @@ class PhotoAlbumRouteTests(TestCase):
         data = {}
         response = self.client.post(reverse_lazy('album_edit', kwargs={'id': album_id}), data)
         self.assertIn(b'class="errorlist"', response.content)
+
+
+"""Tests for the image decode budget."""
+
+
+class DecodeBudgetTests(TestCase):
+    """Tests for decoding images within the memory budget."""
+
+    def test_estimate_is_bytes_per_pixel_for_rgb(self):
+        """Test that an RGB image needs three bytes per pixel."""
+        from imager_images.decoding import DecodeBudget
+        budget = DecodeBudget(1000, 1000, 0)
+        self.assertEqual(budget.estimate(10, 10, 'RGB'), 300)
+
+    def test_estimate_adds_rgb_copy_for_other_modes(self):
+        """Test that a CMYK image also pays for the converted RGB copy."""
+        from imager_images.decoding import DecodeBudget
+        budget = DecodeBudget(1000, 1000, 0)
+        self.assertEqual(budget.estimate(10, 10, 'CMYK'), 700)
+
+    def test_check_rejects_images_over_the_pixel_limit(self):
+        """Test that decompression bombs are rejected and counted."""
+        from imager_images.decoding import DecodeBudget, DecodeRejected
+        budget = DecodeBudget(10 ** 9, 100, 0)
+        with self.assertRaises(DecodeRejected):
+            budget.check(11, 10, 'L')
+        self.assertEqual(budget.metrics()['rejected'], 1)
+
+    def test_check_rejects_images_over_the_byte_limit(self):
+        """Test that an image larger than the whole budget is rejected."""
+        from imager_images.decoding import DecodeBudget, DecodeRejected
+        budget = DecodeBudget(299, 1000, 0)
+        with self.assertRaises(DecodeRejected):
+            budget.check(10, 10, 'RGB')
+
+    def test_acquire_over_budget_times_out_as_queued_and_rejected(self):
+        """Test that a decode waiting too long is counted and rejected."""
+        from imager_images.decoding import DecodeBudget, DecodeRejected
+        budget = DecodeBudget(300, 1000, 0.01)
+        budget.acquire(300)
+        with self.assertRaises(DecodeRejected):
+            budget.acquire(1)
+        metrics = budget.metrics()
+        self.assertEqual(metrics['queued'], 1)
+        self.assertEqual(metrics['rejected'], 1)
+        self.assertEqual(metrics['in_use_bytes'], 300)
+
+    def test_release_lets_a_queued_decode_run(self):
+        """Test that releasing memory wakes a waiting decode."""
+        from imager_images.decoding import DecodeBudget
+        import threading
+        budget = DecodeBudget(300, 1000, 5)
+        budget.acquire(300)
+        waiter = threading.Thread(target=budget.acquire, args=(200,))
+        waiter.start()
+        budget.release(300)
+        waiter.join(5)
+        self.assertEqual(budget.metrics()['in_use_bytes'], 200)
+        self.assertEqual(budget.metrics()['decoded'], 2)
+
+    def test_engine_releases_reservation_on_cleanup(self):
+        """Test that the thumbnail engine holds memory only until cleanup."""
+        from imager_images.decoding import DecodeBudget
+        from imager_images.engines import BudgetedEngine
+        from unittest import mock
+        budget = DecodeBudget(10 ** 9, 10 ** 8, 0)
+        path = os.path.join(settings.BASE_DIR, 'static/test_image.jpg')
+        with mock.patch('imager_images.engines.get_budget', return_value=budget):
+            engine = BudgetedEngine()
+            with open(path, 'rb') as source:
+                image = engine.get_image(source)
+            self.assertGreater(budget.metrics()['in_use_bytes'], 0)
+            engine.cleanup(image)
+        self.assertEqual(budget.metrics()['in_use_bytes'], 0)
+
+    def test_engine_releases_reservation_when_reading_the_image_fails(self):
+        """Test that a failure between open and cleanup does not leak memory."""
+        from imager_images.decoding import DecodeBudget
+        from imager_images.engines import BudgetedEngine
+        from sorl.thumbnail.engines.pil_engine import Engine
+        from unittest import mock
+        budget = DecodeBudget(10 ** 9, 10 ** 8, 0)
+        path = os.path.join(settings.BASE_DIR, 'static/test_image.jpg')
+        with mock.patch('imager_images.engines.get_budget', return_value=budget), \
+                mock.patch.object(Engine, 'get_image_info', side_effect=IOError):
+            engine = BudgetedEngine()
+            with open(path, 'rb') as source:
+                image = engine.get_image(source)
+            with self.assertRaises(IOError):
+                engine.get_image_info(image)
+            self.assertEqual(budget.metrics()['in_use_bytes'], 0)
+            engine.cleanup(image)
+        self.assertEqual(budget.metrics()['in_use_bytes'], 0)
+
+    def test_photo_form_rejects_image_over_the_pixel_limit(self):
+        """Test that an upload too large to decode gets a form error."""
+        from imager_images.decoding import DecodeBudget
+        from unittest import mock
+        budget = DecodeBudget(10 ** 9, 100, 0)
+        form_class = modelform_factory(Photo, fields=['title', 'image', 'published'])
+        image = SimpleUploadedFile(
+            name='sample_img.jpg',
+            content=open(
+                os.path.join(settings.BASE_DIR, 'static/test_image.jpg'), 'rb'
+            ).read(),
+            content_type="image/jpeg"
+        )
+        form = form_class(data={'title': 'big', 'published': 'PRIVATE'},
+                          files={'image': image})
+        with mock.patch('imager_images.models.get_budget', return_value=budget):
+            self.assertFalse(form.is_valid())
+        self.assertIn('image', form.errors)
+
+
+"""Tests for reading image headers."""
+
+
+def encoded_image(format, size=(40, 30), mode='RGB'):
+    """Encode a blank image in memory and return the file."""
+    from io import BytesIO
+    from PIL import Image
+    buffer = BytesIO()
+    Image.new(mode, size).save(buffer, format)
+    buffer.seek(0)
+    return buffer
+
+
+class ImageHeaderTests(TestCase):
+    """Tests for parsing the format and size from the container header."""
+
+    def test_read_jpeg_header(self):
+        """Test that the JPEG frame header gives the size."""
+        from imager_images.headers import read_image_header
+        header = read_image_header(encoded_image('JPEG'))
+        self.assertEqual(header, ('JPEG', 40, 30, 'RGB'))
+
+    def test_read_jpeg_header_of_test_image(self):
+        """Test that the JPEG header of the sample image matches Pillow."""
+        from imager_images.headers import read_image_header
+        from PIL import Image
+        path = os.path.join(settings.BASE_DIR, 'static/test_image.jpg')
+        with open(path, 'rb') as image:
+            header = read_image_header(image)
+            image.seek(0)
+            self.assertEqual((header.width, header.height), Image.open(image).size)
+
+    def test_read_png_header(self):
+        """Test that the PNG IHDR chunk gives the size and mode."""
+        from imager_images.headers import read_image_header
+        header = read_image_header(encoded_image('PNG', mode='RGBA'))
+        self.assertEqual(header, ('PNG', 40, 30, 'RGBA'))
+
+    def test_read_gif_header(self):
+        """Test that the GIF screen descriptor gives the size."""
+        from imager_images.headers import read_image_header
+        header = read_image_header(encoded_image('GIF', mode='P'))
+        self.assertEqual(header, ('GIF', 40, 30, 'P'))
+
+    def test_read_lossy_webp_header(self):
+        """Test that the VP8 chunk gives the size."""
+        from imager_images.headers import read_image_header
+        from io import BytesIO
+        data = (b'RIFF4\x00\x00\x00WEBPVP8 (\x00\x00\x00\xf0\x02\x00'
+                b'\x9d\x01*(\x00\x1e\x00>m6\x97H\xa4#"!%')
+        header = read_image_header(BytesIO(data))
+        self.assertEqual(header, ('WEBP', 40, 30, 'RGB'))
+
+    def test_read_lossless_webp_header(self):
+        """Test that the VP8L chunk gives the size."""
+        from imager_images.headers import read_image_header
+        from io import BytesIO
+        data = (b'RIFF\x1a\x00\x00\x00WEBPVP8L\r\x00\x00\x00/\'@\x07\x10'
+                b'\x07\x10\x11\x11\x88\x88\xfe\x07\x00')
+        header = read_image_header(BytesIO(data))
+        self.assertEqual(header, ('WEBP', 40, 30, 'RGBA'))
+
+    def test_read_header_restores_file_position(self):
+        """Test that reading the header leaves the file where it was."""
+        from imager_images.headers import read_image_header
+        image = encoded_image('PNG')
+        image.seek(5)
+        read_image_header(image)
+        self.assertEqual(image.tell(), 5)
+
+    def test_truncated_header_raises_header_error(self):
+        """Test that a file cut off before the frame header is rejected."""
+        from imager_images.headers import HeaderError, read_image_header
+        from io import BytesIO
+        data = encoded_image('JPEG').read()
+        with self.assertRaises(HeaderError):
+            read_image_header(BytesIO(data[:20]))
+
+    def test_unknown_format_raises_header_error(self):
+        """Test that a file that is not an image is rejected."""
+        from imager_images.headers import HeaderError, read_image_header
+        from io import BytesIO
+        with self.assertRaises(HeaderError):
+            read_image_header(BytesIO(b'just some text, not an image'))
+
+    def test_photo_form_rejects_unsupported_upload_with_error(self):
+        """Test that the photo form explains which formats are accepted."""
+        from imager_images.models import PhotoForm
+        upload = SimpleUploadedFile(name='notes.txt', content=b'not an image')
+        form = PhotoForm(data={'title': 'text', 'published': 'PRIVATE'},
+                         files={'image': upload})
+        self.assertFalse(form.is_valid())
+        self.assertIn('Upload a valid image', form.errors['image'][0])
+
+    @override_settings(IMAGE_UPLOAD_MAX_BYTES=10)
+    def test_photo_form_rejects_upload_over_the_size_limit(self):
+        """Test that the photo form rejects files over the upload limit."""
+        from imager_images.models import PhotoForm
+        upload = SimpleUploadedFile(name='big.png',
+                                    content=encoded_image('PNG').read())
+        form = PhotoForm(data={'title': 'big', 'published': 'PRIVATE'},
+                         files={'image': upload})
+        self.assertFalse(form.is_valid())
+        self.assertIn('at most', form.errors['image'][0])
+
+    @override_settings(MEDIA_ROOT=os.path.join(settings.BASE_DIR,
+                                               "test_media_for_headers"))
+    def test_photo_form_saves_dimensions_from_header(self):
+        """Test that the photo form stores the size read from the header."""
+        from imager_images.models import PhotoForm
+        user = UserFactory()
+        user.save()
+        upload = SimpleUploadedFile(name='small.png',
+                                    content=encoded_image('PNG').read())
+        form = PhotoForm(data={'title': 'small', 'published': 'PRIVATE'},
+                         files={'image': upload})
+        self.assertTrue(form.is_valid())
+        form.instance.user = user
+        photo = form.save()
+        os.system('rm -rf {}'.format(
+            os.path.join(settings.BASE_DIR, 'test_media_for_headers')))
+        self.assertEqual((photo.width, photo.height), (40, 30))
+        self.assertEqual(photo.image_format, 'PNG')
+
+
+"""Tests for sharding photo files."""
+
+
+class ShardedMediaTests(TestCase):
+    """Tests for the sharded upload layout and the shard_media command."""
+
+    @classmethod
+    @override_settings(MEDIA_ROOT=os.path.join(settings.BASE_DIR,
+                                               "test_media_for_sharding"))
+    def setUpClass(cls):
+        """Add a user with one photo."""
+        super(ShardedMediaTests, cls).setUpClass()
+        os.system('mkdir {}'.format(
+            os.path.join(settings.BASE_DIR, 'test_media_for_sharding')
+        ))
+        user = UserFactory()
+        user.save()
+        cls.user = user
+
+    @classmethod
+    def tearDownClass(cls):
+        """Remove the test directory."""
+        super(ShardedMediaTests, cls).tearDownClass()
+        os.system('rm -rf {}'.format(
+            os.path.join(settings.BASE_DIR, 'test_media_for_sharding')))
+
+    def flat_photo(self, name):
+        """Store a photo the way uploads were stored before sharding."""
+        from django.core.files.base import ContentFile
+        from django.core.files.storage import default_storage
+        photo = PhotoFactory(user=self.user)
+        photo.save()
+        path = os.path.join(settings.BASE_DIR, 'static/test_image.jpg')
+        with open(path, 'rb') as image:
+            stored = default_storage.save('images/' + name, ContentFile(image.read()))
+        Photo.objects.filter(id=photo.id).update(image=stored)
+        return Photo.objects.get(id=photo.id)
+
+    def test_sharded_upload_to_nests_uuid_name_in_two_levels(self):
+        """Test that new uploads get names like images/ab/cd/abcd....jpg."""
+        from imager_images.storage import ShardedUploadTo
+        name = ShardedUploadTo('images')(None, 'Holiday.JPG')
+        prefix, first, second, filename = name.split('/')
+        self.assertEqual(prefix, 'images')
+        self.assertEqual(filename[:4], first + second)
+        self.assertTrue(filename.endswith('.jpg'))
+
+    def test_content_hash_upload_to_names_file_by_its_sha1(self):
+        """Test that the content strategy uses the SHA-1 of the upload."""
+        from imager_images.storage import ContentHashUploadTo
+        import hashlib
+        photo = Photo(image=SimpleUploadedFile('a.png', b'same bytes'))
+        name = ContentHashUploadTo('images')(photo, 'a.png')
+        digest = hashlib.sha1(b'same bytes').hexdigest()
+        self.assertEqual(name, 'images/{}/{}/{}.png'.format(
+            digest[:2], digest[2:4], digest))
+
+    def test_is_sharded_only_matches_the_sharded_layout(self):
+        """Test that flat names are told apart from sharded ones."""
+        from imager_images.storage import ShardedUploadTo
+        upload_to = ShardedUploadTo('images')
+        self.assertTrue(upload_to.is_sharded('images/ab/cd/abcdef.jpg'))
+        self.assertTrue(upload_to.is_sharded('images/ab/cd/abcdef'))
+        self.assertFalse(upload_to.is_sharded('images/sample_img.jpg'))
+        self.assertFalse(upload_to.is_sharded('images/ab/cd/abcdef/other.jpg'))
+
+    @override_settings(MEDIA_ROOT=os.path.join(settings.BASE_DIR,
+                                               "test_media_for_sharding"))
+    def test_uploaded_photo_is_stored_sharded(self):
+        """Test that a new photo is stored under hashed directories."""
+        photo = PhotoFactory(user=self.user)
+        photo.save()
+        upload_to = Photo._meta.get_field('image').upload_to
+        self.assertTrue(upload_to.is_sharded(photo.image.name))
+
+    @override_settings(MEDIA_ROOT=os.path.join(settings.BASE_DIR,
+                                               "test_media_for_sharding"))
+    def test_shard_media_moves_flat_files_and_rewrites_rows(self):
+        """Test that the command moves the file and repoints the photo."""
+        from django.core.files.storage import default_storage
+        from django.core.management import call_command
+        from io import StringIO
+        photo = self.flat_photo('flat_one.jpg')
+        call_command('shard_media', stdout=StringIO())
+        photo.refresh_from_db()
+        upload_to = Photo._meta.get_field('image').upload_to
+        self.assertTrue(upload_to.is_sharded(photo.image.name))
+        self.assertTrue(default_storage.exists(photo.image.name))
+        self.assertFalse(default_storage.exists('images/flat_one.jpg'))
+
+    @override_settings(MEDIA_ROOT=os.path.join(settings.BASE_DIR,
+                                               "test_media_for_sharding"))
+    def test_shard_media_dry_run_changes_nothing(self):
+        """Test that a dry run only reports what would move."""
+        from django.core.management import call_command
+        from io import StringIO
+        photo = self.flat_photo('flat_two.jpg')
+        out = StringIO()
+        call_command('shard_media', dry_run=True, stdout=out)
+        photo.refresh_from_db()
+        self.assertEqual(photo.image.name, 'images/flat_two.jpg')
+        self.assertIn('Would move 1 photos', out.getvalue())
+
+    @override_settings(MEDIA_ROOT=os.path.join(settings.BASE_DIR,
+                                               "test_media_for_sharding"))
+    def test_shard_media_moves_a_file_without_extension_once(self):
+        """Test that a sharded name with no extension is not moved again."""
+        from django.core.management import call_command
+        from io import StringIO
+        photo = self.flat_photo('no_extension')
+        call_command('shard_media', stdout=StringIO())
+        photo.refresh_from_db()
+        self.assertEqual(os.path.splitext(photo.image.name)[1], '')
+        out = StringIO()
+        call_command('shard_media', dry_run=True, stdout=out)
+        self.assertIn('Would move 0 photos', out.getvalue())
+
+
+"""Tests for resized photo derivatives."""
+
+
+class PhotoDerivativeTests(TestCase):
+    """Tests for the signed resizing endpoint and its disk cache."""
+
+    @classmethod
+    @override_settings(MEDIA_ROOT=os.path.join(settings.BASE_DIR,
+                                               "test_media_for_derivatives"))
+    def setUpClass(cls):
+        """Add a public and a private photo."""
+        super(PhotoDerivativeTests, cls).setUpClass()
+        os.system('mkdir {}'.format(
+            os.path.join(settings.BASE_DIR, 'test_media_for_derivatives')
+        ))
+        user = UserFactory(username='bob')
+        user.set_password('password')
+        user.save()
+        cls.public = PhotoFactory(user=user, published='PUBLIC')
+        cls.public.save()
+        cls.private = PhotoFactory(user=user, published='PRIVATE')
+        cls.private.save()
+
+    @classmethod
+    def tearDownClass(cls):
+        """Remove the test directories."""
+        super(PhotoDerivativeTests, cls).tearDownClass()
+        os.system('rm -rf {}'.format(
+            os.path.join(settings.BASE_DIR, 'test_media_for_derivatives')))
+        os.system('rm -rf {}'.format(
+            os.path.join(settings.BASE_DIR, 'test_derivative_cache')))
+
+    def test_signature_only_verifies_for_the_signed_photo(self):
+        """Test that a signature can not be reused for another photo."""
+        from imager_images.derivatives import sign, verify
+        signature = sign(1, '100x100-cover-q85.jpg')
+        self.assertTrue(verify(1, '100x100-cover-q85.jpg', signature))
+        self.assertFalse(verify(2, '100x100-cover-q85.jpg', signature))
+        self.assertFalse(verify(1, '900x900-cover-q85.jpg', signature))
+
+    @override_settings(DERIVATIVE_MAX_DIMENSION=500)
+    def test_parse_params_rejects_sizes_over_the_limit(self):
+        """Test that signed parameters are still range checked."""
+        from imager_images.derivatives import InvalidParams, parse_params
+        with self.assertRaises(InvalidParams):
+            parse_params('501x100-cover-q85.jpg')
+
+    def test_parse_params_reads_all_parameters(self):
+        """Test that the canonical parameter string round trips."""
+        from imager_images.derivatives import format_params, parse_params
+        params = parse_params(format_params(120, 80, 'contain', 70, 'png'))
+        self.assertEqual(params, (120, 80, 'contain', 70, 'png'))
+
+    def test_derivative_route_bad_signature_gets_404(self):
+        """Test that unsigned parameters are refused."""
+        response = self.client.get(reverse_lazy('photo_derivative', kwargs={
+            'id': self.public.id, 'signature': 'abc123',
+            'params': '100x100-cover-q85.jpg'}))
+        self.assertEqual(response.status_code, 404)
+
+    @override_settings(MEDIA_ROOT=os.path.join(settings.BASE_DIR,
+                                               "test_media_for_derivatives"),
+                       DERIVATIVE_CACHE_ROOT=os.path.join(settings.BASE_DIR,
+                                                          "test_derivative_cache"))
+    def test_derivative_route_renders_requested_size(self):
+        """Test that the derivative has the requested geometry."""
+        from imager_images.derivatives import derivative_url
+        from io import BytesIO
+        from PIL import Image
+        response = self.client.get(derivative_url(self.public, 60, 40))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        image = Image.open(BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(image.size, (60, 40))
+
+    @override_settings(MEDIA_ROOT=os.path.join(settings.BASE_DIR,
+                                               "test_media_for_derivatives"),
+                       DERIVATIVE_CACHE_ROOT=os.path.join(settings.BASE_DIR,
+                                                          "test_derivative_cache"))
+    def test_derivative_route_serves_second_request_from_cache(self):
+        """Test that a cached derivative is not rendered again."""
+        from imager_images.derivatives import derivative_url
+        from unittest import mock
+        url = derivative_url(self.public, 30, 30, 'contain')
+        self.client.get(url)
+        with mock.patch('imager_images.derivatives.render') as render:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        render.assert_not_called()
+
+    @override_settings(MEDIA_ROOT=os.path.join(settings.BASE_DIR,
+                                               "test_media_for_derivatives"),
+                       DERIVATIVE_CACHE_ROOT=os.path.join(settings.BASE_DIR,
+                                                          "test_derivative_cache"),
+                       DERIVATIVE_ACCEL_REDIRECT_URL='/protected-derivatives/')
+    def test_derivative_route_hands_file_to_web_server(self):
+        """Test that the file is sent by the web server when configured."""
+        from imager_images.derivatives import derivative_url
+        response = self.client.get(derivative_url(self.public, 20, 20))
+        self.assertTrue(response['X-Accel-Redirect'].startswith(
+            '/protected-derivatives/{}/'.format(self.public.id)))
+
+    @override_settings(MEDIA_ROOT=os.path.join(settings.BASE_DIR,
+                                               "test_media_for_derivatives"),
+                       DERIVATIVE_CACHE_ROOT=os.path.join(settings.BASE_DIR,
+                                                          "test_derivative_cache"))
+    def test_derivative_route_only_lets_shared_caches_keep_public_photos(self):
+        """Test that a private photo's derivative is cached by the browser alone."""
+        from imager_images.derivatives import derivative_url
+        self.client.login(username='bob', password='password')
+        public = self.client.get(derivative_url(self.public, 20, 20))
+        private = self.client.get(derivative_url(self.private, 20, 20))
+        self.assertEqual(public['Cache-Control'], 'public, max-age=86400')
+        self.assertEqual(private['Cache-Control'], 'private, max-age=86400')
+
+    def test_derivative_route_busy_budget_gets_503(self):
+        """Test that a decode that timed out waiting for memory asks to retry."""
+        from imager_images.decoding import DecodeTimedOut
+        from imager_images.derivatives import derivative_url
+        from unittest import mock
+        with mock.patch('imager_images.derivatives.render', side_effect=DecodeTimedOut):
+            response = self.client.get(derivative_url(self.public, 20, 20))
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], str(settings.IMAGE_DECODE_TIMEOUT))
+
+    def test_derivative_route_original_too_large_gets_404(self):
+        """Test that an original over the decode limits is not found."""
+        from imager_images.decoding import DecodeRejected
+        from imager_images.derivatives import derivative_url
+        from unittest import mock
+        with mock.patch('imager_images.derivatives.render', side_effect=DecodeRejected):
+            response = self.client.get(derivative_url(self.public, 20, 20))
+        self.assertEqual(response.status_code, 404)
+
+    @override_settings(MEDIA_ROOT=os.path.join(settings.BASE_DIR,
+                                               "test_media_for_missing_derivatives"),
+                       DERIVATIVE_CACHE_ROOT=os.path.join(settings.BASE_DIR,
+                                                          "test_missing_derivative_cache"))
+    def test_derivative_route_missing_original_gets_404(self):
+        """Test that a photo whose original is gone is not found."""
+        from imager_images.derivatives import derivative_url
+        self.addCleanup(os.system, 'rm -rf {}'.format(
+            os.path.join(settings.BASE_DIR, 'test_missing_derivative_cache')))
+        response = self.client.get(derivative_url(self.public, 20, 20))
+        self.assertEqual(response.status_code, 404)
+
+    def test_derivative_route_private_photo_of_other_user_gets_404(self):
+        """Test that private photos are not resized for other users."""
+        from imager_images.derivatives import derivative_url
+        response = self.client.get(derivative_url(self.private, 20, 20))
+        self.assertEqual(response.status_code, 404)
+
+    def test_cache_evicts_least_recently_used_files(self):
+        """Test that the oldest derivatives go first when over the bound."""
+        from imager_images.derivatives import DerivativeCache, parse_params
+        from PIL import Image
+        root = os.path.join(settings.BASE_DIR, 'test_derivative_cache', 'lru')
+        params = parse_params('10x10-cover-q85.png')
+        image = Image.new('RGB', (10, 10))
+        cache = DerivativeCache(root, 10 ** 6)
+        first = cache.put(os.path.join(root, '1', 'a.png'), image, params)
+        os.utime(first, (1, 1))
+        second = cache.put(os.path.join(root, '1', 'b.png'), image, params)
+        cache.max_bytes = int(os.path.getsize(second) * 1.5)
+        cache.evict()
+        self.assertFalse(os.path.exists(first))
+        self.assertTrue(os.path.exists(second))
+
+
+"""Tests for album contact sheets."""
+
+
+class SpriteTests(TestCase):
+    """Tests for packing a page of thumbnails into one image."""
+
+    @classmethod
+    @override_settings(MEDIA_ROOT=os.path.join(settings.BASE_DIR,
+                                               "test_media_for_sprites"))
+    def setUpClass(cls):
+        """Add an album of six photos."""
+        super(SpriteTests, cls).setUpClass()
+        os.system('mkdir {}'.format(
+            os.path.join(settings.BASE_DIR, 'test_media_for_sprites')
+        ))
+        user = UserFactory(username='bob')
+        user.set_password('password')
+        user.save()
+        cls.bob = user
+        album = AlbumFactory(user=user)
+        album.save()
+        cls.album = album
+        for _ in range(6):
+            photo = PhotoFactory(user=user)
+            photo.save()
+            album.photos.add(photo)
+
+    @classmethod
+    def tearDownClass(cls):
+        """Remove the test directory."""
+        super(SpriteTests, cls).tearDownClass()
+        os.system('rm -rf {}'.format(
+            os.path.join(settings.BASE_DIR, 'test_media_for_sprites')))
+
+    def setUp(self):
+        """Start every test with an empty cache."""
+        from django.core.cache import cache
+        cache.clear()
+
+    def test_layout_fills_rows_left_to_right(self):
+        """Test that tiles are placed in rows of the column count."""
+        from imager_images.sprites import layout
+        photos = list(self.album.photos.order_by('id'))
+        positions, width, height = layout(photos, 100, 4)
+        self.assertEqual(positions[1][1:], (100, 0))
+        self.assertEqual(positions[5][1:], (100, 100))
+        self.assertEqual((width, height), (400, 200))
+
+    def test_sprite_name_changes_with_the_photos(self):
+        """Test that a different set of photos gets a different sheet."""
+        from imager_images.sprites import sprite_name
+        photos = list(self.album.photos.order_by('id'))
+        self.assertNotEqual(sprite_name(photos[:4], 250), sprite_name(photos[1:5], 250))
+
+    @override_settings(MEDIA_ROOT=os.path.join(settings.BASE_DIR,
+                                               "test_media_for_sprites"))
+    def test_get_sprite_writes_sheet_and_manifest(self):
+        """Test that the sheet and manifest are stored with the tile positions."""
+        from django.core.files.storage import default_storage
+        from imager_images.sprites import get_sprite, sprite_name
+        import json
+        photos = list(self.album.photos.order_by('id')[:4])
+        sprite = get_sprite(photos)
+        name = sprite_name(photos, 250)
+        self.assertTrue(default_storage.exists(name))
+        with default_storage.open(name[:-4] + '.json') as manifest:
+            tiles = json.loads(manifest.read().decode('utf8'))['tiles']
+        self.assertEqual([tile['id'] for tile in tiles], [p.id for p in photos])
+        self.assertEqual((sprite.width, sprite.height), (1000, 250))
+
+    @override_settings(MEDIA_ROOT=os.path.join(settings.BASE_DIR,
+                                               "test_media_for_sprites"))
+    def test_get_sprite_reuses_cached_manifest(self):
+        """Test that a built sheet is not composed again."""
+        from imager_images.sprites import get_sprite
+        from unittest import mock
+        photos = list(self.album.photos.order_by('id')[:2])
+        get_sprite(photos)
+        with mock.patch('imager_images.sprites.build') as build:
+            get_sprite(photos)
+        build.assert_not_called()
+
+    @override_settings(MEDIA_ROOT=os.path.join(settings.BASE_DIR,
+                                               "test_media_for_sprites"))
+    def test_changing_album_photos_builds_a_new_sheet(self):
+        """Test that a changed page gets a new sheet and the old one is left in place."""
+        from django.core.files.storage import default_storage
+        from imager_images.sprites import get_sprite, sprite_name
+        photos = list(self.album.photos.order_by('id')[:4])
+        old = get_sprite(photos)
+        photo = PhotoFactory(user=self.bob)
+        photo.save()
+        self.album.photos.add(photo)
+        photo.title = 'renamed'
+        photo.save()
+        self.assertTrue(default_storage.exists(sprite_name(photos, 250)))
+        self.assertEqual(get_sprite(photos).url, old.url)
+        self.assertNotEqual(get_sprite(photos[1:] + [photo]).url, old.url)
+
+    @override_settings(MEDIA_ROOT=os.path.join(settings.BASE_DIR,
+                                               "test_media_for_sprites"))
+    def test_album_detail_sprite_mode_renders_one_image_for_the_grid(self):
+        """Test that the sprite mode draws every tile from the same sheet."""
+        self.album.published = 'PUBLIC'
+        self.album.save()
+        response = self.client.get(
+            reverse_lazy('album_detail', kwargs={'id': self.album.id}),
+            {'view': 'sprite'})
+        sprite = response.context['sprite']
+        self.assertEqual(len(sprite.tiles), 4)
+        self.assertEqual(response.content.count(sprite.url.encode('utf8')), 4)
+        self.assertIn(b'&view=sprite', response.content)
+
+
+"""Tests for full-text search."""
+
+
+class SearchTests(TestCase):
+    """Tests for searching photo and album text."""
+
+    @classmethod
+    @override_settings(MEDIA_ROOT=os.path.join(settings.BASE_DIR,
+                                               "test_media_for_search"))
+    def setUpClass(cls):
+        """Add photos and albums with searchable text."""
+        super(SearchTests, cls).setUpClass()
+        os.system('mkdir {}'.format(
+            os.path.join(settings.BASE_DIR, 'test_media_for_search')
+        ))
+        user = UserFactory(username='bob')
+        user.set_password('password')
+        user.save()
+        cls.bob = user
+        cls.title_match = PhotoFactory(user=user, title='Harbour at night',
+                                       description='Boats.')
+        cls.title_match.save()
+        cls.description_match = PhotoFactory(user=user, title='Boats',
+                                             description='Seen from the harbour.')
+        cls.description_match.save()
+        cls.private = PhotoFactory(user=user, title='Harbour wall',
+                                   published='PRIVATE')
+        cls.private.save()
+        for index in range(5):
+            PhotoFactory(user=user, title='Harbours {}'.format(index)).save()
+        cls.album = AlbumFactory(user=user, title='Harbour trip',
+                                 published='PUBLIC')
+        cls.album.save()
+
+    @classmethod
+    def tearDownClass(cls):
+        """Remove the test directory."""
+        super(SearchTests, cls).tearDownClass()
+        os.system('rm -rf {}'.format(
+            os.path.join(settings.BASE_DIR, 'test_media_for_search')))
+
+    def test_search_vector_is_filled_on_save(self):
+        """Test that the database trigger fills the search vector."""
+        photo = Photo.objects.get(id=self.title_match.id)
+        self.assertIn('harbour', photo.search_vector)
+
+    def test_search_ranks_title_matches_first(self):
+        """Test that a match in the title outranks one in the description."""
+        from imager_images.search import search
+        results, _ = search('harbour', AnonymousUser())
+        ids = [photo.id for photo in results]
+        self.assertLess(ids.index(self.title_match.id),
+                        ids.index(self.description_match.id))
+
+    def test_search_hides_private_photos_from_others(self):
+        """Test that private photos only match for their owner."""
+        from imager_images.search import search
+        results, _ = search('wall', AnonymousUser())
+        self.assertEqual(results, [])
+        results, _ = search('wall', self.bob)
+        self.assertEqual([photo.id for photo in results], [self.private.id])
+
+    def test_search_pages_continue_after_the_cursor(self):
+        """Test that following cursors visits every match exactly once."""
+        from imager_images.search import search
+        seen = []
+        cursor = None
+        while True:
+            results, cursor = search('harbour', AnonymousUser(), cursor=cursor, limit=3)
+            seen.extend(photo.id for photo in results)
+            if cursor is None:
+                break
+        self.assertEqual(len(seen), 7)
+        self.assertEqual(len(set(seen)), 7)
+
+    def test_search_finds_albums(self):
+        """Test that albums are searched separately from photos."""
+        from imager_images.search import search
+        results, _ = search('trip', AnonymousUser(), 'albums')
+        self.assertEqual([album.id for album in results], [self.album.id])
+
+    def test_search_view_lists_matches(self):
+        """Test that the search page shows the matching photo titles."""
+        response = self.client.get(reverse_lazy('search'), {'q': 'harbour'})
+        self.assertContains(response, 'Harbour at night')
+        self.assertNotContains(response, 'Harbour wall')
+
+
+"""Tests for photo tags."""
+
+
+class TagTests(TestCase):
+    """Tests for tagging photos and the kept tag counts."""
+
+    @classmethod
+    @override_settings(MEDIA_ROOT=os.path.join(settings.BASE_DIR,
+                                               "test_media_for_tags"))
+    def setUpClass(cls):
+        """Add photos tagged sunset and beach."""
+        super(TagTests, cls).setUpClass()
+        from imager_images.models import Tag
+        os.system('mkdir {}'.format(
+            os.path.join(settings.BASE_DIR, 'test_media_for_tags')
+        ))
+        user = UserFactory(username='bob')
+        user.set_password('password')
+        user.save()
+        cls.bob = user
+        cls.sunset = Tag.objects.create(name='sunset')
+        cls.beach = Tag.objects.create(name='beach')
+        cls.both = PhotoFactory(user=user, title='Beach sunset')
+        cls.both.save()
+        cls.both.tags.add(cls.sunset, cls.beach)
+        cls.only_sunset = PhotoFactory(user=user, title='Mountain sunset')
+        cls.only_sunset.save()
+        cls.only_sunset.tags.add(cls.sunset)
+        cls.private = PhotoFactory(user=user, title='Private sunset',
+                                   published='PRIVATE')
+        cls.private.save()
+        cls.private.tags.add(cls.sunset)
+
+    @classmethod
+    def tearDownClass(cls):
+        """Remove the test directory."""
+        super(TagTests, cls).tearDownClass()
+        os.system('rm -rf {}'.format(
+            os.path.join(settings.BASE_DIR, 'test_media_for_tags')))
+
+    def counts(self, tag):
+        """The public and the owner's count for a tag."""
+        from imager_images.models import TagCount, UserTagCount
+        public = TagCount.objects.filter(tag=tag).values_list('count', flat=True).first()
+        mine = UserTagCount.objects.filter(user=self.bob, tag=tag).values_list(
+            'count', flat=True).first()
+        return public, mine
+
+    def test_adding_tags_counts_public_and_owner_photos(self):
+        """Test that public counts skip private photos and owner counts do not."""
+        self.assertEqual(self.counts(self.sunset), (2, 3))
+        self.assertEqual(self.counts(self.beach), (1, 1))
+
+    def test_removing_a_tag_decrements_counts(self):
+        """Test that removing a tag from a photo lowers its counts."""
+        self.only_sunset.tags.remove(self.sunset, self.beach)
+        self.assertEqual(self.counts(self.sunset), (1, 2))
+        self.assertEqual(self.counts(self.beach), (1, 1))
+
+    def test_clearing_tags_from_the_tag_side_decrements_counts(self):
+        """Test that clearing a tag's photos lowers every count."""
+        self.beach.photos.clear()
+        self.assertEqual(self.counts(self.beach), (0, 0))
+
+    def test_publishing_a_photo_moves_it_into_the_public_count(self):
+        """Test that changing a photo to public raises the public count only."""
+        photo = Photo.objects.get(id=self.private.id)
+        photo.published = 'PUBLIC'
+        photo.save()
+        self.assertEqual(self.counts(self.sunset), (3, 3))
+
+    @override_settings(MEDIA_ROOT=os.path.join(settings.BASE_DIR,
+                                               "test_media_for_tags"))
+    def test_deleting_a_photo_decrements_counts(self):
+        """Test that deleting a tagged photo lowers its tags' counts."""
+        Photo.objects.get(id=self.both.id).delete()
+        self.assertEqual(self.counts(self.sunset), (1, 2))
+        self.assertEqual(self.counts(self.beach), (0, 0))
+
+    def test_rebuild_counts_matches_incremental_counts(self):
+        """Test that recomputing the counts gives the same numbers."""
+        from imager_images.tags import rebuild_counts
+        before = self.counts(self.sunset), self.counts(self.beach)
+        rebuild_counts()
+        self.assertEqual((self.counts(self.sunset), self.counts(self.beach)), before)
+
+    def test_filter_by_tags_intersects_tags(self):
+        """Test that filtering by two tags keeps photos with both."""
+        from imager_images.tags import filter_by_tags
+        photos = filter_by_tags(Photo.objects.all(), ['sunset', 'beach'])
+        self.assertEqual([photo.id for photo in photos], [self.both.id])
+
+    def test_filter_by_unknown_tag_is_empty(self):
+        """Test that filtering by a tag nobody used finds nothing."""
+        from imager_images.tags import filter_by_tags
+        self.assertFalse(filter_by_tags(Photo.objects.all(), ['sunset', 'snow']).exists())
+
+    def test_photo_gallery_filters_by_tag(self):
+        """Test that the gallery only shows public photos with the tag."""
+        response = self.client.get(reverse_lazy('photo_gallery'), {'tag': 'sunset'})
+        self.assertEqual({photo.id for photo in response.context['photos']},
+                         {self.both.id, self.only_sunset.id})
+
+    def test_library_filters_by_tag(self):
+        """Test that the library shows the owner's photos with the tag."""
+        self.client.login(username='bob', password='password')
+        response = self.client.get(reverse_lazy('library'),
+                                   {'tag': ['sunset', 'beach']})
+        self.assertEqual([photo.id for photo in response.context['photos']],
+                         [self.both.id])
+        self.assertEqual(response.context['tag_query'], '&tag=sunset&tag=beach')
+
+    def test_photo_form_sets_tags_from_text(self):
+        """Test that the photo form creates and sets the tags it is given."""
+        from imager_images.models import PhotoForm
+        photo = Photo.objects.get(id=self.only_sunset.id)
+        form = PhotoForm({'title': photo.title, 'published': 'PUBLIC',
+                          'tags': 'Sunset, Snowy Peaks, sunset'},
+                         instance=photo)
+        self.assertTrue(form.is_valid(), form.errors)
+        form.save()
+        self.assertEqual(sorted(photo.tags.values_list('name', flat=True)),
+                         ['snowy-peaks', 'sunset'])
+        self.assertEqual(self.counts(self.sunset), (2, 3))
+
+    def test_photo_form_rejects_bad_tags(self):
+        """Test that tags with punctuation are rejected."""
+        from imager_images.models import PhotoForm
+        photo = Photo.objects.get(id=self.only_sunset.id)
+        form = PhotoForm({'title': photo.title, 'published': 'PUBLIC',
+                          'tags': 'sun!set'}, instance=photo)
+        self.assertFalse(form.is_valid())
+        self.assertIn('tags', form.errors)
+
+
+"""Tests for the order of photos in an album."""
+
+
+class AlbumOrderTests(TestCase):
+    """Tests for ranking and moving photos within an album."""
+
+    @classmethod
+    @override_settings(MEDIA_ROOT=os.path.join(settings.BASE_DIR,
+                                               "test_media_for_album_order"))
+    def setUpClass(cls):
+        """Add an album of four photos and a second album sharing one."""
+        super(AlbumOrderTests, cls).setUpClass()
+        os.system('mkdir {}'.format(
+            os.path.join(settings.BASE_DIR, 'test_media_for_album_order')
+        ))
+        user = UserFactory(username='bob')
+        user.set_password('password')
+        user.save()
+        cls.bob = user
+        cls.album = AlbumFactory(user=user, published='PUBLIC')
+        cls.album.save()
+        cls.photos = []
+        for _ in range(4):
+            photo = PhotoFactory(user=user)
+            photo.save()
+            cls.album.photos.add(photo)
+            cls.photos.append(photo.id)
+        other = AlbumFactory(user=user)
+        other.save()
+        other.photos.add(cls.photos[0])
+
+    @classmethod
+    def tearDownClass(cls):
+        """Remove the test directory."""
+        super(AlbumOrderTests, cls).tearDownClass()
+        os.system('rm -rf {}'.format(
+            os.path.join(settings.BASE_DIR, 'test_media_for_album_order')))
+
+    def order(self):
+        """The ids of the album's photos in rank order."""
+        from imager_images.ordering import ordered_photos
+        return list(ordered_photos(self.album).values_list('id', flat=True))
+
+    def test_added_photos_sort_in_the_order_added(self):
+        """Test that new members go to the end of the album."""
+        self.assertEqual(self.order(), self.photos)
+
+    def test_move_after_a_photo(self):
+        """Test that a photo can be moved after another."""
+        from imager_images.ordering import move_photo
+        first, second, third, fourth = self.photos
+        move_photo(self.album, fourth, after=first)
+        self.assertEqual(self.order(), [first, fourth, second, third])
+
+    def test_move_before_the_first_photo(self):
+        """Test that a photo can be moved to the start."""
+        from imager_images.ordering import move_photo
+        first, second, third, fourth = self.photos
+        move_photo(self.album, third, before=first)
+        self.assertEqual(self.order(), [third, first, second, fourth])
+
+    def test_move_to_the_end(self):
+        """Test that a photo moves last when no neighbour is given."""
+        from imager_images.ordering import move_photo
+        first, second, third, fourth = self.photos
+        move_photo(self.album, first)
+        self.assertEqual(self.order(), [second, third, fourth, first])
+
+    def test_move_updates_only_the_moved_row(self):
+        """Test that a move leaves every other rank alone."""
+        from imager_images.models import AlbumPhoto
+        from imager_images.ordering import move_photo
+        before = dict(AlbumPhoto.objects.filter(album=self.album)
+                      .values_list('photo_id', 'rank'))
+        move_photo(self.album, self.photos[3], after=self.photos[0])
+        after = dict(AlbumPhoto.objects.filter(album=self.album)
+                     .values_list('photo_id', 'rank'))
+        changed = [pk for pk in before if before[pk] != after[pk]]
+        self.assertEqual(changed, [self.photos[3]])
+
+    def test_repeated_moves_into_one_gap_flag_and_renumber(self):
+        """Test that a worn gap flags the album and renumbering restores order."""
+        from django.core.management import call_command
+        from imager_images.ordering import move_photo
+        from io import StringIO
+        first, second, third, fourth = self.photos
+        for _ in range(20):
+            move_photo(self.album, fourth, after=first)
+            move_photo(self.album, third, after=first)
+        self.assertEqual(self.order(), [first, third, fourth, second])
+        self.assertTrue(Album.objects.get(id=self.album.id).needs_renumbering)
+        call_command('renumber_albums', stdout=StringIO())
+        self.assertEqual(self.order(), [first, third, fourth, second])
+        self.assertFalse(Album.objects.get(id=self.album.id).needs_renumbering)
+
+    def test_album_detail_lists_photos_in_rank_order(self):
+        """Test that the album page follows the album's order."""
+        from imager_images.ordering import move_photo
+        move_photo(self.album, self.photos[0])
+        response = self.client.get(
+            reverse_lazy('album_detail', kwargs={'id': self.album.id}))
+        self.assertEqual([photo.id for photo in response.context['photos_page']],
+                         self.photos[1:] + self.photos[:1])
+
+    def test_move_route_moves_photo(self):
+        """Test that the owner can move a photo through the API."""
+        self.client.login(username='bob', password='password')
+        first, second, third, fourth = self.photos
+        response = self.client.post(
+            reverse_lazy('api_album_photo_move',
+                         kwargs={'id': self.album.id, 'photo_id': fourth}),
+            {'before': second})
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(
+            reverse_lazy('api_album_photos', kwargs={'id': self.album.id}))
+        self.assertEqual([photo['id'] for photo in response.json()],
+                         [first, fourth, second, third])
+
+    def test_move_route_not_owner_gets_404(self):
+        """Test that only the album's owner can reorder it."""
+        user = UserFactory(username='eve')
+        user.set_password('password')
+        user.save()
+        self.client.login(username='eve', password='password')
+        response = self.client.post(
+            reverse_lazy('api_album_photo_move',
+                         kwargs={'id': self.album.id, 'photo_id': self.photos[0]}))
+        self.assertEqual(response.status_code, 404)
+
+
+"""Tests for the aggregates stored on albums."""
+
+
+class AlbumAggregateTests(TestCase):
+    """Tests for keeping album counts and covers without aggregate queries."""
+
+    @classmethod
+    @override_settings(MEDIA_ROOT=os.path.join(settings.BASE_DIR,
+                                               "test_media_for_album_aggregates"))
+    def setUpClass(cls):
+        """Add an album of three photos with a cover."""
+        super(AlbumAggregateTests, cls).setUpClass()
+        os.system('mkdir {}'.format(
+            os.path.join(settings.BASE_DIR, 'test_media_for_album_aggregates')
+        ))
+        user = UserFactory(username='bob')
+        user.set_password('password')
+        user.save()
+        cls.bob = user
+        cls.photos = []
+        for _ in range(3):
+            photo = PhotoFactory(user=user)
+            photo.save()
+            cls.photos.append(photo)
+        cls.album = AlbumFactory(user=user, published='PUBLIC', cover=cls.photos[0])
+        cls.album.save()
+        cls.album.photos.add(*cls.photos)
+
+    @classmethod
+    def tearDownClass(cls):
+        """Remove the test directory."""
+        super(AlbumAggregateTests, cls).tearDownClass()
+        os.system('rm -rf {}'.format(
+            os.path.join(settings.BASE_DIR, 'test_media_for_album_aggregates')))
+
+    def fresh(self):
+        """The album as stored."""
+        return Album.objects.get(id=self.album.id)
+
+    def test_adding_photos_sets_count_and_time(self):
+        """Test that adding photos stores the count and when they were added."""
+        album = self.fresh()
+        self.assertEqual(album.photo_count, 3)
+        self.assertIsNotNone(album.last_photo_added)
+
+    def test_removing_photos_from_either_side_lowers_count(self):
+        """Test that removals through the album or the photo are counted."""
+        self.album.photos.remove(self.photos[1])
+        self.photos[2].albums.clear()
+        self.assertEqual(self.fresh().photo_count, 1)
+
+    def test_cover_urls_are_stored(self):
+        """Test that setting a cover stores its image and thumbnail URLs."""
+        album = self.fresh()
+        self.assertEqual(album.cover_image_url, self.photos[0].image.url)
+        self.assertTrue(album.cover_thumbnail_url)
+
+    @override_settings(MEDIA_ROOT=os.path.join(settings.BASE_DIR,
+                                               "test_media_for_album_aggregates"))
+    def test_changing_cover_updates_urls(self):
+        """Test that a new cover replaces the stored URLs."""
+        album = self.fresh()
+        album.cover = self.photos[1]
+        album.save()
+        self.assertEqual(self.fresh().cover_image_url, self.photos[1].image.url)
+
+    @override_settings(MEDIA_ROOT=os.path.join(settings.BASE_DIR,
+                                               "test_media_for_album_aggregates"))
+    def test_deleting_the_cover_photo_keeps_the_album(self):
+        """Test that deleting a cover photo clears the cover and recounts."""
+        Photo.objects.get(id=self.photos[0].id).delete()
+        album = self.fresh()
+        self.assertIsNone(album.cover_id)
+        self.assertEqual(album.cover_image_url, '')
+        self.assertEqual(album.photo_count, 2)
+
+    def test_saving_a_stale_album_keeps_count(self):
+        """Test that saving an album loaded before photos were added keeps the count."""
+        stale = AlbumFactory(user=self.bob)
+        stale.save()
+        Album.objects.get(id=stale.id).photos.add(self.photos[0])
+        stale.title = 'Renamed'
+        stale.save()
+        self.assertEqual(Album.objects.get(id=stale.id).photo_count, 1)
+
+    def test_saving_an_album_with_a_chosen_id_inserts_it(self):
+        """Test that a new album given its primary key is still inserted."""
+        album = Album(id=self.album.id + 1000, user=self.bob, title='Chosen')
+        album.save()
+        self.assertEqual(Album.objects.get(id=album.id).title, 'Chosen')
+
+    def test_saving_a_partly_loaded_album_writes_only_what_was_loaded(self):
+        """Test that a save writes the loaded fields alone, in one UPDATE."""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        album = Album.objects.only('id', 'title').get(id=self.album.id)
+        album.title = 'Renamed'
+        with CaptureQueriesContext(connection) as queries:
+            album.save()
+        saves = [query['sql'] for query in queries
+                 if query['sql'].startswith('UPDATE "imager_images_album" SET "title"')]
+        self.assertEqual(saves, ['UPDATE "imager_images_album" SET "title" = \'Renamed\' '
+                                 'WHERE "imager_images_album"."id" = {}'.format(album.id)])
+        self.assertEqual(self.fresh().title, 'Renamed')
+        self.assertEqual(self.fresh().photo_count, 3)
+
+    def test_refresh_command_repairs_counts(self):
+        """Test that the refresh command recomputes a wrong count."""
+        from django.core.management import call_command
+        from io import StringIO
+        Album.objects.filter(id=self.album.id).update(photo_count=99)
+        call_command('refresh_album_aggregates', stdout=StringIO())
+        self.assertEqual(self.fresh().photo_count, 3)
+
+    def test_album_detail_does_not_count_photos(self):
+        """Test that the album page runs no COUNT query."""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                reverse_lazy('album_detail', kwargs={'id': self.album.id}))
+        self.assertContains(response, 'Photos: 3')
+        self.assertFalse([query for query in queries.captured_queries
+                          if 'COUNT(' in query['sql'].upper()])
+
+
+"""Tests for the album photo picker."""
+
+
+class PhotoPickerTests(TestCase):
+    """Tests for choosing album photos without listing the whole library."""
+
+    @classmethod
+    @override_settings(MEDIA_ROOT=os.path.join(settings.BASE_DIR,
+                                               "test_media_for_photo_picker"))
+    def setUpClass(cls):
+        """Add a user with thirty photos and another user with one."""
+        super(PhotoPickerTests, cls).setUpClass()
+        os.system('mkdir {}'.format(
+            os.path.join(settings.BASE_DIR, 'test_media_for_photo_picker')
+        ))
+        user = UserFactory(username='bob')
+        user.set_password('password')
+        user.save()
+        cls.bob = user
+        cls.photos = []
+        for index in range(30):
+            photo = PhotoFactory(user=user, title='Photo {}'.format(index))
+            photo.save()
+            cls.photos.append(photo.id)
+        other = UserFactory(username='eve')
+        other.save()
+        cls.foreign = PhotoFactory(user=other)
+        cls.foreign.save()
+
+    @classmethod
+    def tearDownClass(cls):
+        """Remove the test directory."""
+        super(PhotoPickerTests, cls).tearDownClass()
+        os.system('rm -rf {}'.format(
+            os.path.join(settings.BASE_DIR, 'test_media_for_photo_picker')))
+
+    def test_form_renders_only_chosen_photos(self):
+        """Test that the album form does not render every photo."""
+        form = AlbumForm(username='bob', initial={'photos': self.photos[:2]})
+        html = str(form['photos'])
+        self.assertEqual(html.count('type="checkbox"'), 2)
+        self.assertNotIn('Photo 5', html)
+
+    def test_form_does_not_render_another_users_photo(self):
+        """Test that a submitted id of someone else's photo is not shown back."""
+        self.foreign.title = 'Not yours'
+        self.foreign.save()
+        form = AlbumForm({'title': 'trip', 'published': 'PRIVATE',
+                          'photos': [self.photos[0], self.foreign.id],
+                          'cover': self.foreign.id}, username='bob')
+        html = str(form['photos']) + str(form['cover'])
+        self.assertEqual(html.count('type="checkbox"'), 1)
+        self.assertNotIn('Not yours', html)
+
+    def test_form_validates_submitted_ids_only(self):
+        """Test that validation runs one lookup for the photos and two for the cover."""
+        form = AlbumForm({'title': 'trip', 'published': 'PRIVATE',
+                          'photos': self.photos[:3], 'cover': self.photos[0]},
+                         username='bob')
+        with self.assertNumQueries(3):
+            self.assertTrue(form.is_valid(), form.errors)
+
+    def test_form_rejects_another_users_photo(self):
+        """Test that photos owned by someone else are invalid."""
+        form = AlbumForm({'title': 'trip', 'published': 'PRIVATE',
+                          'photos': [self.photos[0], self.foreign.id], 'cover': ''},
+                         username='bob')
+        self.assertFalse(form.is_valid())
+        self.assertIn('photos', form.errors)
+
+    def test_picker_route_pages_newest_first(self):
+        """Test that the picker lists pages of photos and a cursor."""
+        self.client.login(username='bob', password='password')
+        response = self.client.get(reverse_lazy('photo_picker'))
+        data = response.json()
+        self.assertEqual(len(data['results']), 24)
+        self.assertEqual(data['results'][0]['id'], self.photos[-1])
+        response = self.client.get(reverse_lazy('photo_picker'), {'after': data['next']})
+        self.assertEqual([photo['id'] for photo in response.json()['results']],
+                         self.photos[5::-1])
+        self.assertIsNone(response.json()['next'])
+
+    def test_picker_route_searches_titles(self):
+        """Test that the picker filters by title."""
+        self.client.login(username='bob', password='password')
+        response = self.client.get(reverse_lazy('photo_picker'), {'q': 'photo 29'})
+        self.assertEqual([photo['id'] for photo in response.json()['results']],
+                         [self.photos[29]])
+
+    def test_picker_route_not_logged_in_redirects(self):
+        """Test that the picker requires a login."""
+        response = self.client.get(reverse_lazy('photo_picker'))
+        self.assertEqual(response.status_code, 302)
+
+
+"""Tests for reaping deleted accounts."""
+
+
+class ReaperTests(TestCase):
+    """Tests for removing the rows and files of deleted accounts."""
+
+    @classmethod
+    def setUpClass(cls):
+        """Make a test media directory."""
+        super(ReaperTests, cls).setUpClass()
+        os.system('mkdir {}'.format(
+            os.path.join(settings.BASE_DIR, 'test_media_for_reaper')))
+
+    @classmethod
+    def tearDownClass(cls):
+        """Remove the test directory."""
+        super(ReaperTests, cls).tearDownClass()
+        os.system('rm -rf {}'.format(
+            os.path.join(settings.BASE_DIR, 'test_media_for_reaper')))
+
+    def make_account(self):
+        """A user with three photos in an album."""
+        user = UserFactory(username='bob')
+        user.save()
+        photos = [PhotoFactory(user=user) for _ in range(3)]
+        album = AlbumFactory(user=user, cover=photos[0])
+        album.save()
+        album.photos.add(*photos)
+        return user, photos
+
+    @override_settings(MEDIA_ROOT=os.path.join(settings.BASE_DIR, 'test_media_for_reaper'))
+    def test_deleted_account_is_hidden_at_once(self):
+        """Test that deleting an account hides its photos before they are reaped."""
+        from imager_profile.models import delete_account
+        user, photos = self.make_account()
+        delete_account(user)
+        self.assertEqual(Photo.objects.count(), 3)
+        self.assertFalse(Photo.active.exists())
+        self.assertFalse(Album.active.exists())
+
+    @override_settings(MEDIA_ROOT=os.path.join(settings.BASE_DIR, 'test_media_for_reaper'))
+    def test_reaper_removes_rows_and_files(self):
+        """Test that the reaper deletes the photos, albums, files and user."""
+        from django.contrib.auth.models import User
+        from django.core.management import call_command
+        from imager_profile.models import AccountTombstone, delete_account
+        from io import StringIO
+        user, photos = self.make_account()
+        paths = [photo.image.path for photo in photos]
+        delete_account(user)
+        output = StringIO()
+        call_command('reap_accounts', batch_size=2, workers=2, stdout=output)
+        self.assertIn('Reaped 1 accounts and 3 photos.', output.getvalue())
+        self.assertFalse(Photo.objects.exists())
+        self.assertFalse(Album.objects.exists())
+        self.assertFalse(User.objects.filter(id=user.id).exists())
+        self.assertFalse(any(os.path.exists(path) for path in paths))
+        tombstone = AccountTombstone.objects.get(user_id=user.id)
+        self.assertIsNotNone(tombstone.completed)
+        self.assertEqual(tombstone.photos_deleted, 3)
+
+    @override_settings(MEDIA_ROOT=os.path.join(settings.BASE_DIR, 'test_media_for_reaper'))
+    def test_reaper_keeps_files_other_photos_use(self):
+        """Test that a file another photo points at is left in place."""
+        from imager_images.reaper import reap
+        from imager_profile.models import AccountTombstone, delete_account
+        user, photos = self.make_account()
+        other = UserFactory(username='eve')
+        other.save()
+        Photo.objects.create(user=other, image=photos[1].image.name, published='PUBLIC')
+        delete_account(user)
+        reap(AccountTombstone.objects.get(user_id=user.id))
+        self.assertTrue(os.path.exists(photos[1].image.path))
+        self.assertFalse(os.path.exists(photos[0].image.path))
+
+
+"""Tests for collecting orphaned media."""
+
+
+class CollectMediaTests(TestCase):
+    """Tests for deleting files nothing refers to."""
+
+    @classmethod
+    def setUpClass(cls):
+        """Make a test media directory."""
+        super(CollectMediaTests, cls).setUpClass()
+        os.system('mkdir {}'.format(
+            os.path.join(settings.BASE_DIR, 'test_media_for_collect')))
+
+    @classmethod
+    def tearDownClass(cls):
+        """Remove the test directory."""
+        super(CollectMediaTests, cls).tearDownClass()
+        os.system('rm -rf {}'.format(
+            os.path.join(settings.BASE_DIR, 'test_media_for_collect')))
+
+    def setUp(self):
+        """Empty the test directory, since files outlive each test's rows."""
+        os.system('rm -rf {}/*'.format(
+            os.path.join(settings.BASE_DIR, 'test_media_for_collect')))
+
+    def make_media(self, age=0):
+        """A photo with a thumbnail, plus an orphan original and thumbnail ``age`` seconds old."""
+        from django.core.files.base import ContentFile
+        from django.core.files.storage import default_storage
+        from sorl.thumbnail import get_thumbnail
+        user = UserFactory(username='bob')
+        user.save()
+        photo = PhotoFactory(user=user)
+        photo.save()
+        thumbnail = get_thumbnail(photo.image, '100x100')
+        orphans = [default_storage.save('images/ab/cd/abcd.jpg', ContentFile(b'x')),
+                   default_storage.save('cache/ab/cd/abcd.jpg', ContentFile(b'y'))]
+        import time
+        orphans = [default_storage.path(name) for name in orphans]
+        modified = time.time() - age
+        for path in orphans:
+            os.utime(path, (modified, modified))
+        return [photo.image.path, default_storage.path(thumbnail.name)], orphans
+
+    def collect(self, *args):
+        """Run the collector and return its output."""
+        from django.core.management import call_command
+        from io import StringIO
+        output = StringIO()
+        call_command('collect_media', *args, stdout=output)
+        return output.getvalue()
+
+    @override_settings(MEDIA_ROOT=os.path.join(settings.BASE_DIR, 'test_media_for_collect'))
+    def test_collect_deletes_only_orphans(self):
+        """Test that unreferenced files go and the photo and its thumbnail stay."""
+        kept, orphans = self.make_media(age=60)
+        output = self.collect('--grace-hours', '0')
+        self.assertIn('Deleted 2 orphaned files', output)
+        self.assertTrue(all(os.path.exists(path) for path in kept))
+        self.assertFalse(any(os.path.exists(path) for path in orphans))
+
+    @override_settings(MEDIA_ROOT=os.path.join(settings.BASE_DIR, 'test_media_for_collect'))
+    def test_collect_dry_run_deletes_nothing(self):
+        """Test that a dry run reports orphans without deleting them."""
+        kept, orphans = self.make_media(age=60)
+        output = self.collect('--grace-hours', '0', '--dry-run', '--verbosity', '2')
+        self.assertIn('Would delete 2 orphaned files', output)
+        self.assertIn('images/ab/cd/abcd.jpg', output)
+        self.assertTrue(all(os.path.exists(path) for path in kept + orphans))
+
+    @override_settings(MEDIA_ROOT=os.path.join(settings.BASE_DIR, 'test_media_for_collect'))
+    def test_collect_deletes_contact_sheets_no_longer_cached(self):
+        """Test that old sheets go with their manifests and cached ones stay."""
+        from django.core.cache import cache
+        from django.core.files.base import ContentFile
+        from django.core.files.storage import default_storage
+        from imager_images.sprites import cache_key
+        import time
+        names = [default_storage.save('sprites/ab/{}'.format(name), ContentFile(b'x'))
+                 for name in ('used.jpg', 'used.json', 'old.jpg', 'old.json')]
+        modified = time.time() - 60
+        for name in names:
+            os.utime(default_storage.path(name), (modified, modified))
+        cache.set(cache_key('sprites/ab/used.jpg'), {'tiles': []})
+        output = self.collect('--grace-hours', '0')
+        self.assertIn('Deleted 2 orphaned files', output)
+        self.assertEqual([default_storage.exists(name) for name in names],
+                         [True, True, False, False])
+
+    @override_settings(MEDIA_ROOT=os.path.join(settings.BASE_DIR, 'test_media_for_collect'))
+    def test_collect_keeps_recent_files(self):
+        """Test that orphans inside the grace period are kept."""
+        kept, orphans = self.make_media()
+        output = self.collect()
+        self.assertIn('Deleted 0 orphaned files', output)
+        self.assertTrue(all(os.path.exists(path) for path in orphans))
+
+    def test_bloom_filter_has_no_false_negatives(self):
+        """Test that every added key is found and most others are not."""
+        from imager_images.bloom import BloomFilter
+        bloom = BloomFilter(1000, 0.01)
+        for number in range(1000):
+            bloom.add('images/{}.jpg'.format(number))
+        self.assertTrue(all('images/{}.jpg'.format(number) in bloom
+                            for number in range(1000)))
+        misses = sum('cache/{}.jpg'.format(number) in bloom for number in range(1000))
+        self.assertLess(misses, 50)
+
+
+"""Tests for publishing and bulk visibility changes."""
+
+
+class VisibilityTests(TestCase):
+    """Tests for the publish date and changing visibility in bulk."""
+
+    @classmethod
+    @override_settings(MEDIA_ROOT=os.path.join(settings.BASE_DIR,
+                                               'test_media_for_visibility'))
+    def setUpClass(cls):
+        """Add a user with five private photos, two tagged, and an album."""
+        super(VisibilityTests, cls).setUpClass()
+        from imager_images.models import Tag
+        os.system('mkdir {}'.format(
+            os.path.join(settings.BASE_DIR, 'test_media_for_visibility')))
+        cls.user = UserFactory(username='bob')
+        cls.user.set_password('password')
+        cls.user.save()
+        cls.photos = []
+        for _ in range(5):
+            photo = PhotoFactory(user=cls.user, published='PRIVATE')
+            photo.save()
+            cls.photos.append(photo.id)
+        cls.tag = Tag.objects.create(name='sunset')
+        for photo in Photo.objects.filter(id__in=cls.photos[:2]):
+            photo.tags.add(cls.tag)
+        cls.album = AlbumFactory(user=cls.user, published='PRIVATE')
+        cls.album.save()
+
+    @classmethod
+    def tearDownClass(cls):
+        """Remove the test directory."""
+        super(VisibilityTests, cls).tearDownClass()
+        os.system('rm -rf {}'.format(
+            os.path.join(settings.BASE_DIR, 'test_media_for_visibility')))
+
+    def photo_updates(self, queries):
+        """The number of UPDATE statements on the photo table."""
+        return sum(query['sql'].startswith('UPDATE "imager_images_photo"')
+                   for query in queries)
+
+    def test_first_publish_is_one_write(self):
+        """Test that publishing a photo stamps the date in the same UPDATE."""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        photo = Photo.objects.get(id=self.photos[0])
+        photo.published = 'PUBLIC'
+        with CaptureQueriesContext(connection) as queries:
+            photo.save()
+        self.assertEqual(self.photo_updates(queries), 1)
+        self.assertIsNotNone(Photo.objects.get(id=photo.id).date_published)
+
+    def test_change_visibility_updates_once_per_batch(self):
+        """Test that five photos in batches of two take three UPDATEs."""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from imager_images.visibility import change_visibility
+        with CaptureQueriesContext(connection) as queries:
+            changed = change_visibility(Photo.objects.filter(user=self.user),
+                                        'PUBLIC', batch_size=2)
+        self.assertEqual(changed, 5)
+        self.assertEqual(self.photo_updates(queries), 3)
+        self.assertFalse(Photo.objects.filter(date_published=None).exists())
+
+    def test_change_visibility_keeps_first_publish_date(self):
+        """Test that unpublishing and republishing keep date_published."""
+        from imager_images.visibility import change_visibility
+        photos = Photo.objects.filter(id=self.photos[0])
+        change_visibility(photos, 'PUBLIC')
+        first = photos.get().date_published
+        self.assertEqual(change_visibility(photos, 'PRIVATE'), 1)
+        self.assertEqual(photos.get().date_published, first)
+        change_visibility(photos, 'PUBLIC')
+        self.assertEqual(photos.get().date_published, first)
+
+    def test_change_visibility_moves_public_tag_counts(self):
+        """Test that tags count only while their photos are public."""
+        from imager_images.models import TagCount
+        from imager_images.visibility import change_visibility
+        photos = Photo.objects.filter(user=self.user)
+        change_visibility(photos, 'PUBLIC')
+        self.assertEqual(TagCount.objects.get(tag=self.tag).count, 2)
+        change_visibility(photos, 'SHARED')
+        self.assertEqual(TagCount.objects.get(tag=self.tag).count, 0)
+
+    def test_library_visibility_route_changes_tagged_photos(self):
+        """Test that applying to all tagged photos leaves the rest alone."""
+        self.client.login(username='bob', password='password')
+        response = self.client.post(reverse_lazy('library_visibility'), {
+            'kind': 'photos', 'published': 'PUBLIC', 'everything': 'on',
+            'tags': 'sunset'})
+        self.assertRedirects(response, '/images/library?tag=sunset')
+        self.assertEqual(set(Photo.objects.filter(published='PUBLIC')
+                             .values_list('id', flat=True)), set(self.photos[:2]))
+
+    def test_library_visibility_route_changes_chosen_album(self):
+        """Test that a chosen album is published."""
+        self.client.login(username='bob', password='password')
+        self.client.post(reverse_lazy('library_visibility'), {
+            'kind': 'albums', 'published': 'PUBLIC', 'ids': [self.album.id]})
+        album = Album.objects.get(id=self.album.id)
+        self.assertEqual(album.published, 'PUBLIC')
+        self.assertIsNotNone(album.date_published)
+
+    def test_library_visibility_route_reports_an_invalid_change(self):
+        """Test that submitting nothing to change shows why on the library."""
+        self.client.login(username='bob', password='password')
+        response = self.client.post(reverse_lazy('library_visibility'), {
+            'kind': 'photos', 'published': 'PUBLIC'}, follow=True)
+        self.assertContains(response, 'Choose some items or all of them.')
+        self.assertFalse(Photo.objects.filter(published='PUBLIC').exists())
+
+    def test_library_visibility_route_ignores_other_users_items(self):
+        """Test that ids of another user's photos change nothing."""
+        other = UserFactory(username='eve')
+        other.set_password('password')
+        other.save()
+        self.client.login(username='eve', password='password')
+        self.client.post(reverse_lazy('library_visibility'), {
+            'kind': 'photos', 'published': 'PUBLIC', 'ids': self.photos})
+        self.assertFalse(Photo.objects.filter(published='PUBLIC').exists())
+
+
+"""Tests for scheduled publishing."""
+
+
+class ScheduledPublishTests(TestCase):
+    """Tests for publish_at and the scheduler."""
+
+    @classmethod
+    @override_settings(MEDIA_ROOT=os.path.join(settings.BASE_DIR,
+                                               'test_media_for_schedule'))
+    def setUpClass(cls):
+        """Add a user with a due photo, a future photo and a due album."""
+        super(ScheduledPublishTests, cls).setUpClass()
+        from datetime import timedelta
+        from django.utils import timezone
+        os.system('mkdir {}'.format(
+            os.path.join(settings.BASE_DIR, 'test_media_for_schedule')))
+        cls.user = UserFactory(username='bob')
+        cls.user.set_password('password')
+        cls.user.save()
+        cls.due = PhotoFactory(user=cls.user, published='PRIVATE', title='due',
+                               publish_at=timezone.now() - timedelta(minutes=1))
+        cls.due.save()
+        cls.later = PhotoFactory(user=cls.user, published='PRIVATE', title='later',
+                                 publish_at=timezone.now() + timedelta(days=1))
+        cls.later.save()
+        cls.album = AlbumFactory(user=cls.user, published='SHARED',
+                                 publish_at=timezone.now() - timedelta(minutes=1))
+        cls.album.save()
+
+    @classmethod
+    def tearDownClass(cls):
+        """Remove the test directory."""
+        super(ScheduledPublishTests, cls).tearDownClass()
+        os.system('rm -rf {}'.format(
+            os.path.join(settings.BASE_DIR, 'test_media_for_schedule')))
+
+    def test_publish_due_claims_with_skip_locked(self):
+        """Test that only due photos are published, claimed with SKIP LOCKED."""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from imager_images.visibility import publish_due
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(publish_due(Photo), 1)
+        self.assertTrue(any('FOR UPDATE SKIP LOCKED' in query['sql']
+                            for query in queries))
+        due = Photo.objects.get(id=self.due.id)
+        self.assertEqual(due.published, 'PUBLIC')
+        self.assertIsNone(due.publish_at)
+        self.assertIsNotNone(due.date_published)
+        self.assertEqual(Photo.objects.get(id=self.later.id).published, 'PRIVATE')
+
+    def test_publish_scheduled_command_publishes_photos_and_albums(self):
+        """Test that one pass of the command publishes every due item."""
+        from django.core.management import call_command
+        from io import StringIO
+        output = StringIO()
+        call_command('publish_scheduled', once=True, batch_size=1, stdout=output)
+        self.assertIn('Published 2 items.', output.getvalue())
+        self.assertEqual(Album.objects.get(id=self.album.id).published, 'PUBLIC')
+
+    def test_publishing_by_hand_clears_the_schedule(self):
+        """Test that saving a photo as public drops its publish_at."""
+        photo = Photo.objects.get(id=self.later.id)
+        photo.published = 'PUBLIC'
+        photo.save()
+        self.assertIsNone(Photo.objects.get(id=photo.id).publish_at)
+
+    def test_form_rejects_a_time_in_the_past(self):
+        """Test that a schedule must be in the future."""
+        from imager_images.models import PhotoForm
+        form = PhotoForm({'title': 'x', 'published': 'PRIVATE',
+                          'publish_at': '2001-01-01 10:00'}, instance=self.later)
+        self.assertFalse(form.is_valid())
+        self.assertIn('publish_at', form.errors)
+
+    def test_form_keeps_an_unchanged_time_that_has_passed(self):
+        """Test that an item waiting for the scheduler can still be edited."""
+        from django.utils import timezone
+        from imager_images.models import PhotoForm
+        publish_at = timezone.localtime(self.due.publish_at).strftime('%Y-%m-%d %H:%M:%S')
+        form = PhotoForm({'title': 'renamed', 'published': 'PRIVATE',
+                          'publish_at': publish_at}, instance=self.due)
+        self.assertTrue(form.is_valid(), form.errors)
+
+    def test_hiding_in_bulk_cancels_the_schedule(self):
+        """Test that a bulk change to private or shared keeps items from being published."""
+        from imager_images.visibility import change_visibility, publish_due
+        photos = Photo.objects.filter(id__in=[self.due.id, self.later.id])
+        self.assertEqual(change_visibility(photos, 'PRIVATE'), 2)
+        self.assertEqual(change_visibility(Album.objects.filter(id=self.album.id),
+                                           'SHARED'), 1)
+        self.assertFalse(Photo.objects.exclude(publish_at=None).exists())
+        self.assertEqual(publish_due(Photo) + publish_due(Album), 0)
+        self.assertEqual(Album.objects.get(id=self.album.id).published, 'SHARED')
+
+    def test_publishing_drops_the_cached_gallery(self):
+        """Test that a scheduled photo shows in the gallery once published."""
+        from imager_images.visibility import publish_due
+        response = self.client.get(reverse_lazy('photo_gallery'))
+        self.assertNotIn(b'data-title="due"', response.content)
+        publish_due(Photo)
+        response = self.client.get(reverse_lazy('photo_gallery'))
+        self.assertIn(b'data-title="due"', response.content)
+
+    def test_deleting_an_account_drops_the_cached_gallery(self):
+        """Test that a deleted account's photos leave the cached gallery."""
+        from imager_images.visibility import publish_due
+        from imager_profile.models import delete_account
+        publish_due(Photo)
+        response = self.client.get(reverse_lazy('photo_gallery'))
+        self.assertIn(b'data-title="due"', response.content)
+        delete_account(self.due.user)
+        response = self.client.get(reverse_lazy('photo_gallery'))
+        self.assertNotIn(b'data-title="due"', response.content)
+
+
+"""Tests for following photographers and reading the feed."""
+
+
+class FeedTests(TestCase):
+    """Tests for timelines filled on publish and feeds read from them."""
+
+    @classmethod
+    @override_settings(MEDIA_ROOT=os.path.join(settings.BASE_DIR, 'test_media_for_feed'))
+    def setUpClass(cls):
+        """Add a photographer with two private photos and two readers."""
+        super(FeedTests, cls).setUpClass()
+        os.system('mkdir {}'.format(
+            os.path.join(settings.BASE_DIR, 'test_media_for_feed')))
+        cls.ann = UserFactory(username='ann')
+        cls.ann.save()
+        cls.bob = UserFactory(username='bob')
+        cls.bob.set_password('password')
+        cls.bob.save()
+        cls.cat = UserFactory(username='cat')
+        cls.cat.save()
+        cls.photos = []
+        for title in ('first', 'second'):
+            photo = PhotoFactory(user=cls.ann, published='PRIVATE', title=title)
+            photo.save()
+            cls.photos.append(photo)
+
+    @classmethod
+    def tearDownClass(cls):
+        """Remove the test directory."""
+        super(FeedTests, cls).tearDownClass()
+        os.system('rm -rf {}'.format(
+            os.path.join(settings.BASE_DIR, 'test_media_for_feed')))
+
+    def setUp(self):
+        """Reload the photos so each test starts from private ones."""
+        self.photos = [Photo.objects.get(id=photo.id) for photo in self.photos]
+
+    def publish(self, photo):
+        """Publish a photo by saving it."""
+        photo.published = 'PUBLIC'
+        photo.save()
+
+    def fan_out(self, batch_size=1000):
+        """Run every queued fan out job."""
+        from imager_images.feed import fan_out_batch
+        while fan_out_batch(batch_size):
+            pass
+
+    def test_first_publish_queues_one_job(self):
+        """Test that only the first publish of a photo queues a fan out."""
+        from imager_images.models import FanOutJob
+        photo = self.photos[0]
+        self.publish(photo)
+        photo.title = 'renamed'
+        photo.save()
+        self.assertEqual(FanOutJob.objects.filter(object_id=photo.id).count(), 1)
+
+    def test_bulk_publish_queues_jobs(self):
+        """Test that a bulk first publish queues a job per photo."""
+        from imager_images.models import FanOutJob
+        from imager_images.visibility import change_visibility
+        change_visibility(Photo.objects.filter(user=self.ann), 'PUBLIC')
+        self.assertEqual(FanOutJob.objects.filter(kind='photo').count(), 2)
+
+    def test_fan_out_fills_timelines_in_batches(self):
+        """Test that a job reaches every follower one batch at a time."""
+        from imager_images.feed import fan_out_batch
+        from imager_images.models import FanOutJob, TimelineEntry
+        from imager_profile.models import Follow
+        Follow.objects.create(follower=self.bob, followed=self.ann)
+        Follow.objects.create(follower=self.cat, followed=self.ann)
+        self.publish(self.photos[0])
+        self.assertTrue(fan_out_batch(batch_size=1))
+        self.assertEqual(FanOutJob.objects.get().last_follower_id,
+                         min(self.bob.id, self.cat.id))
+        self.fan_out(batch_size=1)
+        self.assertFalse(FanOutJob.objects.exists())
+        self.assertEqual(TimelineEntry.objects.filter(object_id=self.photos[0].id).count(), 2)
+
+    def test_feed_reads_newest_first_in_pages(self):
+        """Test that the feed pages newest first through the cursor."""
+        from imager_images.feed import follow, read_feed
+        follow(self.bob, self.ann)
+        for photo in self.photos:
+            self.publish(photo)
+        self.fan_out()
+        items, next_cursor = read_feed(self.bob, limit=1)
+        self.assertEqual([item.title for _, item in items], ['second'])
+        items, next_cursor = read_feed(self.bob, next_cursor, limit=1)
+        self.assertEqual([item.title for _, item in items], ['first'])
+        self.assertIsNone(next_cursor)
+
+    def test_feed_skips_withdrawn_and_deleted_items(self):
+        """Test that private and deleted photos leave the feed."""
+        from imager_images.feed import follow, read_feed
+        from imager_images.models import TimelineEntry
+        follow(self.bob, self.ann)
+        for photo in self.photos:
+            self.publish(photo)
+        self.fan_out()
+        self.photos[0].published = 'PRIVATE'
+        self.photos[0].save()
+        self.photos[1].delete()
+        self.assertEqual(read_feed(self.bob), ([], None))
+        self.assertEqual(TimelineEntry.objects.count(), 1)
+
+    @override_settings(FEED_FAN_OUT_LIMIT=1)
+    def test_popular_authors_are_read_not_copied(self):
+        """Test that items of authors over the limit are pulled at read time."""
+        from imager_images.feed import follow, read_feed
+        from imager_images.models import TimelineEntry
+        follow(self.bob, self.ann)
+        self.publish(self.photos[0])
+        self.fan_out()
+        self.assertFalse(TimelineEntry.objects.exists())
+        items, _ = read_feed(self.bob)
+        self.assertEqual([item.id for _, item in items], [self.photos[0].id])
+
+    def test_author_passing_the_limit_is_not_listed_twice(self):
+        """Test that items copied before an author became popular appear once."""
+        from imager_images.feed import follow, read_feed
+        from imager_images.models import TimelineEntry
+        follow(self.bob, self.ann)
+        self.publish(self.photos[0])
+        self.fan_out()
+        self.assertTrue(TimelineEntry.objects.filter(owner=self.bob).exists())
+        with self.settings(FEED_FAN_OUT_LIMIT=1):
+            items, _ = read_feed(self.bob)
+        self.assertEqual([item.id for _, item in items], [self.photos[0].id])
+
+    def test_follow_backfills_and_unfollow_clears(self):
+        """Test that following copies recent items and unfollowing removes them."""
+        from imager_images.feed import follow, read_feed, unfollow
+        from imager_profile.models import ImagerProfile
+        self.publish(self.photos[0])
+        self.assertTrue(follow(self.bob, self.ann))
+        self.assertEqual(ImagerProfile.objects.get(user=self.ann).follower_count, 1)
+        self.assertEqual(len(read_feed(self.bob)[0]), 1)
+        self.assertTrue(unfollow(self.bob, self.ann))
+        self.assertEqual(ImagerProfile.objects.get(user=self.ann).follower_count, 0)
+        self.assertEqual(read_feed(self.bob), ([], None))
+
+    def test_follow_route_follows_and_unfollows(self):
+        """Test the follow button on a profile."""
+        from imager_profile.models import Follow
+        self.client.login(username='bob', password='password')
+        url = reverse_lazy('follow', kwargs={'username': 'ann'})
+        response = self.client.post(url)
+        self.assertRedirects(response, reverse_lazy('profile', kwargs={'username': 'ann'}))
+        self.assertTrue(Follow.objects.filter(follower=self.bob, followed=self.ann).exists())
+        self.client.post(url, {'unfollow': '1'})
+        self.assertFalse(Follow.objects.exists())
+
+    def test_feed_route_lists_followed_photos(self):
+        """Test the feed page shows photos of followed photographers."""
+        from imager_images.feed import follow
+        follow(self.bob, self.ann)
+        self.publish(self.photos[0])
+        self.fan_out()
+        self.client.login(username='bob', password='password')
+        response = self.client.get(reverse_lazy('feed'))
+        self.assertIn(b'first', response.content)
+
+    def test_feed_api_lists_kinds_and_items(self):
+        """Test the feed API returns each item with its kind."""
+        from imager_images.feed import follow
+        follow(self.bob, self.ann)
+        self.publish(self.photos[1])
+        self.fan_out()
+        self.client.login(username='bob', password='password')
+        response = self.client.get(reverse_lazy('api_feed'))
+        self.assertEqual(response.json()['results'][0]['kind'], 'photo')
+        self.assertEqual(response.json()['results'][0]['item']['title'], 'second')
+
+
+"""Tests for the buffered view counters."""
+
+VIEW_SPOOL = os.path.join(settings.BASE_DIR, 'test_view_spool')
+
+
+@override_settings(MEDIA_ROOT=os.path.join(settings.BASE_DIR, 'test_media_for_views'),
+                   VIEW_SPOOL_ROOT=VIEW_SPOOL, VIEW_FLUSH_SECONDS=3600, VIEW_FLUSH_SIZE=1000)
+class ViewCounterTests(TestCase):
+    """Tests for views counted in memory and written in batches."""
+
+    @classmethod
+    def setUpClass(cls):
+        """Add a public photo and album."""
+        super(ViewCounterTests, cls).setUpClass()
+        os.system('mkdir {}'.format(
+            os.path.join(settings.BASE_DIR, 'test_media_for_views')))
+        user = UserFactory(username='viewed')
+        user.save()
+        cls.photo = PhotoFactory(user=user, published='PUBLIC')
+        cls.photo.save()
+        cls.album = Album(user=user, title='viewed', published='PUBLIC')
+        cls.album.save()
+
+    @classmethod
+    def tearDownClass(cls):
+        """Remove the test directories."""
+        super(ViewCounterTests, cls).tearDownClass()
+        os.system('rm -rf {}'.format(
+            os.path.join(settings.BASE_DIR, 'test_media_for_views')))
+        os.system('rm -rf {}'.format(VIEW_SPOOL))
+
+    def setUp(self):
+        """Start each test with an empty spool and a new buffer."""
+        from imager_images import counters
+        os.system('rm -rf {}'.format(VIEW_SPOOL))
+        counters._buffer = None
+
+    def test_views_are_not_written_per_request(self):
+        """Test that viewing a photo leaves the database alone until a flush."""
+        from imager_images.counters import get_buffer
+        from imager_images.models import ViewCount
+        url = reverse_lazy('photo_detail', kwargs={'id': self.photo.id})
+        for _ in range(3):
+            self.client.get(url)
+        self.assertEqual(Photo.objects.get(id=self.photo.id).views, 0)
+        get_buffer().flush()
+        self.assertEqual(Photo.objects.get(id=self.photo.id).views, 3)
+        self.assertEqual(ViewCount.objects.get(kind='photo').views, 3)
+
+    def test_album_views_are_counted(self):
+        """Test that album views reach the album's total and hourly row."""
+        from imager_images.counters import get_buffer
+        from imager_images.models import ViewCount
+        self.client.get(reverse_lazy('album_detail', kwargs={'id': self.album.id}))
+        get_buffer().flush()
+        self.assertEqual(Album.objects.get(id=self.album.id).views, 1)
+        self.assertEqual(ViewCount.objects.get(kind='album').object_id, self.album.id)
+
+    def test_flushes_add_to_the_same_hour(self):
+        """Test that a second flush in the hour adds to the first one's row."""
+        from imager_images.counters import get_buffer, record_view
+        from imager_images.models import ViewCount
+        record_view('photo', self.photo.id)
+        get_buffer().flush()
+        record_view('photo', self.photo.id)
+        get_buffer().flush()
+        self.assertEqual(ViewCount.objects.get().views, 2)
+        self.assertEqual(Photo.objects.get(id=self.photo.id).views, 2)
+
+    @override_settings(VIEW_FLUSH_SIZE=1)
+    def test_full_buffer_flushes_itself(self):
+        """Test that the buffer writes once it holds enough items."""
+        from imager_images.counters import record_view
+        record_view('photo', self.photo.id)
+        self.assertEqual(Photo.objects.get(id=self.photo.id).views, 1)
+        self.assertEqual([name for name in os.listdir(VIEW_SPOOL)
+                          if not name.endswith('.spool')], [])
+
+    def test_saving_keeps_the_view_count(self):
+        """Test that editing a photo or album does not reset its views."""
+        from imager_images.counters import get_buffer, record_view
+        photo = Photo.objects.get(id=self.photo.id)
+        album = Album.objects.get(id=self.album.id)
+        record_view('photo', photo.id)
+        record_view('album', album.id)
+        get_buffer().flush()
+        photo.title = 'renamed'
+        photo.save()
+        album.title = 'renamed'
+        album.save()
+        self.assertEqual(Photo.objects.get(id=photo.id).views, 1)
+        self.assertEqual(Album.objects.get(id=album.id).views, 1)
+
+    def test_stopped_process_spool_is_recovered(self):
+        """Test that the views spooled by a stopped process are still counted."""
+        from django.core.management import call_command
+        from imager_images.counters import ViewBuffer
+        from io import StringIO
+        stopped = ViewBuffer(VIEW_SPOOL, 3600, 1000)
+        stopped.record('photo', self.photo.id)
+        stopped.record('photo', self.photo.id)
+        stopped.spool.close()
+        live = ViewBuffer(VIEW_SPOOL, 3600, 1000)
+        live.record('photo', self.photo.id)
+        out = StringIO()
+        call_command('flush_views', '--once', stdout=out)
+        self.assertIn('Recovered 2 views.', out.getvalue())
+        self.assertEqual(Photo.objects.get(id=self.photo.id).views, 2)
+        self.assertEqual(os.listdir(VIEW_SPOOL), [live.name + '.spool'])
+
+    @override_settings(VIEW_FLUSH_SIZE=1)
+    def test_failed_flush_still_renders_the_page(self):
+        """Test that a database error while flushing leaves the views for recovery."""
+        from django.db import OperationalError
+        from imager_images.counters import recover_spools
+        from imager_images.models import ViewCount
+        from unittest import mock
+        url = reverse_lazy('photo_detail', kwargs={'id': self.photo.id})
+        with mock.patch.object(ViewCount, 'add', side_effect=OperationalError), \
+                self.assertLogs('imager_images.counters', 'ERROR'):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Photo.objects.get(id=self.photo.id).views, 0)
+        self.assertEqual(recover_spools(VIEW_SPOOL), 1)
+        self.assertEqual(Photo.objects.get(id=self.photo.id).views, 1)
+
+    def test_idle_process_hands_its_views_to_recovery(self):
+        """Test that views with no newer one for the flush interval are left to flush_views."""
+        from imager_images.counters import recover_spools, ViewBuffer
+        idle = ViewBuffer(VIEW_SPOOL, 3600, 1000)
+        idle.record('photo', self.photo.id)
+        idle.release_idle()
+        self.assertEqual(sum(idle.counts.values()), 1)
+        idle.recorded -= 3600
+        idle.release_idle()
+        self.assertEqual(idle.counts, {})
+        self.assertEqual(recover_spools(VIEW_SPOOL), 1)
+        self.assertEqual(Photo.objects.get(id=self.photo.id).views, 1)
+        self.assertEqual(os.listdir(VIEW_SPOOL), [idle.name + '.spool'])
+
+    def test_spool_deleted_before_it_is_locked_is_skipped(self):
+        """Test that a spool its owner flushed while recovery opened it is not counted again."""
+        from imager_images.counters import recover_spools, ViewBuffer
+        from unittest import mock
+        stopped = ViewBuffer(VIEW_SPOOL, 3600, 1000)
+        stopped.record('photo', self.photo.id)
+        stopped.spool.close()
+        with mock.patch('imager_images.counters.fcntl.flock',
+                        side_effect=lambda spool, operation: os.remove(spool.name)):
+            self.assertEqual(recover_spools(VIEW_SPOOL), 0)
+        self.assertEqual(Photo.objects.get(id=self.photo.id).views, 0)
+
+
+"""Tests for the trending and most viewed galleries."""
+
+
+@override_settings(MEDIA_ROOT=os.path.join(settings.BASE_DIR, 'test_media_for_ranking'),
+                   TRENDING_HALF_LIFE_HOURS=24)
+class RankingTests(TestCase):
+    """Tests for scores kept from hourly views and the galleries ranked from them."""
+
+    @classmethod
+    def setUpClass(cls):
+        """Add three public photos."""
+        super(RankingTests, cls).setUpClass()
+        os.system('mkdir {}'.format(
+            os.path.join(settings.BASE_DIR, 'test_media_for_ranking')))
+        user = UserFactory(username='ranked')
+        user.save()
+        cls.photos = []
+        for title in ('old', 'new', 'unseen'):
+            photo = PhotoFactory(user=user, published='PUBLIC', title=title)
+            photo.save()
+            cls.photos.append(photo)
+
+    @classmethod
+    def tearDownClass(cls):
+        """Remove the test directory."""
+        super(RankingTests, cls).tearDownClass()
+        os.system('rm -rf {}'.format(
+            os.path.join(settings.BASE_DIR, 'test_media_for_ranking')))
+
+    def setUp(self):
+        """Fix the time the views are counted back from."""
+        from django.utils import timezone
+        self.now = timezone.now().replace(minute=30, second=0, microsecond=0)
+
+    def add_views(self, photo, hours_ago, views):
+        """Record views of a photo in the hour that many hours before now."""
+        from datetime import timedelta
+        from imager_images.models import ViewCount
+        ViewCount.objects.create(
+            kind='photo', object_id=photo.id, views=views,
+            hour=self.now.replace(minute=0) - timedelta(hours=hours_ago))
+
+    def board(self, name):
+        """The titles of a board's photos in order."""
+        from imager_images.ranking import ranked_photos
+        return [rank.photo.title for rank in ranked_photos(name)]
+
+    def test_recent_views_trend_and_all_views_of_the_week_count(self):
+        """Test that trending favours recent views and popular counts the week's."""
+        from imager_images.ranking import rank_galleries, score_views
+        old, new, _ = self.photos
+        self.add_views(old, 48, 10)
+        self.add_views(new, 1, 4)
+        self.assertEqual(score_views(self.now), 48)
+        rank_galleries(10)
+        self.assertEqual(self.board('trending'), ['new', 'old'])
+        self.assertEqual(self.board('popular'), ['old', 'new'])
+
+    def test_only_new_hours_are_scored(self):
+        """Test that each run adds the hours completed since the last one."""
+        from datetime import timedelta
+        from imager_images.models import PhotoScore
+        from imager_images.ranking import score_views
+        old = self.photos[0]
+        self.add_views(old, 2, 3)
+        self.assertEqual(score_views(self.now), 2)
+        self.add_views(old, 0, 5)
+        self.assertEqual(score_views(self.now), 0)
+        self.assertEqual(PhotoScore.objects.get(photo=old).week_views, 3)
+        self.assertEqual(score_views(self.now + timedelta(hours=1)), 1)
+        self.assertEqual(PhotoScore.objects.get(photo=old).week_views, 8)
+
+    def test_late_views_are_added_once_and_taken_out_exactly(self):
+        """Test that views written after their hour was scored never leave week_views negative."""
+        from datetime import timedelta
+        from django.db.models import F
+        from imager_images.models import PhotoScore, ViewCount
+        from imager_images.ranking import score_views
+        old = self.photos[0]
+        self.add_views(old, 2, 3)
+        score_views(self.now)
+        ViewCount.objects.filter(object_id=old.id).update(views=F('views') + 4)
+        score_views(self.now + timedelta(hours=1))
+        self.assertEqual(PhotoScore.objects.get(photo=old).week_views, 7)
+        score_views(self.now + timedelta(hours=2))
+        self.assertEqual(PhotoScore.objects.get(photo=old).week_views, 7)
+        score_views(self.now + timedelta(days=8))
+        ViewCount.objects.filter(object_id=old.id).update(views=F('views') + 5)
+        score_views(self.now + timedelta(days=8, hours=1))
+        self.assertEqual(PhotoScore.objects.get(photo=old).week_views, 0)
+
+    def test_views_leave_the_week_and_scores_are_rescaled(self):
+        """Test that views leave popular after a week and faded scores are pruned."""
+        from datetime import timedelta
+        from imager_images.models import PhotoScore, RankingState
+        from imager_images.ranking import rank_galleries, score_views
+        old, new, _ = self.photos
+        self.add_views(old, 1, 1)
+        self.add_views(new, 1, 1000)
+        score_views(self.now)
+        later = self.now + timedelta(days=15)
+        score_views(later)
+        rank_galleries(10)
+        self.assertEqual(self.board('popular'), [])
+        self.assertEqual(self.board('trending'), ['new'])
+        self.assertFalse(PhotoScore.objects.filter(photo=old).exists())
+        self.assertEqual(RankingState.objects.get().landmark,
+                         later.replace(minute=0) - timedelta(hours=1))
+
+    def test_hidden_photo_leaves_the_galleries(self):
+        """Test that a photo made private is taken out before the next run."""
+        from imager_images.ranking import rank_galleries, score_views
+        from imager_images.visibility import change_visibility
+        old, new, _ = self.photos
+        self.add_views(old, 1, 1)
+        self.add_views(new, 1, 1)
+        score_views(self.now)
+        rank_galleries(10)
+        photo = Photo.objects.get(id=old.id)
+        photo.published = 'PRIVATE'
+        photo.save()
+        change_visibility(Photo.objects.filter(id=new.id), 'SHARED')
+        self.assertEqual(self.board('trending'), [])
+
+    def test_ranked_gallery_route(self):
+        """Test the trending page shows the ranked photos."""
+        from imager_images.ranking import rank_galleries, score_views
+        self.add_views(self.photos[1], 1, 1)
+        score_views(self.now)
+        rank_galleries(10)
+        response = self.client.get(reverse_lazy('ranked_gallery', kwargs={'board': 'trending'}))
+        self.assertContains(response, 'data-title="new"')
+        self.assertNotContains(response, 'data-title="unseen"')
+
+    def test_rank_photos_command(self):
+        """Test the command scores and ranks once."""
+        from django.core.management import call_command
+        from io import StringIO
+        self.add_views(self.photos[1], 1, 1)
+        out = StringIO()
+        call_command('rank_photos', '--once', stdout=out)
+        self.assertIn('Scored 1 hours of views.', out.getvalue())
+        self.assertEqual(self.board('popular'), ['new'])
+
+
+"""Tests for favorites."""
+
+
+@override_settings(MEDIA_ROOT=os.path.join(settings.BASE_DIR, 'test_media_for_favorites'))
+class FavoriteTests(TestCase):
+    """Tests for favoriting photos and the like counts kept from it."""
+
+    @classmethod
+    def setUpClass(cls):
+        """Add a photographer with three public photos and a private one, and a fan."""
+        super(FavoriteTests, cls).setUpClass()
+        os.system('mkdir {}'.format(
+            os.path.join(settings.BASE_DIR, 'test_media_for_favorites')))
+        cls.owner = UserFactory(username='owner')
+        cls.owner.save()
+        cls.fan = UserFactory(username='fan')
+        cls.fan.set_password('password')
+        cls.fan.save()
+        cls.photos = []
+        for title in ('first', 'second', 'third'):
+            photo = PhotoFactory(user=cls.owner, published='PUBLIC', title=title)
+            photo.save()
+            cls.photos.append(photo)
+        cls.private = PhotoFactory(user=cls.owner, published='PRIVATE')
+        cls.private.save()
+
+    @classmethod
+    def tearDownClass(cls):
+        """Remove the test directory."""
+        super(FavoriteTests, cls).tearDownClass()
+        os.system('rm -rf {}'.format(
+            os.path.join(settings.BASE_DIR, 'test_media_for_favorites')))
+
+    def like_count(self, photo):
+        """The photo's like count in the database."""
+        return Photo.objects.get(id=photo.id).like_count
+
+    def test_favoriting_counts_once(self):
+        """Test that a favorite adds one like however often it is made."""
+        from imager_images.favorites import favorite, unfavorite
+        photo = self.photos[0]
+        self.assertTrue(favorite(self.fan, photo))
+        self.assertFalse(favorite(self.fan, photo))
+        self.assertEqual(self.like_count(photo), 1)
+        self.assertTrue(unfavorite(self.fan, photo))
+        self.assertFalse(unfavorite(self.fan, photo))
+        self.assertEqual(self.like_count(photo), 0)
+
+    def test_only_others_public_photos_can_be_favorited(self):
+        """Test that own and private photos cannot be favorited."""
+        from imager_images.favorites import favorite
+        self.assertFalse(favorite(self.owner, self.photos[0]))
+        self.assertFalse(favorite(self.fan, self.private))
+        self.assertEqual(self.like_count(self.photos[0]), 0)
+
+    def test_deleted_fan_takes_likes_away(self):
+        """Test that deleting a user removes their likes from the counts."""
+        from django.contrib.auth.models import User
+        from imager_images.favorites import favorite
+        favorite(self.fan, self.photos[0])
+        User.objects.filter(id=self.fan.id).delete()
+        self.assertEqual(self.like_count(self.photos[0]), 0)
+
+    def test_saving_keeps_the_like_count(self):
+        """Test that editing a photo does not reset its likes."""
+        from imager_images.favorites import favorite
+        photo = Photo.objects.get(id=self.photos[0].id)
+        favorite(self.fan, photo)
+        photo.title = 'renamed'
+        photo.save()
+        self.assertEqual(self.like_count(photo), 1)
+
+    def test_favorites_page_newest_first_without_hidden_photos(self):
+        """Test that favorites page back from the newest and skip private photos."""
+        from imager_images.favorites import favorite, read_favorites
+        for photo in self.photos:
+            favorite(self.fan, photo)
+        Photo.objects.filter(id=self.photos[1].id).update(published='PRIVATE')
+        photos, next_cursor = read_favorites(self.fan, limit=1)
+        self.assertEqual([photo.title for photo in photos], ['third'])
+        photos, next_cursor = read_favorites(self.fan, next_cursor, limit=1)
+        self.assertEqual([photo.title for photo in photos], ['first'])
+        self.assertIsNone(next_cursor)
+
+    def test_favorited_ids_takes_one_query(self):
+        """Test that a gallery page's favorites are found in one query."""
+        from imager_images.favorites import favorite, favorited_ids
+        favorite(self.fan, self.photos[1])
+        with self.assertNumQueries(1):
+            found = favorited_ids(self.fan, [photo.id for photo in self.photos])
+        self.assertEqual(found, {self.photos[1].id})
+
+    def test_favorite_route_favorites_and_unfavorites(self):
+        """Test the favorite button on a photo."""
+        from imager_images.models import Favorite
+        self.client.login(username='fan', password='password')
+        url = reverse_lazy('photo_favorite', kwargs={'id': self.photos[0].id})
+        response = self.client.post(url)
+        self.assertRedirects(response, reverse_lazy('photo_detail',
+                                                    kwargs={'id': self.photos[0].id}))
+        self.assertTrue(Favorite.objects.filter(user=self.fan, photo=self.photos[0]).exists())
+        self.client.post(url, {'unfavorite': '1'})
+        self.assertFalse(Favorite.objects.exists())
+
+    def test_favorites_route_lists_favorites(self):
+        """Test the favorites page shows the user's favorite photos."""
+        from imager_images.favorites import favorite
+        favorite(self.fan, self.photos[2])
+        self.client.login(username='fan', password='password')
+        response = self.client.get(reverse_lazy('favorites'))
+        self.assertContains(response, 'alt="third"')
+        self.assertNotContains(response, 'alt="first"')
+
+
+"""Tests for each user's Atom and RSS feeds."""
+
+
+@override_settings(MEDIA_ROOT=os.path.join(settings.BASE_DIR, 'test_media_for_profile_feed'))
+class ProfileFeedTests(TestCase):
+    """Tests for profile feeds and the stamps their polls are answered from."""
+
+    @classmethod
+    def setUpClass(cls):
+        """Add a photographer with a public photo, a private one and a public album."""
+        super(ProfileFeedTests, cls).setUpClass()
+        os.system('mkdir {}'.format(
+            os.path.join(settings.BASE_DIR, 'test_media_for_profile_feed')))
+        cls.ann = UserFactory(username='ann')
+        cls.ann.save()
+        cls.shown = PhotoFactory(user=cls.ann, title='shown')
+        cls.shown.save()
+        cls.hidden = PhotoFactory(user=cls.ann, title='hidden', published='PRIVATE')
+        cls.hidden.save()
+        cls.album = AlbumFactory(user=cls.ann, title='holiday')
+        cls.album.save()
+
+    @classmethod
+    def tearDownClass(cls):
+        """Remove the test directory."""
+        super(ProfileFeedTests, cls).tearDownClass()
+        os.system('rm -rf {}'.format(
+            os.path.join(settings.BASE_DIR, 'test_media_for_profile_feed')))
+
+    def setUp(self):
+        """Reload the private photo so each test starts from it unpublished."""
+        self.hidden = Photo.objects.get(id=self.hidden.id)
+
+    def stamp(self):
+        """The photographer's feed stamp."""
+        from imager_profile.models import ImagerProfile
+        return ImagerProfile.objects.get(user=self.ann).feed_updated
+
+    def test_atom_feed_lists_public_items_newest_first(self):
+        """Test the Atom feed has the public album then photo, and no private photo."""
+        response = self.client.get(reverse_lazy('profile_atom', kwargs={'username': 'ann'}))
+        self.assertEqual(response['Content-Type'], 'application/atom+xml; charset=utf-8')
+        content = response.content.decode()
+        self.assertLess(content.index('holiday'), content.index('shown'))
+        self.assertNotIn('hidden', content)
+
+    def test_rss_feed_lists_public_items(self):
+        """Test the RSS feed links to the public photo."""
+        response = self.client.get(reverse_lazy('profile_rss', kwargs={'username': 'ann'}))
+        self.assertIn('/images/photos/{}<'.format(self.shown.id), response.content.decode())
+
+    def test_poll_with_current_etag_reads_only_the_profile(self):
+        """Test a poll with the current ETag gets a 304 from one query."""
+        url = reverse_lazy('profile_atom', kwargs={'username': 'ann'})
+        etag = self.client.get(url)['ETag']
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_poll_since_last_modified_is_new_after_publishing(self):
+        """Test If-Modified-Since gets a 304 until a photo is published."""
+        url = reverse_lazy('profile_atom', kwargs={'username': 'ann'})
+        last_modified = self.client.get(url)['Last-Modified']
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+        self.hidden.published = 'PUBLIC'
+        self.hidden.save()
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('hidden', response.content.decode())
+
+    def test_saving_a_private_photo_keeps_the_stamp(self):
+        """Test a change no feed shows leaves the stamp alone."""
+        stamp = self.stamp()
+        self.hidden.title = 'still hidden'
+        self.hidden.save()
+        self.assertEqual(self.stamp(), stamp)
+
+    def test_changes_within_a_second_get_new_stamps(self):
+        """Test each change moves the stamp on by at least a whole second."""
+        stamp = self.stamp()
+        self.shown.title = 'renamed'
+        self.shown.save()
+        renamed = self.stamp()
+        self.album.delete()
+        self.assertGreaterEqual((renamed - stamp).total_seconds(), 1)
+        self.assertGreaterEqual((self.stamp() - renamed).total_seconds(), 1)
+
+    def test_bulk_visibility_change_restamps_the_feed(self):
+        """Test publishing in bulk moves the owner's stamp."""
+        from imager_images.visibility import change_visibility
+        stamp = self.stamp()
+        change_visibility(Photo.objects.filter(id=self.hidden.id), 'PUBLIC')
+        self.assertGreater(self.stamp(), stamp)
+
+    def test_deactivated_user_feed_is_not_found(self):
+        """Test a deactivated account's feed is a 404 even with its old ETag."""
+        from django.contrib.auth.models import User
+        url = reverse_lazy('profile_atom', kwargs={'username': 'ann'})
+        etag = self.client.get(url)['ETag']
+        User.objects.filter(id=self.ann.id).update(is_active=False)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 404)
+
+
+"""Tests for account exports."""
+
+
+@override_settings(MEDIA_ROOT=os.path.join(settings.BASE_DIR, 'test_media_for_exports'),
+                   ACCOUNT_EXPORT_STORAGE='django.core.files.storage.FileSystemStorage',
+                   ACCOUNT_EXPORT_STORAGE_OPTIONS={'location': os.path.join(
+                       settings.BASE_DIR, 'test_media_for_exports', 'private')})
+class ExportTests(TestCase):
+    """Tests for building account archives in the background."""
+
+    @classmethod
+    def setUpClass(cls):
+        """Make a test media directory."""
+        super(ExportTests, cls).setUpClass()
+        os.system('mkdir {}'.format(
+            os.path.join(settings.BASE_DIR, 'test_media_for_exports')))
+
+    @classmethod
+    def tearDownClass(cls):
+        """Remove the test directory."""
+        super(ExportTests, cls).tearDownClass()
+        os.system('rm -rf {}'.format(
+            os.path.join(settings.BASE_DIR, 'test_media_for_exports')))
+
+    def setUp(self):
+        """Add a user with three photos, one private, in an album in reverse order."""
+        self.user = UserFactory(username='bob', email='bob@example.com')
+        self.user.set_password('password')
+        self.user.save()
+        self.photos = [PhotoFactory(user=self.user, title='photo{}'.format(index))
+                       for index in range(3)]
+        self.photos[2].published = 'PRIVATE'
+        self.photos[2].save()
+        self.album = AlbumFactory(user=self.user, title='trip', cover=self.photos[0])
+        self.album.save()
+        for photo in reversed(self.photos):
+            self.album.photos.add(photo)
+
+    def build(self, workers=2):
+        """Request and build an export, and return it reloaded."""
+        from imager_images.exports import claim_export, request_export, run_export
+        from imager_profile.models import AccountExport
+        export = request_export(self.user, 'http://testserver/profile/export')
+        run_export(claim_export(), workers=workers, batch_size=2)
+        return AccountExport.objects.get(id=export.id)
+
+    def read(self, export):
+        """The manifest and entry names of an export's archive."""
+        import json
+        import zipfile
+        storage = export.archive.storage
+        with storage.open(export.archive.name) as archive_file, zipfile.ZipFile(archive_file) as archive:
+            return json.loads(archive.read('manifest.json').decode()), archive.namelist()
+
+    def test_request_export_keeps_one_waiting(self):
+        """Test asking again while an export waits returns the same one."""
+        from imager_images.exports import request_export
+        first = request_export(self.user, 'http://testserver/profile/export')
+        self.assertEqual(request_export(self.user, 'http://testserver/profile/export'), first)
+        self.assertEqual(self.user.exports.count(), 1)
+
+    def test_archive_has_the_manifest_and_every_original(self):
+        """Test the archive lists the profile, the album in order and all photos."""
+        export = self.build()
+        manifest, names = self.read(export)
+        self.assertEqual(manifest['user']['username'], 'bob')
+        self.assertEqual(manifest['albums'][0]['photos'],
+                         [photo.id for photo in reversed(self.photos)])
+        self.assertEqual(manifest['albums'][0]['cover'], self.photos[0].id)
+        self.assertEqual([photo['published'] for photo in manifest['photos']],
+                         ['PUBLIC', 'PUBLIC', 'PRIVATE'])
+        self.assertEqual(names, ['manifest.json'] +
+                         [photo['file'] for photo in manifest['photos']])
+        self.assertEqual(export.photo_count, 3)
+        self.assertEqual(export.size, export.archive.size)
+
+    def test_archive_originals_match_storage(self):
+        """Test each original is copied byte for byte."""
+        import zipfile
+        export = self.build(workers=1)
+        storage = export.archive.storage
+        with storage.open(export.archive.name) as archive_file, zipfile.ZipFile(archive_file) as archive:
+            photo = self.photos[1]
+            self.assertEqual(archive.read('photos/{}.jpg'.format(photo.id)),
+                             photo.image.storage.open(photo.image.name).read())
+
+    def test_missing_original_is_listed(self):
+        """Test an original that cannot be read is named in missing.txt."""
+        photo = self.photos[0]
+        photo.image.storage.delete(photo.image.name)
+        export = self.build()
+        _, names = self.read(export)
+        self.assertIn('missing.txt', names)
+        self.assertEqual(export.photo_count, 2)
+
+    def test_user_is_emailed_a_link(self):
+        """Test the user gets an email linking to the export page."""
+        from django.core import mail
+        self.build()
+        self.assertEqual(mail.outbox[0].to, ['bob@example.com'])
+        self.assertIn('http://testserver/profile/export', mail.outbox[0].body)
+
+    def test_export_being_built_is_not_claimed_again(self):
+        """Test a fresh heartbeat keeps other workers off and a stale one does not."""
+        from datetime import timedelta
+        from django.utils import timezone
+        from imager_images.exports import claim_export, request_export
+        from imager_profile.models import AccountExport
+        export = request_export(self.user, 'http://testserver/profile/export')
+        self.assertEqual(claim_export(), export)
+        self.assertIsNone(claim_export())
+        AccountExport.objects.filter(id=export.id).update(
+            heartbeat=timezone.now() - timedelta(hours=1))
+        self.assertEqual(claim_export(), export)
+
+    def test_reclaimed_export_deletes_what_the_dead_worker_wrote(self):
+        """Test that claiming a stale export again removes its partial archive."""
+        from datetime import timedelta
+        from django.core.files.base import ContentFile
+        from django.utils import timezone
+        from imager_images.exports import claim_export, request_export
+        from imager_profile.models import AccountExport
+        request_export(self.user, 'http://testserver/profile/export')
+        dead = claim_export()
+        storage = dead.archive.storage
+        storage.save(dead.archive.name, ContentFile(b'half an archive'))
+        AccountExport.objects.filter(id=dead.id).update(
+            heartbeat=timezone.now() - timedelta(hours=1))
+        retry = claim_export()
+        self.assertEqual(retry.id, dead.id)
+        self.assertNotEqual(retry.archive.name, dead.archive.name)
+        self.assertFalse(storage.exists(dead.archive.name))
+
+    def test_archive_is_stored_apart_from_the_public_media(self):
+        """Test that archives are not written below MEDIA_ROOT's public URLs."""
+        export = self.build()
+        self.assertTrue(export.archive.storage.path(export.archive.name).startswith(
+            os.path.join(settings.BASE_DIR, 'test_media_for_exports', 'private')))
+
+    def test_download_is_streamed_to_the_owner_only(self):
+        """Test that only the exporting user can download the archive."""
+        export = self.build()
+        url = reverse_lazy('account_export_download', kwargs={'id': export.id})
+        self.client.login(username='bob', password='password')
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content),
+                         export.archive.storage.open(export.archive.name).read())
+        other = UserFactory(username='eve')
+        other.set_password('password')
+        other.save()
+        self.client.login(username='eve', password='password')
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_download_redirects_to_a_signed_url_where_the_storage_signs(self):
+        """Test that storage handing out expiring URLs is sent to directly."""
+        from imager_profile.storage import ExportStorage
+        from unittest import mock
+        export = self.build()
+        self.client.login(username='bob', password='password')
+        with mock.patch.object(ExportStorage, 'signs_urls', True), \
+                mock.patch.object(ExportStorage, 'url', return_value='https://signed.example/a'):
+            response = self.client.get(reverse_lazy('account_export_download',
+                                                     kwargs={'id': export.id}))
+        self.assertRedirects(response, 'https://signed.example/a',
+                             fetch_redirect_response=False)
+
+    def test_deactivated_account_export_fails(self):
+        """Test an export of a deleted account is not built."""
+        from imager_images.exports import claim_export, request_export, run_export
+        from imager_profile.models import delete_account
+        export = request_export(self.user, 'http://testserver/profile/export')
+        delete_account(self.user)
+        run_export(claim_export())
+        export.refresh_from_db()
+        self.assertTrue(export.failed)
+        self.assertFalse(export.archive)
+
+    def test_expired_and_reaped_archives_are_deleted(self):
+        """Test old archives are deleted, and a reaped account's are too."""
+        from datetime import timedelta
+        from django.utils import timezone
+        from imager_images.exports import expire_exports
+        from imager_images.reaper import reap
+        from imager_profile.models import AccountExport, AccountTombstone
+        old, new = self.build(), self.build()
+        AccountExport.objects.filter(id=old.id).update(
+            completed=timezone.now() - timedelta(days=settings.ACCOUNT_EXPORT_DAYS + 1))
+        self.assertEqual(expire_exports(), 1)
+        self.assertFalse(old.archive.storage.exists(old.archive.name))
+        self.assertTrue(new.archive.storage.exists(new.archive.name))
+        reap(AccountTombstone.objects.create(user_id=self.user.id, username='bob'))
+        self.assertFalse(new.archive.storage.exists(new.archive.name))
+
+    def test_export_page_queues_an_export(self):
+        """Test posting to the export page queues one export and lists it."""
+        self.client.login(username='bob', password='password')
+        response = self.client.post(reverse_lazy('account_export'), follow=True)
+        self.assertEqual(self.user.exports.count(), 1)
+        self.assertContains(response, 'being built')
+
+    def test_export_page_needs_login(self):
+        """Test the export page redirects anonymous users."""
+        response = self.client.get(reverse_lazy('account_export'))
+        self.assertEqual(response.status_code, 302)
+
+    def test_export_command_builds_waiting_exports(self):
+        """Test the command builds the waiting export and exits with --once."""
+        from django.core.management import call_command
+        from imager_images.exports import request_export
+        from io import StringIO
+        export = request_export(self.user, 'http://testserver/profile/export')
+        out = StringIO()
+        call_command('export_accounts', once=True, workers=2, stdout=out)
+        export.refresh_from_db()
+        self.assertTrue(export.archive)
+        self.assertIn('Built 1 exports', out.getvalue())
+
+
+"""Tests for importing directories of photos."""
+
+
+@override_settings(MEDIA_ROOT=os.path.join(settings.BASE_DIR, 'test_media_for_import'))
+class ImportTests(TestCase):
+    """Tests for the import_photos command."""
+
+    source = os.path.join(settings.BASE_DIR, 'test_import_source')
+
+    @classmethod
+    def setUpClass(cls):
+        """Make a test media directory and a tree of files to import."""
+        from PIL import Image
+        super(ImportTests, cls).setUpClass()
+        os.system('mkdir {}'.format(
+            os.path.join(settings.BASE_DIR, 'test_media_for_import')))
+        os.system('mkdir -p {}'.format(os.path.join(cls.source, 'trip')))
+        os.system('cp {} {}'.format(os.path.join(settings.BASE_DIR, 'static/test_image.jpg'),
+                                    os.path.join(cls.source, 'beach.jpg')))
+        os.system('cp {} {}'.format(os.path.join(settings.BASE_DIR, 'static/test_image.jpg'),
+                                    os.path.join(cls.source, 'trip', 'again.jpg')))
+        Image.new('RGB', (30, 20), 'red').save(os.path.join(cls.source, 'trip', 'red.png'))
+        with open(os.path.join(cls.source, 'notes.txt'), 'w') as notes:
+            notes.write('not an image')
+
+    @classmethod
+    def tearDownClass(cls):
+        """Remove the test directories."""
+        super(ImportTests, cls).tearDownClass()
+        os.system('rm -rf {}'.format(
+            os.path.join(settings.BASE_DIR, 'test_media_for_import')))
+        os.system('rm -rf {}'.format(cls.source))
+
+    def setUp(self):
+        """Add the user photos are imported for."""
+        self.user = UserFactory(username='bob')
+        self.user.save()
+
+    def run_import(self, *args, **options):
+        """Run the command with two processes and return what it printed."""
+        from django.core.management import call_command
+        from io import StringIO
+        out, err = StringIO(), StringIO()
+        call_command('import_photos', 'bob', self.source, *args, processes=2,
+                     stdout=out, stderr=err, **options)
+        return out.getvalue(), err.getvalue()
+
+    def test_import_creates_one_photo_per_distinct_image(self):
+        """Test the copies of one image become one photo, with its header read."""
+        out, err = self.run_import()
+        self.assertIn('Imported 2 photos, 1 already imported, 1 skipped.', out)
+        self.assertIn('notes.txt', err)
+        red = Photo.objects.get(user=self.user, title='red')
+        self.assertEqual((red.width, red.height, red.image_format), (30, 20, 'PNG'))
+        self.assertEqual(red.published, 'PRIVATE')
+        self.assertTrue(red.image.storage.exists(red.image.name))
+
+    def test_import_runs_again_without_duplicates(self):
+        """Test a second run finds every photo already imported."""
+        self.run_import()
+        out, _ = self.run_import()
+        self.assertIn('Imported 0 photos, 3 already imported', out)
+        self.assertEqual(Photo.objects.filter(user=self.user).count(), 2)
+
+    def test_import_maps_folders_to_albums(self):
+        """Test the files of a folder go into an album named after it."""
+        self.run_import('--albums')
+        album = Album.objects.get(user=self.user)
+        self.assertEqual(album.title, 'trip')
+        self.assertEqual(album.photo_count, 2)
+        self.assertIsNotNone(album.cover_id)
+        self.run_import('--albums')
+        self.assertEqual(Album.objects.get(user=self.user).photo_count, 2)
+
+    def test_public_import_is_published_and_restamps_the_feed(self):
+        """Test public imports get a date published and move the feed stamp."""
+        from imager_profile.models import ImagerProfile
+        self.run_import(published='PUBLIC')
+        self.assertFalse(Photo.objects.filter(user=self.user, date_published=None).exists())
+        self.assertIsNotNone(ImagerProfile.objects.get(user=self.user).feed_updated)
+
+    def test_import_needs_an_active_user(self):
+        """Test an unknown user is an error."""
+        from django.core.management import call_command
+        from django.core.management.base import CommandError
+        with self.assertRaises(CommandError):
+            call_command('import_photos', 'nobody', self.source)
+
+
+"""Tests for generating synthetic load data."""
+
+
+@override_settings(MEDIA_ROOT=os.path.join(settings.BASE_DIR, 'test_media_for_load_data'))
+class LoadDataTests(TestCase):
+    """Tests for the generate_load_data command."""
+
+    @classmethod
+    def setUpClass(cls):
+        """Make a test media directory."""
+        super(LoadDataTests, cls).setUpClass()
+        os.system('mkdir {}'.format(
+            os.path.join(settings.BASE_DIR, 'test_media_for_load_data')))
+
+    @classmethod
+    def tearDownClass(cls):
+        """Remove the test directory."""
+        super(LoadDataTests, cls).tearDownClass()
+        os.system('rm -rf {}'.format(
+            os.path.join(settings.BASE_DIR, 'test_media_for_load_data')))
+
+    def setUp(self):
+        """Generate a small seeded data set in batches of ten users."""
+        from django.core.management import call_command
+        from io import StringIO
+        self.out = StringIO()
+        call_command('generate_load_data', users=30, photos=8, albums=2, album_size=4,
+                     tags=50, follows=5, seed=7, batch_size=10, stdout=self.out)
+
+    def test_rows_are_written_for_every_user(self):
+        """Test the users, profiles and photos all arrive, as reported."""
+        from django.contrib.auth.models import User
+        from imager_profile.models import ImagerProfile
+        self.assertEqual(User.objects.filter(username__startswith='load').count(), 30)
+        self.assertEqual(ImagerProfile.objects.count(), 30)
+        self.assertIn('30 users, {} photos'.format(Photo.objects.count()), self.out.getvalue())
+        user = User.objects.filter(username__startswith='load').first()
+        self.assertTrue(user.check_password('password'))
+
+    def test_photos_share_the_placeholder_images(self):
+        """Test every photo points at one of a few stored placeholders."""
+        names = set(Photo.objects.values_list('image', flat=True))
+        self.assertLessEqual(len(names), 6)
+        storage = Photo._meta.get_field('image').storage
+        self.assertTrue(all(storage.exists(name) for name in names))
+
+    def test_stored_aggregates_match_the_rows(self):
+        """Test album, follower and tag counts agree with the links written."""
+        from django.db.models import Count
+        from imager_images.models import TagCount
+        from imager_profile.models import Follow, ImagerProfile
+        for album in Album.objects.annotate(members=Count('photos')):
+            self.assertEqual(album.photo_count, album.members)
+            self.assertIn(album.cover_id, album.photos.values_list('id', flat=True))
+        followers = dict(Follow.objects.values('followed_id').annotate(total=Count('id'))
+                         .values_list('followed_id', 'total'))
+        for profile in ImagerProfile.objects.all():
+            self.assertEqual(profile.follower_count, followers.get(profile.user_id, 0))
+        public = dict(Photo.tags.through.objects.filter(photo__published='PUBLIC')
+                      .values('tag_id').annotate(total=Count('id'))
+                      .values_list('tag_id', 'total'))
+        self.assertEqual(dict(TagCount.objects.values_list('tag_id', 'count')), public)
+
+    def test_photos_are_searchable_and_published_ones_dated(self):
+        """Test the search trigger ran and only public photos have a date published."""
+        self.assertFalse(Photo.objects.filter(search_vector=None).exists())
+        self.assertFalse(Photo.objects.filter(published='PUBLIC', date_published=None).exists())
+        self.assertFalse(Photo.objects.exclude(published='PUBLIC')
+                         .exclude(date_published=None).exists())
@@ -3,12 +3,22 @@ from django.conf.urls import url
 from imager_images import views
 urlpatterns = [
     url(r'^library$', views.LibraryView.as_view(), name='library'),
+    url(r'^library/visibility$', views.VisibilityView.as_view(), name='library_visibility'),
     url(r'^photos$', views.PhotoGalleryView.as_view(), name='photo_gallery'),
     url(r'^albums$', views.AlbumGalleryView.as_view(), name='album_gallery'),
+    url(r'^photos/(?P<board>trending|popular)$', views.RankedGalleryView.as_view(),
+        name='ranked_gallery'),
     url(r'^photos/(?P<id>\d+)$', views.PhotoDetailView.as_view(), name='photo_detail'),
     url(r'^albums/(?P<id>\d+)$', views.AlbumDetailView.as_view(), name='album_detail'),
+    url(r'^photos/picker$', views.PhotoPickerView.as_view(), name='photo_picker'),
     url(r'^photos/add$', views.PhotoCreateView.as_view(), name='photo_create'),
     url(r'^albums/add$', views.AlbumCreateView.as_view(), name='album_create'),
     url(r'^photos/(?P<id>\d+)/edit$', views.PhotoEditView.as_view(), name='photo_edit'),
-    url(r'^albums/(?P<id>\d+)/edit$', views.AlbumEditView.as_view(), name='album_edit')
+    url(r'^albums/(?P<id>\d+)/edit$', views.AlbumEditView.as_view(), name='album_edit'),
+    url(r'^photos/(?P<id>\d+)/favorite$', views.FavoriteView.as_view(), name='photo_favorite'),
+    url(r'^favorites$', views.FavoritesView.as_view(), name='favorites'),
+    url(r'^feed$', views.FeedView.as_view(), name='feed'),
+    url(r'^search$', views.SearchView.as_view(), name='search'),
+    url(r'^derivatives/(?P<id>\d+)/(?P<signature>[0-9a-f]+)/(?P<params>[\w.-]+)$',
+        views.PhotoDerivativeView.as_view(), name='photo_derivative')
 ]
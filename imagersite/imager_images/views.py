@@ -1,12 +1,31 @@
 
 """."""
 from django.conf import settings
+from django.contrib import messages
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.core.paginator import Paginator, PageNotAnInteger, EmptyPage
-from django.http import Http404
-from django.views.generic import CreateView, DetailView, ListView, UpdateView
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse
+from django.shortcuts import get_object_or_404, redirect
+from django.views.generic import CreateView, DetailView, ListView, TemplateView, UpdateView, View
 from django.urls import reverse_lazy
-from imager_images.models import Album, AlbumForm, Photo
+from django.utils.http import urlencode
+from imager_images import derivatives
+from imager_images.counters import record_view
+from imager_images.decoding import DecodeTimedOut
+from imager_images.favorites import (can_favorite, favorite, favorited_ids, read_favorites,
+                                     unfavorite)
+from imager_images.feed import read_feed
+from imager_images.gallery_cache import gallery_version
+from imager_images.models import (Album, AlbumForm, GalleryRank, Photo, PhotoForm,
+                                  VisibilityForm)
+from imager_images.ordering import ordered_photos
+from imager_images.pagination import CountedPaginator
+from imager_images.ranking import ranked_photos
+from imager_images.search import SEARCH_MODELS, search
+from imager_images.sprites import get_sprite
+from imager_images.tags import filter_by_tags, popular_tags, tag_names, user_tags
+from imager_images.visibility import change_visibility, chosen_items
+import os
 
 
 class LibraryView(LoginRequiredMixin, ListView):
@@ -25,7 +44,13 @@ class LibraryView(LoginRequiredMixin, ListView):
         user = self.request.user.get_username()
         context['default_cover'] = settings.STATIC_URL + 'default_cover.thumbnail'
         albums = self.get_queryset(user).order_by('date_uploaded')
-        photos = Photo.objects.filter(user__username=user).order_by('date_uploaded')
+        tags = tag_names(self.request.GET.getlist('tag'))
+        photos = filter_by_tags(Photo.objects.filter(user__username=user),
+                                tags).order_by('date_uploaded')
+        context['tags'] = tags
+        context['tag_list'] = ','.join(tags)
+        context['tag_query'] = ''.join('&' + urlencode({'tag': tag}) for tag in tags)
+        context['user_tags'] = user_tags(self.request.user)
 
         this_album_page = self.request.GET.get("album_page", 1)
         album_pages = Paginator(albums, 4)
@@ -49,15 +74,73 @@ class LibraryView(LoginRequiredMixin, ListView):
             photos_page = photo_pages.page(photo_pages.num_pages)
         context['photos'] = photos_page
 
+        if self.request.GET.get('view') == 'sprite':
+            context['sprite'] = get_sprite(photos_page)
+
         return context
 
 
+class VisibilityView(LoginRequiredMixin, View):
+    """Change the visibility of photos or albums picked in the library."""
+
+    login_url = reverse_lazy('login')
+
+    def post(self, request):
+        """Apply the change, or say why it was refused, and return to the library."""
+        form = VisibilityForm(request.POST)
+        if form.is_valid():
+            change_visibility(chosen_items(request.user, form.cleaned_data),
+                              form.cleaned_data['published'])
+        else:
+            messages.error(request, ' '.join(error for errors in form.errors.values()
+                                             for error in errors))
+        query = urlencode([('tag', tag) for tag in form.cleaned_data.get('tags', [])])
+        return redirect(str(reverse_lazy('library')) + ('?' + query if query else ''))
+
+
 class PhotoGalleryView(ListView):
     """Render all public photo as gallery."""
 
     context_object_name = 'photos'
     template_name = 'imager_images/photo_gallery.html'
-    queryset = Photo.objects.filter(published='PUBLIC')
+    queryset = Photo.active.filter(published='PUBLIC')
+    use_replica = True
+
+    def get_queryset(self):
+        """Limit the photos to those with every tag asked for."""
+        self.tags = tag_names(self.request.GET.getlist('tag'))
+        return filter_by_tags(super(PhotoGalleryView, self).get_queryset(), self.tags)
+
+    def get_context_data(self, **kwargs):
+        """Add the chosen and the most used tags."""
+        context = super(PhotoGalleryView, self).get_context_data(**kwargs)
+        context['tags'] = self.tags
+        context['popular_tags'] = popular_tags()
+        context['gallery_version'] = gallery_version()
+        context['gallery_cache_seconds'] = settings.GALLERY_CACHE_SECONDS
+        return context
+
+
+class RankedGalleryView(ListView):
+    """Render a page of the trending or most viewed public photos."""
+
+    context_object_name = 'ranks'
+    template_name = 'imager_images/ranked_gallery.html'
+    paginate_by = 20
+    use_replica = True
+
+    def get_queryset(self):
+        """Slice the ranks of the board asked for."""
+        return ranked_photos(self.kwargs['board'])
+
+    def get_context_data(self, **kwargs):
+        """Add the board and its title."""
+        context = super(RankedGalleryView, self).get_context_data(**kwargs)
+        context['board'] = self.kwargs['board']
+        context['title'] = dict(GalleryRank.BOARDS)[self.kwargs['board']]
+        context['gallery_version'] = gallery_version()
+        context['gallery_cache_seconds'] = settings.GALLERY_CACHE_SECONDS
+        return context
 
 
 class AlbumGalleryView(ListView):
@@ -65,13 +148,16 @@ class AlbumGalleryView(ListView):
 
     context_object_name = 'albums'
     template_name = 'imager_images/album_gallery.html'
-    queryset = Album.objects.filter(published='PUBLIC')
+    queryset = Album.active.filter(published='PUBLIC').select_related('user')
+    use_replica = True
 
     def get_context_data(self):
         """Get list of public albums add default cover."""
         context = super(AlbumGalleryView, self).get_context_data()
         context['default_cover'] = settings.STATIC_URL + 'default_cover.png'
         context['default_cover_thumb'] = settings.STATIC_URL + 'default_cover.thumbnail'
+        context['gallery_version'] = gallery_version()
+        context['gallery_cache_seconds'] = settings.GALLERY_CACHE_SECONDS
         return context
 
 
@@ -80,6 +166,7 @@ class PhotoDetailView(DetailView):
 
     template_name = 'imager_images/photo_detail.html'
     model = Photo
+    queryset = Photo.active.all()
     pk_url_kwarg = 'id'
 
     def get_object(self):
@@ -88,14 +175,24 @@ class PhotoDetailView(DetailView):
         if photo.published != 'PUBLIC':
             if photo.user.username != self.request.user.get_username():
                 raise Http404('This Photo does not belong to you')
+        record_view('photo', photo.id)
         return photo
 
+    def get_context_data(self, **kwargs):
+        """Add whether the user may favorite the photo and already has."""
+        context = super(PhotoDetailView, self).get_context_data(**kwargs)
+        user = self.request.user
+        context['can_favorite'] = user.is_authenticated and can_favorite(user, self.object)
+        context['favorited'] = self.object.id in favorited_ids(user, [self.object.id])
+        return context
+
 
 class AlbumDetailView(DetailView):
     """Render the Album detail page."""
 
     template_name = 'imager_images/album_detail.html'
     model = Album
+    queryset = Album.active.all()
     pk_url_kwarg = 'id'
 
     def get_context_data(self, **kwargs):
@@ -104,7 +201,7 @@ class AlbumDetailView(DetailView):
         context['default_cover'] = settings.STATIC_URL + 'default_cover.png'
 
         this_page = self.request.GET.get("page", 1)
-        pages = Paginator(self.object.photos.order_by('date_uploaded'), 4)
+        pages = CountedPaginator(ordered_photos(self.object), 4, self.object.photo_count)
 
         try:
             photos_page = pages.page(this_page)
@@ -115,6 +212,9 @@ class AlbumDetailView(DetailView):
 
         context['photos_page'] = photos_page
 
+        if self.request.GET.get('view') == 'sprite':
+            context['sprite'] = get_sprite(photos_page)
+
         return context
 
     def get_object(self):
@@ -123,6 +223,7 @@ class AlbumDetailView(DetailView):
         if album.published != 'PUBLIC':
             if album.user.username != self.request.user.get_username():
                 raise Http404('This album does not belong to you')
+        record_view('album', album.id)
         return album
 
 
@@ -132,7 +233,7 @@ class PhotoCreateView(LoginRequiredMixin, CreateView):
     template_name = 'imager_images/photo_create.html'
     login_url = reverse_lazy('login')
     model = Photo
-    fields = ['title', 'description', 'image', 'published']
+    form_class = PhotoForm
     success_url = reverse_lazy('library')
 
     def form_valid(self, form):
@@ -190,9 +291,145 @@ class PhotoEditView(LoginRequiredMixin, UpdateView):
     login_url = reverse_lazy('login')
     pk_url_kwarg = 'id'
     model = Photo
-    fields = ['title', 'description', 'image', 'published']
+    form_class = PhotoForm
     success_url = reverse_lazy('library')
 
     def get_queryset(self):
         """Limit editable photos to those owned by the user."""
         return Photo.objects.filter(user=self.request.user)
+
+
+class PhotoPickerView(LoginRequiredMixin, View):
+    """List the user's photos as JSON for the photo picker."""
+
+    login_url = reverse_lazy('login')
+    page_size = 24
+
+    def get(self, request):
+        """Return a page of photos newest first, optionally matching ``q``."""
+        photos = Photo.objects.filter(user=request.user).only('id', 'title', 'image')
+        text = request.GET.get('q', '').strip()
+        if text:
+            photos = photos.filter(title__icontains=text)
+        after = request.GET.get('after', '')
+        if after.isdigit():
+            photos = photos.filter(id__lt=int(after))
+        page = list(photos.order_by('-id')[:self.page_size + 1])
+        next_id = page[self.page_size - 1].id if len(page) > self.page_size else None
+        return JsonResponse({
+            'results': [{'id': photo.id, 'title': photo.title,
+                         'thumbnail': derivatives.derivative_url(photo, 100, 100)}
+                        for photo in page[:self.page_size]],
+            'next': next_id,
+        })
+
+
+class PhotoDerivativeView(View):
+    """Serve a resized copy of a photo from signed parameters."""
+
+    def get(self, request, id, signature, params):
+        """Render the derivative on the first request and serve it from disk."""
+        if not derivatives.verify(id, params, signature):
+            raise Http404('Invalid signature')
+        try:
+            parsed = derivatives.parse_params(params)
+        except derivatives.InvalidParams as error:
+            raise Http404(str(error))
+
+        photo = get_object_or_404(Photo.active.only('id', 'image', 'published', 'user'),
+                                  id=id)
+        if photo.published != 'PUBLIC' and photo.user_id != request.user.id:
+            raise Http404('This Photo does not belong to you')
+
+        cache = derivatives.get_cache()
+        path = derivatives.cache_path(photo, params)
+        if cache.get(path) is None:
+            try:
+                image = derivatives.render(photo, parsed)
+            except DecodeTimedOut:
+                response = HttpResponse('Too many images are being resized.', status=503)
+                response['Retry-After'] = str(settings.IMAGE_DECODE_TIMEOUT)
+                return response
+            except (IOError, OSError) as error:
+                raise Http404(str(error))
+            cache.put(path, image, parsed)
+
+        content_type = derivatives.FORMATS[parsed.format][1]
+        if settings.DERIVATIVE_ACCEL_REDIRECT_URL:
+            response = HttpResponse(content_type=content_type)
+            response['X-Accel-Redirect'] = (settings.DERIVATIVE_ACCEL_REDIRECT_URL +
+                                            os.path.relpath(path, cache.root))
+        else:
+            response = FileResponse(open(path, 'rb'), content_type=content_type)
+        response['Cache-Control'] = '{}, max-age=86400'.format(
+            'public' if photo.published == 'PUBLIC' else 'private')
+        return response
+
+
+class FeedView(LoginRequiredMixin, TemplateView):
+    """The newest photos and albums from the photographers the user follows."""
+
+    template_name = 'imager_images/feed.html'
+    login_url = reverse_lazy('login')
+
+    def get_context_data(self, **kwargs):
+        """Get a page of the user's feed."""
+        context = super(FeedView, self).get_context_data(**kwargs)
+        items, next_cursor = read_feed(self.request.user, self.request.GET.get('after'))
+        context['items'] = items
+        context['next_cursor'] = next_cursor
+        context['default_cover'] = settings.STATIC_URL + 'default_cover.thumbnail'
+        return context
+
+
+class FavoriteView(LoginRequiredMixin, View):
+    """Favorite a photo or stop favoriting it."""
+
+    login_url = reverse_lazy('login')
+
+    def post(self, request, id):
+        """Favorite, or unfavorite when ``unfavorite`` is posted, and return to the photo."""
+        photo = get_object_or_404(Photo.active, id=id)
+        if request.POST.get('unfavorite'):
+            unfavorite(request.user, photo)
+        else:
+            favorite(request.user, photo)
+        return redirect('photo_detail', id=id)
+
+
+class FavoritesView(LoginRequiredMixin, TemplateView):
+    """The photos the user has favorited, newest first."""
+
+    template_name = 'imager_images/favorites.html'
+    login_url = reverse_lazy('login')
+
+    def get_context_data(self, **kwargs):
+        """Get a page of the user's favorites."""
+        context = super(FavoritesView, self).get_context_data(**kwargs)
+        photos, next_cursor = read_favorites(self.request.user, self.request.GET.get('after'))
+        context['photos'] = photos
+        context['next_cursor'] = next_cursor
+        return context
+
+
+class SearchView(TemplateView):
+    """Search the titles and descriptions of photos or albums."""
+
+    template_name = 'imager_images/search.html'
+
+    def get_context_data(self, **kwargs):
+        """Get a page of matches visible to the user."""
+        context = super(SearchView, self).get_context_data(**kwargs)
+        text = self.request.GET.get('q', '').strip()
+        kind = self.request.GET.get('type', 'photos')
+        if kind not in SEARCH_MODELS:
+            kind = 'photos'
+        context['query'] = text
+        context['kind'] = kind
+        context['default_cover'] = settings.STATIC_URL + 'default_cover.thumbnail'
+        if text:
+            results, next_cursor = search(text, self.request.user, kind,
+                                          self.request.GET.get('after'))
+            context['results'] = results
+            context['next_cursor'] = next_cursor
+        return context
@@ -0,0 +1,82 @@
+"""Change who can see many photos or albums at once."""
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Coalesce, Now
+from django.utils import timezone
+from imager_images.models import Album, Photo, visibility_changed
+from imager_images.tags import filter_by_tags
+
+
+def chosen_items(user, cleaned_data):
+    """The user's photos or albums picked in a cleaned ``VisibilityForm``.
+
+    With ``everything`` that is all of them, or all photos with the tags.
+    """
+    if cleaned_data['kind'] == 'albums':
+        items = Album.objects.filter(user=user)
+    else:
+        items = filter_by_tags(Photo.objects.filter(user=user), cleaned_data['tags'])
+    if cleaned_data['everything']:
+        return items
+    return items.filter(id__in=cleaned_data['ids'])
+
+
+def apply_visibility(model, rows, published):
+    """Write one batch of ``(id, published, date_published)`` rows, already locked, in one UPDATE.
+
+    Any schedule is cleared, whatever the new state, so a scheduler never
+    publishes what was just hidden. A first publish stamps
+    ``date_published`` as saving would, and ``visibility_changed`` is sent
+    for the batch.
+    """
+    fields = {'published': published, 'date_modified': Now(), 'publish_at': None}
+    first_published = []
+    if published == 'PUBLIC':
+        fields.update(date_published=Coalesce(F('date_published'), Now()))
+        first_published = [pk for pk, _, date_published in rows if date_published is None]
+    model.objects.filter(id__in=[pk for pk, _, _ in rows]).update(**fields)
+    visibility_changed.send(sender=model, published=published,
+                            changes=[(pk, was) for pk, was, _ in rows],
+                            first_published=first_published)
+
+
+def change_visibility(queryset, published, batch_size=500):
+    """Set ``published`` on every row of the queryset and return how many changed.
+
+    Rows change in id order, one transaction per batch, so no lock is held
+    for long. Rows already in the state are skipped unless they have a
+    schedule to clear.
+    """
+    model = queryset.model
+    pending = (queryset.exclude(published=published, publish_at=None)
+               .order_by('id').values_list('id', flat=True))
+    changed = 0
+    last_id = 0
+    while True:
+        ids = list(pending.filter(id__gt=last_id)[:batch_size])
+        if not ids:
+            return changed
+        last_id = ids[-1]
+        with transaction.atomic():
+            rows = list(model.objects.filter(id__in=ids)
+                        .exclude(published=published, publish_at=None)
+                        .select_for_update()
+                        .values_list('id', 'published', 'date_published'))
+            apply_visibility(model, rows, published)
+        changed += len(rows)
+
+
+def publish_due(model, batch_size=500):
+    """Publish one batch of items whose ``publish_at`` has passed and return how many.
+
+    Due rows are claimed with ``FOR UPDATE SKIP LOCKED``, so schedulers
+    running at the same time each take different rows.
+    """
+    with transaction.atomic():
+        rows = list(model.objects.filter(publish_at__lte=timezone.now())
+                    .order_by('publish_at')
+                    .select_for_update(skip_locked=True)
+                    .values_list('id', 'published', 'date_published')[:batch_size])
+        if rows:
+            apply_visibility(model, rows, 'PUBLIC')
+    return len(rows)
@@ -0,0 +1,61 @@
+"""Form widgets for choosing among a user's photos."""
+from django import forms
+from django.urls import reverse_lazy
+
+
+class PhotoPickerWidget(forms.Widget):
+    """Pick photos from a searchable, paged list loaded as JSON.
+
+    Only the chosen photos are rendered with the form, so the page stays
+    small however many photos the user owns.
+    """
+
+    template_name = 'imager_images/widgets/photo_picker.html'
+
+    class Media:
+        js = ('photo_picker.js',)
+
+    def __init__(self, multiple=False, attrs=None):
+        """Choose many photos, or at most one if not ``multiple``."""
+        super(PhotoPickerWidget, self).__init__(attrs)
+        self.multiple = multiple
+        self.choices = ()
+
+    def format_value(self, value):
+        """The chosen ids as a list of strings."""
+        if value is None or value == '':
+            return []
+        if not isinstance(value, (list, tuple)):
+            value = [value]
+        return [str(getattr(item, 'pk', item)) for item in value if item not in (None, '')]
+
+    def get_context(self, name, value, attrs):
+        """Add the chosen photos and the URL of the photo list.
+
+        The chosen photos are looked up in the field's queryset, which a
+        model choice field hands its widget as ``choices``, so ids of
+        photos the form does not offer are never rendered.
+        """
+        from imager_images.models import Photo
+        context = super(PhotoPickerWidget, self).get_context(name, value, attrs)
+        ids = [int(pk) for pk in context['widget']['value'] if pk.isdigit()]
+        photos = getattr(self.choices, 'queryset', Photo.objects.none())
+        context['widget'].update({
+            'multiple': self.multiple,
+            'source': reverse_lazy('photo_picker'),
+            'selected': photos.filter(id__in=ids).only('id', 'title') if ids else [],
+        })
+        return context
+
+    def value_from_datadict(self, data, files, name):
+        """The submitted ids."""
+        if not self.multiple:
+            return data.get(name)
+        try:
+            return data.getlist(name)
+        except AttributeError:
+            return data.get(name)
+
+    def value_omitted_from_data(self, data, files, name):
+        """An unchecked multiple picker submits nothing, which means none chosen."""
+        return not self.multiple and name not in data
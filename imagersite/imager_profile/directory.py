@@ -0,0 +1,30 @@
+"""Finding photographers by what they offer, where and for how much."""
+from imager_profile.models import ImagerProfile
+
+
+def find_photographers(filters, after=None, limit=20):
+    """Return a page of matching profiles by username and the cursor for the next page.
+
+    ``filters`` is a cleaned ``DirectoryForm``. Services and photostyles
+    must all be offered and are matched through the GIN indexed arrays;
+    pages continue from the last username seen rather than by offset.
+    """
+    profiles = ImagerProfile.active.select_related('user').order_by('user__username')
+    if filters.get('services'):
+        profiles = profiles.filter(service_list__contains=filters['services'])
+    if filters.get('photostyles'):
+        profiles = profiles.filter(photostyle_list__contains=filters['photostyles'])
+    if filters.get('camera'):
+        profiles = profiles.filter(camera=filters['camera'])
+    if filters.get('fee_min') is not None:
+        profiles = profiles.filter(fee__gte=filters['fee_min'])
+    if filters.get('fee_max') is not None:
+        profiles = profiles.filter(fee__lte=filters['fee_max'])
+    if filters.get('location'):
+        profiles = profiles.filter(location__istartswith=filters['location'].strip())
+    if after:
+        profiles = profiles.filter(user__username__gt=after)
+
+    page = list(profiles[:limit + 1])
+    next_cursor = page[limit - 1].user.username if len(page) > limit else None
+    return page[:limit], next_cursor
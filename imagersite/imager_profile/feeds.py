@@ -0,0 +1,115 @@
+"""Atom and RSS feeds of each user's newest public photos and albums."""
+from itertools import chain
+
+from django.conf import settings
+from django.contrib.syndication.views import Feed
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils.feedgenerator import Atom1Feed, Rss201rev2Feed
+from django.views.decorators.http import condition
+from imager_images.models import Album, Photo
+from imager_profile.models import ImagerProfile
+
+ITEM_URLS = {Photo: 'photo_detail', Album: 'album_detail'}
+
+
+def newest_public_items(user_id, limit):
+    """The user's ``limit`` newest public photos and albums, newest first.
+
+    Each model is read through its partial ``(user_id, date_published)``
+    index, so only the rows returned are touched.
+    """
+    items = chain.from_iterable(
+        model.objects.filter(user_id=user_id, published='PUBLIC',
+                             date_published__isnull=False)
+        .order_by('-date_published')[:limit]
+        for model in ITEM_URLS)
+    return sorted(items, key=lambda item: item.date_published, reverse=True)[:limit]
+
+
+def feed_updated(request, username):
+    """The feed stamp of an active user's profile, read once per request."""
+    stamps = request.__dict__.setdefault('_feed_updated', {})
+    if username not in stamps:
+        stamps[username] = (ImagerProfile.active.filter(user__username=username)
+                            .values_list('feed_updated', flat=True).first())
+    return stamps[username]
+
+
+class ProfileAtomFeed(Feed):
+    """The newest public photos and albums of one user, as Atom."""
+
+    feed_type = Atom1Feed
+
+    def __call__(self, request, *args, **kwargs):
+        """Render the feed, leaving ``Last-Modified`` to the profile's stamp."""
+        response = super(ProfileAtomFeed, self).__call__(request, *args, **kwargs)
+        if response.has_header('Last-Modified'):
+            del response['Last-Modified']
+        return response
+
+    def get_object(self, request, username):
+        """The profile of the active user whose feed it is."""
+        return get_object_or_404(ImagerProfile.active.select_related('user'),
+                                 user__username=username)
+
+    def title(self, obj):
+        """The feed title."""
+        return '{} on Imager'.format(obj.user.username)
+
+    def link(self, obj):
+        """The profile page."""
+        return reverse('profile', kwargs={'username': obj.user.username})
+
+    def description(self, obj):
+        """The feed description."""
+        return 'The newest public photos and albums of {}.'.format(obj.user.username)
+
+    subtitle = description
+
+    def items(self, obj):
+        """The user's newest public photos and albums."""
+        return newest_public_items(obj.user_id, settings.PROFILE_FEED_ITEMS)
+
+    def item_title(self, item):
+        """The title of a photo or album."""
+        return item.title
+
+    def item_description(self, item):
+        """The description of a photo or album."""
+        return item.description or ''
+
+    def item_link(self, item):
+        """The page of a photo or album."""
+        return reverse(ITEM_URLS[type(item)], kwargs={'id': item.id})
+
+    def item_pubdate(self, item):
+        """When a photo or album was first published."""
+        return item.date_published
+
+    def item_updateddate(self, item):
+        """When a photo or album was last changed."""
+        return item.date_modified
+
+
+class ProfileRssFeed(ProfileAtomFeed):
+    """The newest public photos and albums of one user, as RSS."""
+
+    feed_type = Rss201rev2Feed
+
+
+def conditional(feed, name):
+    """The feed view, answering polls from the profile's stamp alone when nothing changed.
+
+    Its ETag and ``Last-Modified`` both come from the stamp, so a poll
+    with a current one gets a 304 without reading any photo or album.
+    """
+    def etag(request, username):
+        """The ETag of the feed, which changes with the stamp."""
+        stamp = feed_updated(request, username)
+        return stamp and '{}-{}-{}'.format(name, username, int(stamp.timestamp()))
+    return condition(etag_func=etag, last_modified_func=feed_updated)(feed)
+
+
+atom_feed = conditional(ProfileAtomFeed(), 'atom')
+rss_feed = conditional(ProfileRssFeed(), 'rss')
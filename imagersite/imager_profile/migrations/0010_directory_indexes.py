@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-19 14:04
+from __future__ import unicode_literals
+
+import django.contrib.postgres.fields
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('imager_profile', '0009_accounttombstone'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='imagerprofile',
+            name='photostyle_list',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.CharField(max_length=20), blank=True, default=list, editable=False, size=None),
+        ),
+        migrations.AddField(
+            model_name='imagerprofile',
+            name='service_list',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.CharField(max_length=20), blank=True, default=list, editable=False, size=None),
+        ),
+        migrations.AddIndex(
+            model_name='imagerprofile',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['service_list'], name='imager_prof_service_6e992a_gin'),
+        ),
+        migrations.AddIndex(
+            model_name='imagerprofile',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['photostyle_list'], name='imager_prof_photost_7a2b37_gin'),
+        ),
+        migrations.AddIndex(
+            model_name='imagerprofile',
+            index=models.Index(fields=['camera'], name='imager_prof_camera_550c57_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='imagerprofile',
+            index=models.Index(fields=['fee'], name='imager_prof_fee_0bd20b_idx'),
+        ),
+        migrations.RunSQL(
+            "UPDATE imager_profile_imagerprofile "
+            "SET service_list = COALESCE(string_to_array(services, ','), '{}'), "
+            "photostyle_list = COALESCE(string_to_array(photostyles, ','), '{}');",
+            migrations.RunSQL.noop,
+        ),
+        migrations.RunSQL(
+            'CREATE INDEX imager_profile_location_prefix '
+            'ON imager_profile_imagerprofile (UPPER(location::text) text_pattern_ops);',
+            'DROP INDEX imager_profile_location_prefix;',
+        ),
+    ]
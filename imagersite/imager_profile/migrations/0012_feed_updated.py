@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-19 14:33
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('imager_images', '0019_public_feed_indexes'),
+        ('imager_profile', '0011_follow'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='imagerprofile',
+            name='feed_updated',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunSQL(
+            'UPDATE imager_profile_imagerprofile AS profile SET feed_updated = greatest('
+            "(SELECT max(date_modified) FROM imager_images_photo WHERE user_id = profile.user_id "
+            "AND published = 'PUBLIC'), "
+            "(SELECT max(date_modified) FROM imager_images_album WHERE user_id = profile.user_id "
+            "AND published = 'PUBLIC'));",
+            migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-19 15:49
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import imager_profile.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('imager_profile', '0013_account_exports'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='accountexport',
+            name='archive',
+            field=models.FileField(blank=True, storage=imager_profile.storage.ExportStorage(), upload_to=''),
+        ),
+    ]
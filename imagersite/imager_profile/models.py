@@ -1,9 +1,16 @@
 """Profile for an User."""
 from django import forms
-from django.db import models
+from django.apps import apps
 from django.contrib.auth.models import User
+from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex
+from django.db import models, transaction
 from django.dispatch import receiver
 from django.forms import ModelForm
+from imager_images.gallery_cache import invalidate_galleries
+from imager_profile.storage import ExportStorage
+from imagersite.kept_fields import KeptFieldsMixin
+from imagersite.sitemap_cache import invalidate_shards
 from multiselectfield import MultiSelectField
 
 
@@ -16,7 +23,7 @@ class ActiveImagerProfileManager(models.Manager):
         return all_profiles.filter(user__is_active=True)
 
 
-class ImagerProfile(models.Model):
+class ImagerProfile(KeptFieldsMixin, models.Model):
     """Profile for a user of Imager."""
 
     user = models.OneToOneField(User, related_name='profile')
@@ -49,6 +56,22 @@ class ImagerProfile(models.Model):
                  ('3d', '3D'),
                  ('artistic', 'Artistic'),
                  ('underwater', 'Underwater')))
+    service_list = ArrayField(models.CharField(max_length=20), default=list,
+                              blank=True, editable=False)
+    photostyle_list = ArrayField(models.CharField(max_length=20), default=list,
+                                 blank=True, editable=False)
+    follower_count = models.PositiveIntegerField(default=0, editable=False)
+    feed_updated = models.DateTimeField(blank=True, null=True, editable=False)
+
+    KEPT_FIELDS = ('follower_count', 'feed_updated')
+
+    class Meta:
+        """Meta."""
+
+        indexes = [GinIndex(fields=['service_list']),
+                   GinIndex(fields=['photostyle_list']),
+                   models.Index(fields=['camera']),
+                   models.Index(fields=['fee'])]
 
     @property
     def is_active(self):
@@ -60,6 +83,24 @@ class ImagerProfile(models.Model):
         return 'Profile: ' + self.user.username
 
 
+class Follow(models.Model):
+    """A user following a photographer's new photos and albums."""
+
+    follower = models.ForeignKey(User, on_delete=models.CASCADE, related_name='following')
+    followed = models.ForeignKey(User, on_delete=models.CASCADE, related_name='followers')
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        """Meta."""
+
+        unique_together = ('follower', 'followed')
+        indexes = [models.Index(fields=['followed', 'follower'])]
+
+    def __str__(self):
+        """The string from of the follow."""
+        return self.follower.username + ' follows ' + self.followed.username
+
+
 @receiver(models.signals.post_save, sender=User)
 def create_profile(sender, **kwargs):
     """Create a new profile when a User is created."""
@@ -68,6 +109,111 @@ def create_profile(sender, **kwargs):
         profile.save()
 
 
+def choice_list(value):
+    """The sorted choices of a MultiSelectField value, saved or just assigned."""
+    if not value:
+        return []
+    if isinstance(value, str):
+        value = value.split(',')
+    return sorted(set(value))
+
+
+@receiver(models.signals.pre_save, sender=ImagerProfile)
+def index_profile_choices(sender, instance, **kwargs):
+    """Copy services and photostyles into the indexed array columns."""
+    instance.service_list = choice_list(instance.services)
+    instance.photostyle_list = choice_list(instance.photostyles)
+
+
+@receiver(models.signals.post_save, sender=Follow)
+def count_new_follower(sender, instance, created, **kwargs):
+    """Add a new follow to the followed user's follower count."""
+    if created:
+        ImagerProfile.objects.filter(user_id=instance.followed_id).update(
+            follower_count=models.F('follower_count') + 1)
+
+
+@receiver(models.signals.post_delete, sender=Follow)
+def uncount_follower(sender, instance, **kwargs):
+    """Remove an ended follow from the followed user's follower count."""
+    ImagerProfile.objects.filter(user_id=instance.followed_id).update(
+        follower_count=models.F('follower_count') - 1)
+
+
+@receiver(models.signals.post_save, sender=ImagerProfile)
+@receiver(models.signals.post_delete, sender=ImagerProfile)
+def forget_sitemap_shard(sender, instance, **kwargs):
+    """Drop the cached sitemap shard of a changed profile."""
+    invalidate_shards('profiles', [instance.id])
+
+
+class AccountTombstone(models.Model):
+    """A deleted account whose rows and files are still being removed."""
+
+    user_id = models.IntegerField(unique=True)
+    username = models.CharField(max_length=150)
+    requested = models.DateTimeField(auto_now_add=True)
+    completed = models.DateTimeField(blank=True, null=True)
+    photos_deleted = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        """The string from of the tombstone."""
+        return 'Deleted account: ' + self.username
+
+
+class AccountExport(models.Model):
+    """A copy of everything in an account, built into a ZIP in media storage.
+
+    The export worker claims a job by stamping ``heartbeat`` and keeps
+    stamping it while it writes, so a job whose worker died is claimed
+    again once the stamp is old.
+    """
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='exports')
+    requested = models.DateTimeField(auto_now_add=True)
+    page_url = models.URLField()
+    heartbeat = models.DateTimeField(blank=True, null=True)
+    completed = models.DateTimeField(blank=True, null=True)
+    failed = models.BooleanField(default=False)
+    archive = models.FileField(blank=True, storage=ExportStorage())
+    size = models.BigIntegerField(default=0)
+    photo_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        """Meta."""
+
+        indexes = [models.Index(fields=['user', 'requested'])]
+
+    def __str__(self):
+        """The string from of the export."""
+        return 'Export: ' + self.user.username
+
+    @property
+    def pending(self):
+        """Whether the archive is still to be built."""
+        return not (self.completed or self.failed)
+
+
+def delete_account(user):
+    """Deactivate the user now and leave the rest to the reaper.
+
+    Deactivating hides the account's profile, photos and albums and stops
+    it logging in, without touching any of its rows. No receiver sees the
+    update, so the cached galleries and the sitemap shards of the account's
+    profile, photos and albums are dropped here.
+    """
+    with transaction.atomic():
+        User.objects.filter(id=user.id).update(is_active=False)
+        AccountTombstone.objects.get_or_create(
+            user_id=user.id, defaults={'username': user.username})
+    invalidate_shards('profiles', ImagerProfile.objects.filter(user_id=user.id)
+                      .values_list('id', flat=True))
+    for section, model in (('photos', 'photo'), ('albums', 'album')):
+        invalidate_shards(section, apps.get_model('imager_images', model).objects
+                          .filter(user_id=user.id).values_list('id', flat=True).iterator())
+    invalidate_galleries()
+
+
 class ImagerProfileForm(ModelForm):
     """Form for an ImagerProfile."""
 
@@ -95,3 +241,23 @@ class ImagerProfileForm(ModelForm):
         self.fields['email'].initial = User.objects.get(username=username).email
         self.fields['first_name'].initial = User.objects.get(username=username).first_name
         self.fields['last_name'].initial = User.objects.get(username=username).last_name
+
+
+class DirectoryForm(forms.Form):
+    """Filters for the photographer directory."""
+
+    services = forms.MultipleChoiceField(
+        choices=ImagerProfile._meta.get_field('services').choices,
+        required=False, widget=forms.CheckboxSelectMultiple)
+    photostyles = forms.MultipleChoiceField(
+        choices=ImagerProfile._meta.get_field('photostyles').choices,
+        required=False, widget=forms.CheckboxSelectMultiple)
+    camera = forms.ChoiceField(
+        choices=[('', 'Any camera')] + list(ImagerProfile._meta.get_field('camera').choices),
+        required=False)
+    fee_min = forms.DecimalField(required=False, min_value=0, max_digits=10,
+                                 decimal_places=2)
+    fee_max = forms.DecimalField(required=False, min_value=0, max_digits=10,
+                                 decimal_places=2)
+    location = forms.CharField(required=False, max_length=180,
+                               help_text='The start of a location, like Seattle.')
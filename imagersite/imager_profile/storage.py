@@ -0,0 +1,59 @@
+"""Where account archives are kept, away from the public media."""
+from django.conf import settings
+from django.core.files.storage import get_storage_class, Storage
+from django.utils.deconstruct import deconstructible
+
+
+@deconstructible
+class ExportStorage(Storage):
+    """The storage named by ACCOUNT_EXPORT_STORAGE, looked up on each use.
+
+    Archives hold a user's email, profile and private originals, so they
+    are never public: on S3 they are written private and handed out by
+    short-lived signed URLs, and elsewhere they are streamed by a view
+    that checks the owner. The field keeps this class rather than the
+    storage, so migrations do not depend on the settings.
+    """
+
+    @property
+    def storage(self):
+        """The configured storage."""
+        return get_storage_class(settings.ACCOUNT_EXPORT_STORAGE)(
+            **settings.ACCOUNT_EXPORT_STORAGE_OPTIONS)
+
+    @property
+    def signs_urls(self):
+        """Whether ``url`` gives a signed link that expires."""
+        return getattr(self.storage, 'querystring_auth', False)
+
+    def _open(self, name, mode='rb'):
+        """Open the stored file."""
+        return self.storage.open(name, mode)
+
+    def _save(self, name, content):
+        """Save the file and return the name it was saved as."""
+        return self.storage.save(name, content)
+
+    def get_available_name(self, name, max_length=None):
+        """A free name close to ``name``."""
+        return self.storage.get_available_name(name, max_length)
+
+    def path(self, name):
+        """The local path of the file, where there is one."""
+        return self.storage.path(name)
+
+    def delete(self, name):
+        """Delete the file."""
+        self.storage.delete(name)
+
+    def exists(self, name):
+        """Whether the file exists."""
+        return self.storage.exists(name)
+
+    def size(self, name):
+        """The size of the file in bytes."""
+        return self.storage.size(name)
+
+    def url(self, name):
+        """The URL of the file."""
+        return self.storage.url(name)
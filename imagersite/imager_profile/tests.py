@@ -496,3 +496,118 @@ class ProfileRoutingTests(TestCase):
         data = {}
         response = self.client.post(reverse_lazy('profile_edit'), data)
         self.assertIn(b'class="errorlist"', response.content)
+
+
+"""Tests for deleting an account."""
+
+
+class AccountDeleteTests(TestCase):
+    """Tests for the account delete view."""
+
+    def setUp(self):
+        """Add one user."""
+        user = UserFactory(username='bob')
+        user.set_password('password')
+        user.save()
+
+    def test_account_delete_get_asks_to_confirm(self):
+        """Test that the delete page shows a confirmation form."""
+        self.client.login(username='bob', password='password')
+        response = self.client.get(reverse_lazy('account_delete'))
+        self.assertIn(b'Delete my account', response.content)
+
+    def test_account_delete_not_logged_in_redirects(self):
+        """Test that the delete page requires a login."""
+        response = self.client.get(reverse_lazy('account_delete'))
+        self.assertEqual(response.status_code, 302)
+
+    def test_account_delete_post_deactivates_and_logs_out(self):
+        """Test that deleting deactivates the user and records a tombstone."""
+        from imager_profile.models import AccountTombstone
+        self.client.login(username='bob', password='password')
+        response = self.client.post(reverse_lazy('account_delete'))
+        self.assertRedirects(response, reverse_lazy('home'))
+        self.assertFalse(User.objects.get(username='bob').is_active)
+        self.assertTrue(AccountTombstone.objects.filter(username='bob').exists())
+        self.assertNotIn('_auth_user_id', self.client.session)
+
+    def test_deleted_account_profile_is_not_found(self):
+        """Test that a deleted account's profile page is gone."""
+        self.client.login(username='bob', password='password')
+        self.client.post(reverse_lazy('account_delete'))
+        response = self.client.get(reverse_lazy('profile', kwargs={'username': 'bob'}))
+        self.assertEqual(response.status_code, 404)
+
+
+"""Tests for the photographer directory."""
+
+
+class DirectoryTests(TestCase):
+    """Tests for finding photographers."""
+
+    def setUp(self):
+        """Add three photographers with different offers."""
+        offers = [('ann', ['weddings', 'portraits'], ['blackandwhite'], 'DSLR', 400, 'Seattle, WA'),
+                  ('ben', ['weddings'], ['night'], 'DSLR', 300, 'Seattle, WA'),
+                  ('cat', ['weddings'], ['blackandwhite', 'macro'], 'M', 800, 'Portland, OR')]
+        for username, services, styles, camera, fee, location in offers:
+            user = UserFactory(username=username)
+            user.save()
+            profile = user.profile
+            profile.services = services
+            profile.photostyles = styles
+            profile.camera = camera
+            profile.fee = fee
+            profile.location = location
+            profile.save()
+
+    def test_saving_profile_fills_the_indexed_arrays(self):
+        """Test that services and photostyles are copied to the array columns."""
+        profile = ImagerProfile.objects.get(user__username='cat')
+        self.assertEqual(profile.service_list, ['weddings'])
+        self.assertEqual(profile.photostyle_list, ['blackandwhite', 'macro'])
+
+    def test_find_photographers_combines_filters(self):
+        """Test that services, styles and a fee range all apply."""
+        from imager_profile.directory import find_photographers
+        profiles, next_cursor = find_photographers({
+            'services': ['weddings'], 'photostyles': ['blackandwhite'],
+            'fee_max': 500})
+        self.assertEqual([profile.user.username for profile in profiles], ['ann'])
+        self.assertIsNone(next_cursor)
+
+    def test_find_photographers_pages_by_username(self):
+        """Test that pages continue after the last username."""
+        from imager_profile.directory import find_photographers
+        profiles, next_cursor = find_photographers({'location': 'seattle'}, limit=1)
+        self.assertEqual([profile.user.username for profile in profiles], ['ann'])
+        profiles, next_cursor = find_photographers({'location': 'seattle'},
+                                                   after=next_cursor, limit=1)
+        self.assertEqual([profile.user.username for profile in profiles], ['ben'])
+        self.assertIsNone(next_cursor)
+
+    def test_directory_leaves_out_inactive_users(self):
+        """Test that deactivated accounts are not listed."""
+        User.objects.filter(username='ann').update(is_active=False)
+        response = self.client.get(reverse_lazy('directory'), {'services': 'weddings'})
+        self.assertNotIn(b'>ann<', response.content)
+        self.assertIn(b'>ben<', response.content)
+
+    def test_directory_route_filters_by_camera(self):
+        """Test the directory page lists only photographers with the camera."""
+        response = self.client.get(reverse_lazy('directory'), {'camera': 'M'})
+        self.assertIn(b'>cat<', response.content)
+        self.assertNotIn(b'>ben<', response.content)
+
+    def test_photographers_api_lists_matches(self):
+        """Test the API returns matching profiles with their offers."""
+        response = self.client.get(reverse_lazy('api_photographers'),
+                                   {'photostyles': 'night'})
+        self.assertEqual(response.json()['results'][0]['username'], 'ben')
+        self.assertEqual(response.json()['results'][0]['services'], ['weddings'])
+
+    def test_photographers_api_rejects_unknown_service(self):
+        """Test the API gets a 400 status code for an unknown service."""
+        response = self.client.get(reverse_lazy('api_photographers'),
+                                   {'services': 'skydiving'})
+        self.assertEqual(response.status_code, 400)
@@ -1,8 +1,19 @@
 """."""
 from django.conf.urls import url
-from imager_profile.views import ProfileView, ProfileEditView
+from imager_profile.feeds import atom_feed, rss_feed
+from imager_profile.views import (AccountDeleteView, AccountExportDownloadView,
+                                   AccountExportView, DirectoryView, FollowView, ProfileView,
+                                   ProfileEditView)
 
 urlpatterns = [
+    url(r'^delete$', AccountDeleteView.as_view(), name='account_delete'),
+    url(r'^export$', AccountExportView.as_view(), name='account_export'),
+    url(r'^export/(?P<id>\d+)$', AccountExportDownloadView.as_view(),
+        name='account_export_download'),
+    url(r'^directory$', DirectoryView.as_view(), name='directory'),
     url(r'^edit$', ProfileEditView.as_view(), name='profile_edit'),
+    url(r'^(?P<username>[\w.@+-]+)/follow$', FollowView.as_view(), name='follow'),
+    url(r'^(?P<username>[\w.@+-]+)/atom$', atom_feed, name='profile_atom'),
+    url(r'^(?P<username>[\w.@+-]+)/rss$', rss_feed, name='profile_rss'),
     url(r'^(?P<username>.*)$', ProfileView.as_view(), name='profile')
 ]
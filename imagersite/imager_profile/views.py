@@ -1,9 +1,17 @@
 """View functions for the profile page."""
+from django.conf import settings
+from django.contrib.auth import logout
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.shortcuts import redirect
-from django.views.generic import DetailView, UpdateView
-from django.urls import reverse_lazy
-from imager_profile.models import ImagerProfile, ImagerProfileForm
+from django.contrib.auth.models import User
+from django.http import FileResponse, Http404
+from django.shortcuts import get_object_or_404, redirect
+from django.views.generic import DetailView, TemplateView, UpdateView, View
+from django.urls import reverse, reverse_lazy
+from imager_profile.directory import find_photographers
+from imager_profile.models import (AccountExport, DirectoryForm, Follow, ImagerProfile,
+                                   ImagerProfileForm, delete_account)
+from imager_images.exports import request_export
+from imager_images.feed import follow, unfollow
 from imager_images.models import Album, Photo
 
 
@@ -12,8 +20,10 @@ class ProfileView(DetailView):
 
     template_name = 'imager_profile/profile.html'
     model = ImagerProfile
+    queryset = ImagerProfile.active.all()
     slug_field = 'user__username'
     slug_url_kwarg = 'username'
+    use_replica = True
 
     def get(self, *args, **kwargs):
         """Redirect home if not logged in."""
@@ -36,6 +46,10 @@ class ProfileView(DetailView):
             owner = True
 
         context['owner'] = owner
+        context['following'] = (
+            self.request.user.is_authenticated and not owner and
+            Follow.objects.filter(follower=self.request.user,
+                                  followed=kwargs['object'].user).exists())
 
         photos = Photo.objects.filter(user__username=username)
         albums = Album.objects.filter(user__username=username)
@@ -89,3 +103,94 @@ class ProfileEditView(LoginRequiredMixin, UpdateView):
         form.instance.user.last_name = form.data['last_name']
         form.instance.user.save()
         return super(ProfileEditView, self).form_valid(form)
+
+
+class AccountDeleteView(LoginRequiredMixin, TemplateView):
+    """Confirm and delete the current user's account."""
+
+    template_name = 'imager_profile/account_delete.html'
+    login_url = reverse_lazy('login')
+
+    def post(self, request, *args, **kwargs):
+        """Deactivate the account, log out and leave the cleanup to the reaper."""
+        delete_account(request.user)
+        logout(request)
+        return redirect('home')
+
+
+class AccountExportView(LoginRequiredMixin, TemplateView):
+    """Request a copy of the current user's account and download finished ones."""
+
+    template_name = 'imager_profile/account_export.html'
+    login_url = reverse_lazy('login')
+
+    def get_context_data(self, **kwargs):
+        """Get the user's latest exports."""
+        context = super(AccountExportView, self).get_context_data(**kwargs)
+        context['exports'] = self.request.user.exports.order_by('-requested')[:10]
+        context['days'] = settings.ACCOUNT_EXPORT_DAYS
+        return context
+
+    def post(self, request, *args, **kwargs):
+        """Queue an export for the export worker and return to the list."""
+        request_export(request.user, request.build_absolute_uri(reverse('account_export')))
+        return redirect('account_export')
+
+
+class AccountExportDownloadView(LoginRequiredMixin, View):
+    """Hand a finished archive to the user it belongs to."""
+
+    login_url = reverse_lazy('login')
+
+    def get(self, request, id):
+        """Redirect to a signed, expiring URL where the storage gives one, or stream the file."""
+        export = get_object_or_404(AccountExport, id=id, user=request.user,
+                                   completed__isnull=False)
+        if not export.archive:
+            raise Http404('This export has expired')
+        storage = export.archive.storage
+        if storage.signs_urls:
+            return redirect(storage.url(export.archive.name))
+        response = FileResponse(storage.open(export.archive.name),
+                                content_type='application/zip')
+        response['Content-Disposition'] = 'attachment; filename="imager-{}.zip"'.format(
+            request.user.username)
+        return response
+
+
+class DirectoryView(TemplateView):
+    """List photographers matching the chosen services, styles, camera, fee and place."""
+
+    template_name = 'imager_profile/directory.html'
+    use_replica = True
+
+    def get_context_data(self, **kwargs):
+        """Get a page of matching profiles."""
+        context = super(DirectoryView, self).get_context_data(**kwargs)
+        form = DirectoryForm(self.request.GET)
+        profiles, next_cursor = [], None
+        if form.is_valid():
+            profiles, next_cursor = find_photographers(
+                form.cleaned_data, self.request.GET.get('after'))
+        query = self.request.GET.copy()
+        query.pop('after', None)
+        context['form'] = form
+        context['profiles'] = profiles
+        context['next_cursor'] = next_cursor
+        context['filter_query'] = query.urlencode()
+        return context
+
+
+class FollowView(LoginRequiredMixin, View):
+    """Follow or stop following a photographer."""
+
+    login_url = reverse_lazy('login')
+
+    def post(self, request, username):
+        """Follow, or unfollow when ``unfollow`` is posted, and return to the profile."""
+        followed = get_object_or_404(User, username=username, is_active=True)
+        if request.POST.get('unfollow'):
+            unfollow(request.user, followed)
+        else:
+            follow(request.user, followed)
+        return redirect('profile', username=username)
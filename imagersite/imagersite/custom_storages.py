@@ -13,3 +13,19 @@ class MediaStorage(S3BotoStorage):
     """Custom storage class for media files."""
 
     location = settings.MEDIAFILES_LOCATION
+
+
+class PrivateMediaStorage(S3BotoStorage):
+    """Storage class for media files only their owner may download.
+
+    Files are written private and their URLs are signed on the bucket's
+    own domain, as a custom domain would give unsigned ones, and expire
+    after five minutes.
+    """
+
+    location = settings.MEDIAFILES_LOCATION
+    default_acl = 'private'
+    custom_domain = None
+    querystring_auth = True
+    querystring_expire = 300
+    file_overwrite = False
@@ -0,0 +1,24 @@
+"""Saving models whose counters and stamps are written by bulk updates alone."""
+
+
+class KeptFieldsMixin(object):
+    """Leave the model's ``KEPT_FIELDS`` out of the UPDATE that saves an existing row.
+
+    Signals and batch jobs keep those columns with single UPDATEs, so a
+    copy loaded before one of them ran must not write its stale values
+    back. New rows, deferred fields and ``update_fields`` given by the
+    caller are saved as Django always does.
+    """
+
+    KEPT_FIELDS = ()
+
+    def save(self, *args, **kwargs):
+        """Save the row, naming every loaded field but the kept ones if it exists."""
+        if (self.pk is not None and not self._state.adding and
+                not kwargs.get('force_insert') and kwargs.get('update_fields') is None):
+            deferred = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.KEPT_FIELDS and
+                field.attname not in deferred]
+        super(KeptFieldsMixin, self).save(*args, **kwargs)
@@ -0,0 +1,37 @@
+"""Request middleware for the Imager site."""
+from django.conf import settings
+from imagersite.routers import read_from_replica
+
+PIN_COOKIE = 'pin_primary'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class ReplicaMiddleware(object):
+    """Let views marked ``use_replica`` read from a replica.
+
+    After a request that writes, the client reads from the primary for
+    REPLICA_STICKY_SECONDS, so it sees its own changes.
+    """
+
+    def __init__(self, get_response):
+        """Keep the next handler."""
+        self.get_response = get_response
+
+    def __call__(self, request):
+        """Route the request's reads and pin clients that just wrote."""
+        try:
+            response = self.get_response(request)
+        finally:
+            read_from_replica(False)
+        if request.method not in SAFE_METHODS:
+            response.set_cookie(PIN_COOKIE, '1', max_age=settings.REPLICA_STICKY_SECONDS,
+                                httponly=True)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        """Read from a replica if the view allows it and the client is not pinned."""
+        view_class = getattr(view_func, 'view_class', None)
+        read_from_replica(
+            getattr(view_class, 'use_replica', False) and
+            request.method in SAFE_METHODS and
+            PIN_COOKIE not in request.COOKIES)
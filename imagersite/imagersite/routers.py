@@ -0,0 +1,90 @@
+"""Send the reads of replica-safe views to read replicas."""
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.db import connections, DatabaseError
+
+LAG_QUERY = """
+SELECT CASE
+    WHEN NOT pg_is_in_recovery() THEN 0
+    WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+    ELSE coalesce(extract(epoch FROM now() - pg_last_xact_replay_timestamp()), 0)
+END
+"""
+
+_state = threading.local()
+_lags = {}
+_lags_lock = threading.Lock()
+
+
+def read_from_replica(enabled):
+    """Route this thread's reads to a replica until turned off again.
+
+    Each call lets the next read choose its replica afresh.
+    """
+    _state.replica = enabled
+    _state.alias = None
+
+
+def reading_from_replica():
+    """Whether this thread's reads may go to a replica."""
+    return getattr(_state, 'replica', False)
+
+
+def replica_lag(alias):
+    """Seconds the replica is behind the primary, or None if unreachable.
+
+    Measurements are reused for REPLICA_LAG_CHECK_INTERVAL seconds.
+    """
+    now = time.monotonic()
+    with _lags_lock:
+        checked, lag = _lags.get(alias, (None, None))
+    if checked is not None and now - checked < settings.REPLICA_LAG_CHECK_INTERVAL:
+        return lag
+    try:
+        with connections[alias].cursor() as cursor:
+            cursor.execute(LAG_QUERY)
+            lag = float(cursor.fetchone()[0])
+    except DatabaseError:
+        lag = None
+    with _lags_lock:
+        _lags[alias] = (now, lag)
+    return lag
+
+
+def choose_replica():
+    """A replica within the allowed lag, or None to read from the primary."""
+    lags = {alias: replica_lag(alias) for alias in settings.DATABASE_REPLICAS}
+    healthy = [alias for alias, lag in lags.items()
+               if lag is not None and lag <= settings.REPLICA_MAX_LAG]
+    return random.choice(healthy) if healthy else None
+
+
+class ReplicaRouter(object):
+    """Read from a replica when the view allows it; write to the primary."""
+
+    def db_for_read(self, model, **hints):
+        """A caught-up replica for replica-safe views, otherwise the primary.
+
+        The shared cache is always read from the primary, so no process
+        sees an invalidation later than the one that made it.
+        """
+        if not reading_from_replica() or model._meta.app_label == 'django_cache':
+            return None
+        if getattr(_state, 'alias', None) is None:
+            _state.alias = choose_replica() or 'default'
+        return _state.alias
+
+    def db_for_write(self, model, **hints):
+        """Always write to the primary."""
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        """Replicas hold the same rows, so relations may span them."""
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        """Only migrate the primary; replicas follow it."""
+        return db == 'default'
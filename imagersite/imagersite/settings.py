@@ -39,6 +39,7 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     'django.contrib.humanize',
+    'django.contrib.postgres',
     'multiselectfield',
     'sorl.thumbnail',
     'storages',
@@ -56,6 +57,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'imagersite.middleware.ReplicaMiddleware',
 ]
 
 X_FRAME_OPTIONS = 'DENY'
@@ -99,6 +101,45 @@ DATABASES = {
     }
 }
 
+# Read replicas, one alias per space separated host in DB_REPLICA_HOSTS. Views with
+# use_replica = True read from a replica that is at most REPLICA_MAX_LAG
+# seconds behind, and clients read from the primary for
+# REPLICA_STICKY_SECONDS after they write.
+DATABASE_REPLICAS = []
+for index, host in enumerate(os.environ.get('DB_REPLICA_HOSTS', '').split()):
+    alias = 'replica_{}'.format(index + 1)
+    DATABASES[alias] = dict(DATABASES['default'], HOST=host,
+                            TEST={'MIRROR': 'default'})
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['imagersite.routers.ReplicaRouter']
+REPLICA_MAX_LAG = 5
+REPLICA_LAG_CHECK_INTERVAL = 5
+REPLICA_STICKY_SECONDS = 15
+
+
+# One cache for every process, so what one web worker, worker command or
+# cron job invalidates is gone for all of them. Its table is created with
+# manage.py createcachetable. sorl's key-value store is already in the
+# database every process shares, so each process keeps its answers in memory
+# for THUMBNAIL_CACHE_TIMEOUT seconds only, which bounds how long one process
+# can still point at a thumbnail another has deleted.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'imager_cache',
+        'OPTIONS': {'MAX_ENTRIES': 100000},
+    },
+    'thumbnails': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'thumbnails',
+    },
+}
+
+THUMBNAIL_CACHE = 'thumbnails'
+THUMBNAIL_CACHE_TIMEOUT = 300
+
 
 # Password validation
 # https://docs.djangoproject.com/en/1.11/ref/settings/#auth-password-validators
@@ -132,6 +173,69 @@ USE_L10N = True
 
 USE_TZ = True
 
+# Image decoding limits, per process
+
+IMAGE_DECODE_MAX_BYTES = int(os.environ.get('IMAGE_DECODE_MAX_BYTES', 512 * 1024 * 1024))
+IMAGE_DECODE_MAX_PIXELS = int(os.environ.get('IMAGE_DECODE_MAX_PIXELS', 120 * 1000 * 1000))
+IMAGE_DECODE_TIMEOUT = 30
+IMAGE_UPLOAD_MAX_BYTES = int(os.environ.get('IMAGE_UPLOAD_MAX_BYTES', 50 * 1024 * 1024))
+
+THUMBNAIL_ENGINE = 'imager_images.engines.BudgetedEngine'
+
+# Resized photos rendered on request, cached on local disk
+
+DERIVATIVE_CACHE_ROOT = os.environ.get('DERIVATIVE_CACHE_ROOT',
+                                       os.path.join(BASE_DIR, 'derivatives'))
+DERIVATIVE_CACHE_MAX_BYTES = int(os.environ.get('DERIVATIVE_CACHE_MAX_BYTES',
+                                                2 * 1024 * 1024 * 1024))
+DERIVATIVE_MAX_DIMENSION = 2048
+DERIVATIVE_ACCEL_REDIRECT_URL = os.environ.get('DERIVATIVE_ACCEL_REDIRECT_URL', '')
+
+# Rendered public galleries, dropped whenever a photo or album changes
+
+GALLERY_CACHE_SECONDS = 300
+
+# Followers' feeds: items are copied into each follower's timeline unless
+# the author has at least this many followers, whose feeds read them instead
+
+FEED_FAN_OUT_LIMIT = 10000
+FEED_BACKFILL = 20
+
+# Each user's Atom and RSS feeds list their PROFILE_FEED_ITEMS newest public
+# photos and albums
+
+PROFILE_FEED_ITEMS = 20
+
+# Photo and album views, counted in memory and written every
+# VIEW_FLUSH_SECONDS, or sooner once VIEW_FLUSH_SIZE items have views.
+# Each process spools its views to local disk until they are written, and
+# a process idle for VIEW_FLUSH_SECONDS leaves them to flush_views.
+
+VIEW_SPOOL_ROOT = os.environ.get('VIEW_SPOOL_ROOT', os.path.join(BASE_DIR, 'view_spool'))
+VIEW_FLUSH_SECONDS = 10
+VIEW_FLUSH_SIZE = 1000
+
+# Ranked photo galleries: views lose half their trending weight every
+# TRENDING_HALF_LIFE_HOURS, and each gallery keeps its best RANKED_GALLERY_SIZE
+
+TRENDING_HALF_LIFE_HOURS = 24
+TRENDING_MIN_SCORE = 0.001
+RANKED_GALLERY_SIZE = 500
+
+# Sitemaps, one per SITEMAP_SHARD_SIZE ids of each section, cached until
+# an item in the shard changes
+
+SITEMAP_SHARD_SIZE = 10000
+SITEMAP_CACHE_SECONDS = 24 * 60 * 60
+
+# Account exports, whose archives are kept for ACCOUNT_EXPORT_DAYS. An export
+# whose worker has not checked in for ACCOUNT_EXPORT_STALE_SECONDS is restarted.
+# Archives are stored apart from the public media, by ACCOUNT_EXPORT_STORAGE
+# below, and are only ever downloaded through their owner's export page.
+
+ACCOUNT_EXPORT_DAYS = 7
+ACCOUNT_EXPORT_STALE_SECONDS = 10 * 60
+
 # Email setup for registration
 
 ACCOUNT_ACTIVATION_DAYS = 7
@@ -160,6 +264,9 @@ if DEBUG:
     MEDIA_URL = '/media/'
     MEDIA_ROOT = os.path.join(BASE_DIR, "MEDIA")
 
+    ACCOUNT_EXPORT_STORAGE = 'django.core.files.storage.FileSystemStorage'
+    ACCOUNT_EXPORT_STORAGE_OPTIONS = {'location': os.path.join(BASE_DIR, 'EXPORTS')}
+
 else:
     # AWS configrations
     AWS_STORAGE_BUCKET_NAME = os.environ.get('AWS_STORAGE_BUCKET_NAME', '')
@@ -174,3 +281,6 @@ else:
     MEDIAFILES_LOCATION = 'MEDIA'
     DEFAULT_FILE_STORAGE = 'imagersite.custom_storages.MediaStorage'
     MEDIA_URL = 'https://{}/{}/'.format(AWS_S3_CUSTOM_DOMAIN, MEDIAFILES_LOCATION)
+
+    ACCOUNT_EXPORT_STORAGE = 'imagersite.custom_storages.PrivateMediaStorage'
+    ACCOUNT_EXPORT_STORAGE_OPTIONS = {}
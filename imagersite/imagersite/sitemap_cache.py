@@ -0,0 +1,38 @@
+"""The versions that key each cached sitemap shard."""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+
+from imager_images.gallery_cache import new_version
+
+
+def shard_of(pk):
+    """The shard an id falls in: ids 1 to SITEMAP_SHARD_SIZE are shard 0."""
+    return (pk - 1) // settings.SITEMAP_SHARD_SIZE
+
+
+def version_key(section, shard):
+    """The cache key of a shard's version."""
+    return 'sitemap-version-{}-{}'.format(section, shard)
+
+
+def shard_version(section, shard):
+    """The shard's current version, which changes whenever an item in it does."""
+    return cache.get_or_set(version_key(section, shard), new_version, None)
+
+
+def invalidate_shards(section, ids):
+    """Move the shards of the given ids to new versions, so they are rebuilt.
+
+    Like the gallery version, each is replaced rather than incremented,
+    and replaced again when the current transaction commits.
+    """
+    def replace():
+        """Store new versions of the shards."""
+        cache.set_many({version_key(section, shard): new_version() for shard in shards}, None)
+    shards = {shard_of(pk) for pk in ids}
+    if not shards:
+        return
+    replace()
+    if connection.in_atomic_block:
+        transaction.on_commit(replace)
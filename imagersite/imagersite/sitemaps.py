@@ -0,0 +1,92 @@
+"""XML sitemaps of public photos and albums and active profiles, by id range."""
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Max
+from django.urls import reverse
+from django.utils.html import escape
+from imager_images.models import Album, Photo
+from imager_profile.models import ImagerProfile
+from imagersite.sitemap_cache import shard_version
+
+NAMESPACE = 'http://www.sitemaps.org/schemas/sitemap/0.9'
+
+
+def photo_entries(low, high):
+    """The path and last modified time of each public photo in the id range."""
+    photos = (Photo.active.filter(published='PUBLIC', id__gt=low, id__lte=high)
+              .order_by('id').values_list('id', 'date_modified'))
+    for pk, modified in photos.iterator():
+        yield reverse('photo_detail', kwargs={'id': pk}), modified
+
+
+def album_entries(low, high):
+    """The path and last modified time of each public album in the id range."""
+    albums = (Album.active.filter(published='PUBLIC', id__gt=low, id__lte=high)
+              .order_by('id').values_list('id', 'date_modified'))
+    for pk, modified in albums.iterator():
+        yield reverse('album_detail', kwargs={'id': pk}), modified
+
+
+def profile_entries(low, high):
+    """The path of each active profile in the id range."""
+    profiles = (ImagerProfile.active.filter(id__gt=low, id__lte=high)
+                .order_by('id').values_list('user__username', flat=True))
+    for username in profiles.iterator():
+        yield reverse('profile', kwargs={'username': username}), None
+
+
+SECTIONS = {
+    'photos': (Photo, photo_entries),
+    'albums': (Album, album_entries),
+    'profiles': (ImagerProfile, profile_entries),
+}
+
+
+def shard_count(section):
+    """The number of shards a section's ids span."""
+    highest = SECTIONS[section][0].objects.aggregate(highest=Max('id'))['highest']
+    return (highest - 1) // settings.SITEMAP_SHARD_SIZE + 1 if highest else 0
+
+
+def sitemap_index(build_uri):
+    """The sitemap index, listing every shard of every section."""
+    yield '<?xml version="1.0" encoding="UTF-8"?>\n'
+    yield '<sitemapindex xmlns="{}">\n'.format(NAMESPACE)
+    for section in sorted(SECTIONS):
+        for shard in range(shard_count(section)):
+            location = build_uri(reverse('sitemap', kwargs={'section': section,
+                                                            'shard': shard}))
+            yield '<sitemap><loc>{}</loc></sitemap>\n'.format(escape(location))
+    yield '</sitemapindex>\n'
+
+
+def render_shard(section, shard, build_uri):
+    """The URLs of one shard, read through a server-side cursor."""
+    size = settings.SITEMAP_SHARD_SIZE
+    yield '<?xml version="1.0" encoding="UTF-8"?>\n'
+    yield '<urlset xmlns="{}">\n'.format(NAMESPACE)
+    for path, modified in SECTIONS[section][1](shard * size, (shard + 1) * size):
+        lastmod = '<lastmod>{}</lastmod>'.format(modified.date().isoformat()) if modified else ''
+        yield '<url><loc>{}</loc>{}</url>\n'.format(escape(build_uri(path)), lastmod)
+    yield '</urlset>\n'
+
+
+def sitemap_shard(section, shard, build_uri):
+    """The shard's XML, from the cache or streamed and cached as it goes.
+
+    The cache key holds the shard's version, which every process reads
+    from the shared cache and which moves on whenever an item in its id
+    range changes. A changed shard is rebuilt on its next request, and an
+    unchanged one never is.
+    """
+    key = 'sitemap-{}-{}-{}-{}'.format(section, shard, shard_version(section, shard),
+                                       build_uri('/'))
+    cached = cache.get(key)
+    if cached is not None:
+        yield cached
+        return
+    chunks = []
+    for chunk in render_shard(section, shard, build_uri):
+        chunks.append(chunk)
+        yield chunk
+    cache.set(key, ''.join(chunks), settings.SITEMAP_CACHE_SECONDS)
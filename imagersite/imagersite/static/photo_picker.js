@@ -0,0 +1,45 @@
+/* Load a user's photos page by page into every .photo-picker on the page. */
+$(function () {
+    $('.photo-picker').each(function () {
+        var picker = $(this);
+        var source = picker.data('source');
+        var name = picker.data('name');
+        var type = picker.data('multiple') ? 'checkbox' : 'radio';
+        var results = picker.find('.photo-picker-results');
+        var more = picker.find('.photo-picker-more');
+        var next = null;
+        var timer = null;
+
+        function load(reset) {
+            var params = {q: picker.find('.photo-picker-search').val()};
+            if (!reset && next) {
+                params.after = next;
+            }
+            $.getJSON(source, params, function (data) {
+                if (reset) {
+                    results.empty();
+                }
+                $.each(data.results, function (_, photo) {
+                    if (picker.find('.photo-picker-selected input[value="' + photo.id + '"]').length) {
+                        return;
+                    }
+                    var input = $('<input>').attr({type: type, name: name, value: photo.id});
+                    $('<label class="photo-picker-choice">')
+                        .append(input)
+                        .append($('<img>').attr({src: photo.thumbnail, alt: photo.title}))
+                        .append(document.createTextNode(' ' + photo.title))
+                        .appendTo(results);
+                });
+                next = data.next;
+                more.prop('hidden', !next);
+            });
+        }
+
+        picker.find('.photo-picker-search').on('input', function () {
+            clearTimeout(timer);
+            timer = setTimeout(function () { load(true); }, 250);
+        });
+        more.on('click', function () { load(false); });
+        load(true);
+    });
+});
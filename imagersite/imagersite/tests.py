@@ -283,3 +283,202 @@ class MainRoutingTests(TestCase):
             'email': 'bob@email.com'
         })
         self.assertIn(b'username already exists', response.content)
+
+
+class ReplicaRouterTests(TestCase):
+    """Tests for routing reads to replicas."""
+
+    def setUp(self):
+        """Set up a user and forget any measured replica lag."""
+        from imagersite import routers
+        routers._lags.clear()
+        user = UserFactory(username='bob')
+        user.set_password('password')
+        user.save()
+
+    def tearDown(self):
+        """Stop reading from replicas."""
+        from imagersite.routers import read_from_replica
+        read_from_replica(False)
+
+    def test_router_reads_primary_by_default(self):
+        """Test that reads go to the primary outside replica-safe views."""
+        from imagersite.routers import ReplicaRouter
+        self.assertIsNone(ReplicaRouter().db_for_read(User))
+
+    @override_settings(DATABASE_REPLICAS=['replica_1', 'replica_2', 'replica_3'])
+    def test_choose_replica_skips_lagging_and_unreachable_replicas(self):
+        """Test that only replicas within the allowed lag are chosen."""
+        from imagersite.routers import choose_replica
+        from unittest import mock
+        lags = {'replica_1': 60.0, 'replica_2': None, 'replica_3': 0.5}
+        with mock.patch('imagersite.routers.replica_lag', lags.get):
+            self.assertEqual(choose_replica(), 'replica_3')
+
+    @override_settings(DATABASE_REPLICAS=['replica_1'])
+    def test_router_falls_back_to_primary_when_replicas_lag(self):
+        """Test that reads use the primary when no replica is caught up."""
+        from imagersite.routers import read_from_replica, ReplicaRouter
+        from unittest import mock
+        read_from_replica(True)
+        with mock.patch('imagersite.routers.replica_lag', return_value=60.0):
+            self.assertEqual(ReplicaRouter().db_for_read(User), 'default')
+
+    @override_settings(DATABASE_REPLICAS=['default'])
+    def test_replica_lag_of_a_primary_is_zero(self):
+        """Test that the lag query runs and a server not in recovery has no lag."""
+        from imagersite.routers import replica_lag
+        self.assertEqual(replica_lag('default'), 0)
+
+    @override_settings(DATABASE_REPLICAS=['default'])
+    def test_replica_safe_view_reads_from_replica(self):
+        """Test that a gallery request routes its reads to a replica."""
+        from unittest import mock
+        with mock.patch('imagersite.routers.choose_replica',
+                        return_value='default') as choose:
+            self.client.get(reverse_lazy('photo_gallery'))
+        choose.assert_called_once_with()
+
+    @override_settings(DATABASE_REPLICAS=['default'])
+    def test_library_does_not_read_from_replica(self):
+        """Test that views not marked replica-safe read the primary."""
+        from unittest import mock
+        self.client.login(username='bob', password='password')
+        with mock.patch('imagersite.routers.choose_replica') as choose:
+            self.client.get(reverse_lazy('library'))
+        choose.assert_not_called()
+
+    @override_settings(DATABASE_REPLICAS=['default'])
+    def test_writes_pin_the_client_to_the_primary(self):
+        """Test that a client reads the primary for a while after it writes."""
+        from unittest import mock
+        response = self.client.post(reverse_lazy('login'),
+                                    {'username': 'bob', 'password': 'password'})
+        self.assertIn('pin_primary', response.cookies)
+        with mock.patch('imagersite.routers.choose_replica') as choose:
+            self.client.get(reverse_lazy('photo_gallery'))
+        choose.assert_not_called()
+
+
+@override_settings(MEDIA_ROOT=os.path.join(settings.BASE_DIR, 'test_media_for_sitemaps'))
+class SitemapTests(TestCase):
+    """Tests for the sitemap index and its cached shards."""
+
+    @classmethod
+    def setUpClass(cls):
+        """Add an active and an inactive user with public and private items."""
+        super(SitemapTests, cls).setUpClass()
+        from imager_images.models import Album
+        os.system('mkdir {}'.format(
+            os.path.join(settings.BASE_DIR, 'test_media_for_sitemaps')))
+        cls.alice = UserFactory(username='alice')
+        cls.alice.save()
+        cls.ghost = UserFactory(username='ghost', is_active=False)
+        cls.ghost.save()
+        cls.public = PhotoFactory(user=cls.alice, published='PUBLIC')
+        cls.public.save()
+        cls.private = PhotoFactory(user=cls.alice, published='PRIVATE')
+        cls.private.save()
+        cls.hidden = PhotoFactory(user=cls.ghost, published='PUBLIC')
+        cls.hidden.save()
+        cls.album = Album(user=cls.alice, title='trip', published='PUBLIC')
+        cls.album.save()
+
+    @classmethod
+    def tearDownClass(cls):
+        """Remove the test directory."""
+        super(SitemapTests, cls).tearDownClass()
+        os.system('rm -rf {}'.format(
+            os.path.join(settings.BASE_DIR, 'test_media_for_sitemaps')))
+
+    def setUp(self):
+        """Start each test with no cached shards."""
+        from django.core.cache import cache
+        cache.clear()
+
+    def shard(self, section, pk):
+        """The streamed sitemap of the shard holding ``pk``."""
+        from imagersite.sitemap_cache import shard_of
+        response = self.client.get(reverse_lazy(
+            'sitemap', kwargs={'section': section, 'shard': shard_of(pk)}))
+        self.assertEqual(response['Content-Type'], 'application/xml')
+        return b''.join(response.streaming_content).decode('utf8')
+
+    def test_index_lists_each_section(self):
+        """Test the index links to a shard of every section."""
+        response = self.client.get(reverse_lazy('sitemap_index'))
+        content = b''.join(response.streaming_content).decode('utf8')
+        for section in ('photos', 'albums', 'profiles'):
+            self.assertIn('http://testserver/sitemaps/{}-'.format(section), content)
+
+    @override_settings(SITEMAP_SHARD_SIZE=2)
+    def test_index_splits_sections_by_id_range(self):
+        """Test the index lists one shard per SITEMAP_SHARD_SIZE ids."""
+        from imager_images.models import Photo
+        from imagersite.sitemap_cache import shard_of
+        response = self.client.get(reverse_lazy('sitemap_index'))
+        content = b''.join(response.streaming_content).decode('utf8')
+        last = shard_of(Photo.objects.latest('id').id)
+        self.assertEqual(content.count('/sitemaps/photos-'), last + 1)
+        self.assertIn('/sitemaps/photos-{}.xml'.format(last), content)
+
+    def test_photo_shard_lists_only_public_photos_of_active_users(self):
+        """Test a photo shard leaves out private photos and inactive owners."""
+        content = self.shard('photos', self.public.id)
+        self.assertIn('http://testserver/images/photos/{}</loc><lastmod>'.format(
+            self.public.id), content)
+        self.assertNotIn('/images/photos/{}<'.format(self.private.id), content)
+        self.assertNotIn('/images/photos/{}<'.format(self.hidden.id), content)
+
+    def test_album_and_profile_shards(self):
+        """Test the album and profile shards list public albums and active profiles."""
+        self.assertIn('/images/albums/{}<'.format(self.album.id),
+                      self.shard('albums', self.album.id))
+        content = self.shard('profiles', self.alice.profile.id)
+        self.assertIn('/profile/alice<', content)
+        self.assertNotIn('/profile/ghost<', content)
+
+    def test_shard_past_the_last_id_is_not_found(self):
+        """Test a shard beyond every id gets a 404 status code."""
+        response = self.client.get(reverse_lazy(
+            'sitemap', kwargs={'section': 'photos', 'shard': 10 ** 6}))
+        self.assertEqual(response.status_code, 404)
+
+    def test_shard_is_cached_until_an_item_changes(self):
+        """Test a shard is served from the cache until one of its photos changes."""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from imager_images.models import Photo
+        self.shard('photos', self.private.id)
+        Photo.objects.filter(id=self.private.id).update(published='PUBLIC')
+        with CaptureQueriesContext(connection) as queries:
+            content = self.shard('photos', self.private.id)
+        self.assertEqual([query['sql'] for query in queries
+                          if Photo._meta.db_table in query['sql']],
+                         ['SELECT MAX("imager_images_photo"."id") AS "highest" '
+                          'FROM "imager_images_photo"'])
+        self.assertNotIn('/images/photos/{}<'.format(self.private.id), content)
+        photo = Photo.objects.get(id=self.private.id)
+        photo.save()
+        self.assertIn('/images/photos/{}<'.format(self.private.id),
+                      self.shard('photos', self.private.id))
+
+    def test_deleting_an_account_refreshes_its_shards(self):
+        """Test a deleted account's photos and albums leave their cached shards."""
+        from imager_profile.models import delete_account
+        self.shard('photos', self.public.id)
+        self.shard('albums', self.album.id)
+        delete_account(self.alice)
+        self.assertNotIn('/images/photos/{}<'.format(self.public.id),
+                         self.shard('photos', self.public.id))
+        self.assertNotIn('/images/albums/{}<'.format(self.album.id),
+                         self.shard('albums', self.album.id))
+
+    def test_bulk_visibility_change_refreshes_shards(self):
+        """Test a bulk change drops the cached shards of the photos it changed."""
+        from imager_images.models import Photo
+        from imager_images.visibility import change_visibility
+        self.shard('photos', self.public.id)
+        change_visibility(Photo.objects.filter(id=self.public.id), 'PRIVATE')
+        self.assertNotIn('/images/photos/{}<'.format(self.public.id),
+                         self.shard('photos', self.public.id))
@@ -18,7 +18,7 @@ from django.conf.urls import url, include
 from django.conf.urls.static import static
 from django.contrib import admin
 from django.contrib.auth import views
-from imagersite.views import HomeView
+from imagersite.views import HomeView, SitemapIndexView, SitemapView
 
 urlpatterns = [
     url(r'^admin/', admin.site.urls),
@@ -28,7 +28,10 @@ urlpatterns = [
     url(r'^accounts/', include('registration.backends.hmac.urls')),
     url(r'^profile/', include('imager_profile.urls')),
     url(r'^images/', include('imager_images.urls')),
-    url(r'^api/v1/', include('imager_api.urls'))
+    url(r'^api/v1/', include('imager_api.urls')),
+    url(r'^sitemap\.xml$', SitemapIndexView.as_view(), name='sitemap_index'),
+    url(r'^sitemaps/(?P<section>photos|albums|profiles)-(?P<shard>\d+)\.xml$',
+        SitemapView.as_view(), name='sitemap')
 ]
 
 if settings.DEBUG:  # pragma: no cover
@@ -1,17 +1,20 @@
 """The main views for the Imager site."""
 from django.conf import settings
-from django.views.generic import TemplateView
+from django.http import Http404, StreamingHttpResponse
+from django.views.generic import TemplateView, View
 from imager_images.models import Photo
+from imagersite.sitemaps import shard_count, sitemap_index, sitemap_shard
 
 
 class HomeView(TemplateView):
     """Render the home view template."""
 
     template_name = "imagersite/home.html"
+    use_replica = True
 
     def get_context_data(self):
         """Get the data to send to the template as context."""
-        photos = Photo.objects.filter(published='PUBLIC')
+        photos = Photo.active.filter(published='PUBLIC')
         if photos.count():
             image = photos.order_by('?').first()
             image_url = image.image.url
@@ -23,3 +26,24 @@ class HomeView(TemplateView):
             'hero_img_url': image_url,
             'hero_img_title': image_title
         }
+
+
+class SitemapIndexView(View):
+    """Stream the sitemap index."""
+
+    def get(self, request):
+        """List the shard sitemaps of each section."""
+        return StreamingHttpResponse(sitemap_index(request.build_absolute_uri),
+                                     content_type='application/xml')
+
+
+class SitemapView(View):
+    """Stream one shard of a section's sitemap."""
+
+    def get(self, request, section, shard):
+        """List the section's URLs in the shard's id range."""
+        shard = int(shard)
+        if shard >= shard_count(section):
+            raise Http404('No such sitemap')
+        return StreamingHttpResponse(sitemap_shard(section, shard, request.build_absolute_uri),
+                                     content_type='application/xml')